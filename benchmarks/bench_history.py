@@ -0,0 +1,98 @@
+"""
+Prompt size over a long dinner with the history compactor (waiter/tools/history.py)
+
+One guest repeats the four load test turns ROUNDS times against the waiter tree, the
+agents answer from benchmarks/recordings/waiter.json (common/fake_llm.py). Per round it
+reports the largest prompt the history would make, what was sent after compaction and
+how many requests were compacted. The prompt grows with every round until it crosses
+constants.HISTORY_TOKEN_BUDGET, from then on the compactor keeps it under the budget.
+
+Run from the repository root:
+    python -m benchmarks.bench_history
+    python -m benchmarks.bench_history --rounds 30
+"""
+from contextlib import redirect_stdout
+import argparse
+import tempfile
+import asyncio
+import shutil
+import io
+import os
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai.types import Content, Part
+
+from benchmarks.load_test import ALLERGIES, CRAVINGS, DATA_FILES, RECORDING, TURNS, note_allergy, pick_free_table
+from common.fake_llm import install, load_recording, fixed, Rule
+from waiter.agent import root_agent
+from waiter.shared_libraries import constants
+from waiter.tools import history
+
+APP_NAME = "bench_history"
+ROUNDS = 16
+
+
+async def run(rounds: int) -> list[tuple[int, int, int, int]]:
+    """
+    Returns:
+        list[tuple[int, int, int, int]]: per round, requests, largest prompt before and after compaction, requests compacted
+    """
+    rules = load_recording(str(RECORDING))
+    rules["root_agent"].insert(0, Rule(when="tool:new_guest", reply=note_allergy))
+    rules["seating_agent"].insert(0, Rule(when="tool:find_tables", reply=pick_free_table))
+    install(root_agent, rules, latency=fixed(0))
+    runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=InMemorySessionService())
+    await runner.session_service.create_session(app_name=APP_NAME, user_id="guest", session_id="dinner")
+
+    stats = history.STATS
+    rows = []
+    for _ in range(rounds):
+        requests, compacted = stats.requests, stats.compacted
+        for _, text in TURNS:
+            content = Content(role="user", parts=[Part(text=text.format(n=0, allergy=ALLERGIES[0], craving=CRAVINGS[0]))])
+            async for _ in runner.run_async(user_id="guest", session_id="dinner", new_message=content):
+                pass
+        # the last requests of the round, history only keeps the most recent ones
+        seen = list(stats.history)[-(stats.requests - requests):]
+        rows.append((
+            len(seen),
+            max(h["tokens_before"] for h in seen),
+            max(h["tokens_after"] for h in seen),
+            stats.compacted - compacted,
+        ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="times the guest repeats the four turns")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in DATA_FILES:
+            shutil.copy(name, tmp)
+        os.chdir(tmp)
+        try:
+            with redirect_stdout(io.StringIO()):
+                rows = asyncio.run(run(args.rounds))
+        finally:
+            os.chdir(cwd)
+
+    print(
+        f"1 guest, {args.rounds} rounds of {len(TURNS)} turns, budget {constants.HISTORY_TOKEN_BUDGET} tokens, "
+        f"last {constants.HISTORY_KEEP_TURNS} guest turns kept"
+    )
+    print(f"{'round':>5} {'requests':>9} {'history max':>12} {'sent max':>9} {'compacted':>10}")
+    for n, (requests, before, after, compacted) in enumerate(rows, 1):
+        print(f"{n:>5} {requests:>9} {before:>12} {after:>9} {compacted:>10}")
+    stats = history.STATS
+    print(
+        f"history: {stats.compacted}/{stats.requests} requests compacted, prompt tokens/request "
+        f"{stats.tokens_before / stats.requests:.0f} -> {stats.tokens_after / stats.requests:.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
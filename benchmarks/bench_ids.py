@@ -0,0 +1,123 @@
+"""
+Throughput and uniqueness of the time ordered record ids, and range scans over orders by creation time
+
+Run from the repository root:
+    python -m benchmarks.bench_ids
+"""
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from random import randint
+import statistics
+import tempfile
+import json
+import time
+import uuid
+import os
+
+from waiter.models.ids import IdGenerator, new_ids, NODE_BITS, SEQUENCE_BITS, EPOCH_MS
+from waiter.models.schema import DB, Order
+from waiter.models.storage import JsonStorage, SqliteStorage
+
+IDS = 1_000_000
+THREADS = 4
+PROCESSES = 4
+ORDERS = 50_000
+# orders seeded one per second, scans cover 1% of them
+WINDOW = ORDERS // 100
+SCANS = 50
+
+
+def _rate(make) -> float:
+    start = time.perf_counter()
+    make()
+    return IDS / (time.perf_counter() - start) / 1e6
+
+
+def _threaded(generator: IdGenerator) -> list[str]:
+    with ThreadPoolExecutor(THREADS) as pool:
+        chunks = pool.map(lambda _: [generator.next() for _ in range(IDS // THREADS)], range(THREADS))
+    return [record_id for chunk in chunks for record_id in chunk]
+
+
+def _child_ids(n: int) -> list[str]:
+    return new_ids(n)
+
+
+def _randint_collision_at() -> int:
+    # guests created until the previous scheme first handed out a taken id
+    seen = set()
+    while True:
+        record_id = randint(1, 100)
+        if record_id in seen:
+            return len(seen) + 1
+        seen.add(record_id)
+
+
+def throughput():
+    generator = IdGenerator()
+    print(f"{'generator':<22} {'M ids/s':>8}")
+    print(f"{'randint(1, 100)':<22} {_rate(lambda: [str(randint(1, 100)) for _ in range(IDS)]):>8.2f}")
+    print(f"{'uuid4':<22} {_rate(lambda: [str(uuid.uuid4()) for _ in range(IDS)]):>8.2f}")
+    print(f"{'next':<22} {_rate(lambda: [generator.next() for _ in range(IDS)]):>8.2f}")
+    print(f"{'take (bulk)':<22} {_rate(lambda: generator.take(IDS)):>8.2f}")
+    threaded: list[str] = []
+    rate = _rate(lambda: threaded.extend(_threaded(generator)))
+    print(f"{f'next x{THREADS} threads':<22} {rate:>8.2f}")
+
+    with get_context("fork").Pool(PROCESSES) as pool:
+        chunks = pool.map(_child_ids, [IDS // PROCESSES] * PROCESSES)
+    forked = [record_id for chunk in chunks for record_id in chunk]
+    print(
+        f"unique: threads {len(set(threaded)) == len(threaded)}, "
+        f"{PROCESSES} forked processes {len(set(forked)) == len(forked)}"
+    )
+    collisions = [_randint_collision_at() for _ in range(10_000)]
+    print(f"randint(1, 100) first collision after {statistics.median(collisions):.0f} guests (median)")
+
+
+def _seed(start: float):
+    orders = [
+        {
+            "id": f"{(int((start + i) * 1000) - EPOCH_MS) << (NODE_BITS + SEQUENCE_BITS):016x}",
+            "guest_id": f"G{i:06d}",
+            "dishes": [["Masala Chai", {}]],
+        }
+        for i in range(ORDERS)
+    ]
+    # plus orders saved before ids were time ordered
+    orders += [{"id": f"O{i:03d}", "guest_id": f"G{i:03d}", "dishes": []} for i in range(100)]
+    with open(Order._filename, "w") as f:
+        json.dump(orders, f)
+
+
+def range_scans():
+    start = time.time() - ORDERS
+    _seed(start)
+    print(f"{'backend':<8} {'orders':>7} {'scan p50 (ms)':>14}")
+    for name, storage in (("json", JsonStorage()), ("sqlite", SqliteStorage("waiter.db"))):
+        DB.use_storage(storage)
+        Order.created_between(start, start + 1)
+        timings = []
+        for i in range(SCANS):
+            since = start + (i * 997) % (ORDERS - WINDOW)
+            began = time.perf_counter()
+            orders = Order.created_between(since, since + WINDOW)
+            timings.append(time.perf_counter() - began)
+            assert len(orders) == WINDOW
+        print(f"{name:<8} {len(orders):>7} {statistics.median(timings) * 1e3:>14.2f}")
+    DB.use_storage(JsonStorage())
+
+
+def main():
+    throughput()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            range_scans()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
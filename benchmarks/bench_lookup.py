@@ -0,0 +1,59 @@
+"""
+Latency of `Order.by_guest` on the json and sqlite storage backends as order.json grows
+"cached" serves repeated json lookups from the parsed file cache, the cold ones reparse order.json every time
+
+Run from the repository root:
+    python -m benchmarks.bench_lookup
+"""
+import statistics
+import tempfile
+import json
+import time
+import os
+
+from waiter.models.schema import DB, Order
+from waiter.models.storage import JsonCache, JsonStorage, SqliteStorage
+
+SIZES = [100, 1_000, 10_000, 50_000]
+LOOKUPS = 100
+
+
+def _seed(n: int):
+    orders = [{"id": f"O{i:06d}", "guest_id": f"G{i:06d}", "dishes": [["Masala Chai", {}]]} for i in range(n)]
+    with open(Order._filename, "w") as f:
+        json.dump(orders, f, indent=2)
+
+
+def main():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            print(f"{'backend':<8} {'records':>8} {'p50 (us)':>10}")
+            for n in SIZES:
+                _seed(n)
+                backends = (
+                    ("json", JsonStorage()),
+                    ("orjson", JsonStorage(fast=True)),
+                    ("cached", JsonStorage()),
+                    ("sqlite", SqliteStorage(f"waiter_{n}.db")),
+                )
+                for name, storage in backends:
+                    DB.use_storage(storage)
+                    # first access imports order.json into sqlite
+                    Order.by_guest("G000000")
+                    timings = []
+                    for i in range(LOOKUPS):
+                        if name in ("json", "orjson"):
+                            JsonStorage.cache = JsonCache()
+                        start = time.perf_counter()
+                        Order.by_guest(f"G{(i * 7919) % n:06d}")
+                        timings.append(time.perf_counter() - start)
+                    print(f"{name:<8} {n:>8} {statistics.median(timings) * 1e6:>10.1f}")
+            DB.use_storage(JsonStorage())
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
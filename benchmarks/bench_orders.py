@@ -0,0 +1,105 @@
+"""
+Per-dish and batched commits of large group orders through OrderService
+
+Run from the repository root:
+    python -m benchmarks.bench_orders
+"""
+from contextlib import redirect_stdout
+import statistics
+import tempfile
+import json
+import time
+import io
+import os
+
+from waiter.models.schema import DB, Guest, Order, Recommendation
+from waiter.models.services import DishStore, OrderService, RecommendationService
+from waiter.models.storage import CountingStorage, JsonStorage, WalStorage
+
+GROUP_SIZES = [6, 20, 50]
+EXISTING_ORDERS = 2_000
+ROUNDS = 20
+MENU_SIZE = 60
+
+
+def _seed():
+    dishes = [
+        {"id": f"D{i:03d}", "name": f"Dish {i}", "price": 100.0 + i, "ingredients": ["salt", f"ingredient {i}"],
+         "category": "Main Course", "description": ""}
+        for i in range(MENU_SIZE)
+    ]
+    orders = [
+        {"id": f"O{i:06d}", "guest_id": f"G{i:06d}", "dishes": [["Dish 1", {}]]}
+        for i in range(EXISTING_ORDERS)
+    ]
+    for filename, records in (("dish.json", dishes), ("order.json", orders), ("guest.json", []), ("recommendation.json", [])):
+        with open(filename, "w") as f:
+            json.dump(records, f, indent=2)
+
+
+def _order_service(guest_id: str) -> OrderService:
+    # built by hand, the benchmark has no session to resolve the guest from
+    order_service = OrderService.__new__(OrderService)
+    order_service._guest = Guest(id=guest_id, name=guest_id)
+    recommendation_service = RecommendationService.__new__(RecommendationService)
+    recommendation_service._guest = order_service._guest
+    # every other dish comes with a recommended modification
+    recommendation_service._recommendation = Recommendation(
+        guest_id=guest_id,
+        recommended_dishes=[[f"dish {i}", {"salt": "less"}] for i in range(0, MENU_SIZE, 2)],
+    )
+    order_service._recommendation_service = recommendation_service
+    order_service._order = Order(id=f"bench-{guest_id}", guest_id=guest_id, dishes=[])
+    return order_service
+
+
+def per_dish(order_service: OrderService, dish_names: list[str]):
+    # what update_dishes did before: one lookup and one save per dish
+    for dish_name in dish_names:
+        dish = DishStore()._get_dish(dish_name)
+        order_service._add_dish(dish, order_service._recommendation_service.get_modifications_for_dish(dish))
+
+
+def batched(order_service: OrderService, dish_names: list[str]):
+    dishes, _ = order_service._resolve(dish_names)
+    order_service._add_dishes(dishes)
+
+
+def _run(commit, group_size: int, storage: CountingStorage) -> tuple[float, float]:
+    dish_names = [f"Dish {i % MENU_SIZE}" for i in range(group_size)]
+    timings = []
+    upserts = storage.counts[(None, "upsert")]
+    with redirect_stdout(io.StringIO()):
+        for i in range(ROUNDS):
+            order_service = _order_service(f"G{i:06d}")
+            start = time.perf_counter()
+            commit(order_service, dish_names)
+            timings.append(time.perf_counter() - start)
+    saves = (storage.counts[(None, "upsert")] - upserts) / ROUNDS
+    return statistics.median(timings) * 1e3, saves
+
+
+def main():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            _seed()
+            print(f"{'backend':<8} {'dishes':>7} {'commit':<9} {'p50 (ms)':>9} {'saves':>6}")
+            for name, make_storage in (("json", JsonStorage), ("wal", WalStorage)):
+                storage = CountingStorage(make_storage())
+                DB.use_storage(storage)
+                # importing waiter loaded the repository's menu, reload it from the seeded one
+                DishStore._instance = None
+                DishStore()
+                for group_size in GROUP_SIZES:
+                    for label, commit in (("per-dish", per_dish), ("batched", batched)):
+                        p50, saves = _run(commit, group_size, storage)
+                        print(f"{name:<8} {group_size:>7} {label:<9} {p50:>9.2f} {saves:>6.0f}")
+            DB.use_storage(JsonStorage())
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
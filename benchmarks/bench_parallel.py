@@ -0,0 +1,114 @@
+"""
+Tail latency of the research pipeline in parallel/agent.py with ParallelAgent and BoundedParallelAgent
+
+The researchers answer from a ScriptedLlm (common/fake_llm.py) with lognormal latency,
+a few calls straggle for STRAGGLER seconds. ParallelAgent waits for them, BoundedParallelAgent
+hedges after HEDGE_AFTER seconds and gives up on a branch after TIMEOUT seconds, so a run
+takes at most ~TIMEOUT plus the synthesis call.
+
+Run from the repository root:
+    python -m benchmarks.bench_parallel
+"""
+from typing import Callable
+import statistics
+import asyncio
+import random
+import time
+
+from google.adk.agents import BaseAgent, ParallelAgent, SequentialAgent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from common import bounded_parallel
+from common.bounded_parallel import BoundedParallelAgent
+from common.fake_llm import install, lognormal, Latency, Rule
+from parallel.agent import researcher_agent_1, researcher_agent_2, researcher_agent_3, merger_agent
+
+RUNS = 200
+# pipelines in flight at once, more and the event loop itself adds to the latency
+CONCURRENT_RUNS = 10
+MEDIAN = 0.2
+STRAGGLER = 5.0
+STRAGGLE_RATE = 0.05
+HEDGE_AFTER = 0.6
+TIMEOUT = 1.2
+RESEARCHERS = [researcher_agent_1, researcher_agent_2, researcher_agent_3]
+
+
+def straggling(median: float) -> Latency:
+    body = lognormal(median, sigma=0.4)
+    return lambda: STRAGGLER if random.random() < STRAGGLE_RATE else body()
+
+
+def pipeline(make_parallel: Callable[[list[BaseAgent]], BaseAgent]) -> SequentialAgent:
+    # google_search only runs on Gemini models, the scripted researchers answer without it
+    researchers = [researcher.clone(update={"tools": []}) for researcher in RESEARCHERS]
+    root = SequentialAgent(name="ResearchAndSynthesisPipeline", sub_agents=[make_parallel(researchers), merger_agent.clone()])
+    rules = {researcher.name: [Rule(when="*", reply=[{"text": f"{researcher.name} findings."}])] for researcher in researchers}
+    rules[merger_agent.name] = [Rule(when="*", reply=[{"text": "## Summary of Recent Sustainable Technology Advancements"}])]
+    models = install(root, rules, latency=straggling(MEDIAN))
+    models[merger_agent.name].latency = lognormal(MEDIAN, sigma=0.4)
+    return root
+
+
+async def run(root: SequentialAgent) -> tuple[list[float], int]:
+    sessions = InMemorySessionService()
+    runner = Runner(agent=root, app_name="bench_parallel", session_service=sessions)
+    output_keys = [researcher.output_key for researcher in RESEARCHERS]
+    slots = asyncio.Semaphore(CONCURRENT_RUNS)
+
+    async def one(n: int) -> tuple[float, int]:
+        async with slots:
+            return await timed(n)
+
+    async def timed(n: int) -> tuple[float, int]:
+        session = await sessions.create_session(app_name="bench_parallel", user_id="bench", session_id=str(n))
+        content = types.Content(role="user", parts=[types.Part(text="Research sustainable technology.")])
+        start = time.perf_counter()
+        async for _ in runner.run_async(user_id="bench", session_id=session.id, new_message=content):
+            pass
+        elapsed = time.perf_counter() - start
+        session = await sessions.get_session(app_name="bench_parallel", user_id="bench", session_id=session.id)
+        return elapsed, sum(1 for key in output_keys if str(session.state.get(key, "")).startswith("[MISSING"))
+
+    results = await asyncio.gather(*(one(n) for n in range(RUNS)))
+    return [elapsed for elapsed, _ in results], sum(missing for _, missing in results)
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def main():
+    random.seed(7)
+    setups = {
+        "ParallelAgent": lambda researchers: ParallelAgent(name="ParallelWebResearchAgent", sub_agents=researchers),
+        "BoundedParallelAgent": lambda researchers: BoundedParallelAgent(
+            name="ParallelWebResearchAgent",
+            sub_agents=researchers,
+            max_concurrency=len(researchers),
+            branch_timeout=TIMEOUT,
+            hedge_after=HEDGE_AFTER,
+        ),
+    }
+    print(
+        f"{RUNS} runs, researcher latency lognormal median {MEDIAN}s, {STRAGGLE_RATE:.0%} of calls take {STRAGGLER}s, "
+        f"hedge after {HEDGE_AFTER}s, deadline {TIMEOUT}s"
+    )
+    print(f"{'agent':<21} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'max (s)':>8} {'missing':>8}")
+    for name, make_parallel in setups.items():
+        latencies, missing = asyncio.run(run(pipeline(make_parallel)))
+        print(
+            f"{name:<21} {percentile(latencies, 50):>8.3f} {percentile(latencies, 95):>8.3f} "
+            f"{percentile(latencies, 99):>8.3f} {max(latencies):>8.3f} {missing:>8}"
+        )
+    stats = bounded_parallel.STATS
+    print(
+        f"bounded: {stats.branches} branches, {stats.attempts} attempts, {stats.hedges} hedges "
+        f"({stats.hedge_wins} won), outcomes {dict(stats.outcomes)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Output tokens and latency of full rewrites against patch mode refinements (common/patching.py)
+
+The refactorer of sequential/agent.py applies a one line review to generated code of
+FUNCTIONS two line functions, answered by a ScriptedLlm (common/fake_llm.py) that
+takes FIRST_TOKEN seconds plus PER_TOKEN seconds per output token. In patch mode
+FAIL_RATE of the patches name text that isn't in the code and fall back to a full
+rewrite.
+
+Run from the repository root:
+    python -m benchmarks.bench_patching
+"""
+from typing import AsyncGenerator
+import statistics
+import asyncio
+import random
+import json
+import time
+
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from common import patching
+from common.fake_llm import estimate_tokens, ScriptedLlm, Rule
+from sequential.agent import code_refactorer_agent, refactorer_patch_mode
+
+FUNCTIONS = [10, 40, 150]
+RUNS = 50
+CONCURRENT_RUNS = 10
+FIRST_TOKEN = 0.15
+PER_TOKEN = 0.005
+FAIL_RATE = 0.1
+REVIEW = "- `add_7` should return the sum, not the difference."
+
+
+class TokenPacedLlm(ScriptedLlm):
+    """ScriptedLlm that takes longer the more it writes, like a model streaming tokens."""
+    output_tokens: int = 0
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        async for response in super().generate_content_async(llm_request, stream):
+            tokens = response.usage_metadata.candidates_token_count
+            self.output_tokens += tokens
+            await asyncio.sleep(FIRST_TOKEN + tokens * PER_TOKEN)
+            yield response
+
+
+def code(functions: int, fixed: bool = False) -> str:
+    body = "\n".join(
+        f"def add_{i}(x):\n    return x {'-' if i == 7 and not fixed else '+'} {i}\n"
+        for i in range(functions)
+    )
+    return f"```python\n{body}```"
+
+
+def refactorer(functions: int):
+    def refactor(llm_request: LlmRequest) -> list[dict]:
+        if "Do NOT output the whole text" not in str(llm_request.config.system_instruction):
+            return [{"text": code(functions, fixed=True)}]
+        find = "return x - 7" if random.random() >= FAIL_RATE else "return x-7"
+        return [{"text": json.dumps({"edits": [{"op": "replace", "find": find, "text": "return x + 7"}]})}]
+    return refactor
+
+
+async def run(patched: bool, functions: int) -> tuple[list[float], int, int]:
+    update = {} if patched else {
+        "instruction": refactorer_patch_mode.rewrite_instruction,
+        "before_model_callback": [],
+        "after_model_callback": [],
+    }
+    model = TokenPacedLlm(rules=[Rule(when="*", reply=refactorer(functions))], agent=code_refactorer_agent.name)
+    agent = code_refactorer_agent.clone(update={"model": model, **update})
+    sessions = InMemorySessionService()
+    runner = Runner(agent=agent, app_name="bench_patching", session_service=sessions)
+    slots = asyncio.Semaphore(CONCURRENT_RUNS)
+
+    async def one(n: int) -> tuple[float, bool]:
+        async with slots:
+            state = {"generated_code": code(functions), "review_comments": REVIEW}
+            await sessions.create_session(app_name="bench_patching", user_id="bench", session_id=str(n), state=state)
+            content = types.Content(role="user", parts=[types.Part(text="Refactor the code.")])
+            start = time.perf_counter()
+            async for _ in runner.run_async(user_id="bench", session_id=str(n), new_message=content):
+                pass
+            elapsed = time.perf_counter() - start
+            session = await sessions.get_session(app_name="bench_patching", user_id="bench", session_id=str(n))
+            return elapsed, session.state.get("refactored_code") == code(functions, fixed=True)
+
+    results = await asyncio.gather(*(one(n) for n in range(RUNS)))
+    return [elapsed for elapsed, _ in results], model.output_tokens, sum(correct for _, correct in results)
+
+
+def main():
+    random.seed(7)
+    print(
+        f"{RUNS} refactorings per row, model {FIRST_TOKEN}s + {PER_TOKEN * 1e3:g}ms/output token, "
+        f"{FAIL_RATE:.0%} of patches don't apply"
+    )
+    print(f"{'functions':>9} {'mode':<8} {'tokens/run':>11} {'p50 (s)':>8} {'p95 (s)':>8} {'correct':>8}")
+    for functions in FUNCTIONS:
+        for patched in (False, True):
+            latencies, tokens, correct = asyncio.run(run(patched, functions))
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(
+                f"{functions:>9} {'patch' if patched else 'rewrite':<8} {tokens / RUNS:>11.0f} "
+                f"{quantiles[49]:>8.3f} {quantiles[94]:>8.3f} {correct:>5}/{RUNS}"
+            )
+    print(patching.STATS.report())
+    print("document tokens: " + ", ".join(f"{functions} functions {estimate_tokens(code(functions))}" for functions in FUNCTIONS))
+
+
+if __name__ == "__main__":
+    main()
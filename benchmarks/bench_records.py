@@ -0,0 +1,126 @@
+"""
+Memory and load time of the slotted record classes against the previous dataclass layout
+
+Both layouts load guest.json and order.json through the json storage with a cold cache,
+memory is what stays allocated once the parsed rows are dropped
+
+Run from the repository root:
+    python -m benchmarks.bench_records
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+import tempfile
+import tracemalloc
+import json
+import time
+import gc
+import os
+
+from waiter.models.schema import DB, Guest, Order
+from waiter.models.storage import JsonCache, JsonStorage
+
+SIZES = [10_000, 100_000]
+INGREDIENTS = ["cream", "milk", "butter", "wheat flour", "garlic", "basil", "cashew", "egg", "yogurt", "paneer"]
+DISHES = ["Margherita Pizza", "Penne Alfredo", "Caesar Salad", "Tandoori Chicken", "Chocolate Lava Cake", "Masala Chai"]
+ALLERGIES = ["dairy", "gluten", "nuts", "egg"]
+PREFERENCES = ["spicy", "vegetarian", "light", "sweet"]
+
+
+# ========== PREVIOUS LAYOUT ==========
+
+@dataclass(kw_only=True)
+class LegacyDB:
+    id: Optional[str] = field(default=None)
+    _filename: str = field(default="db.json", repr=False)
+
+    def __post_init__(self):
+        if not DB._storage.exists(self._filename):
+            raise FileNotFoundError(f"DB connection wasn't possible for: '{self._filename}'")
+
+
+@dataclass
+class LegacyGuest(LegacyDB):
+    name: Optional[str] = None
+    preferences: List[str] = field(default_factory=list)
+    allergies: List[str] = field(default_factory=list)
+    history: list = field(default_factory=list)
+    _filename: str = field(default="guest.json", init=False, repr=False)
+
+
+@dataclass
+class LegacyOrder(LegacyDB):
+    guest_id: Optional[str] = None
+    dishes: List[List[Union[str, dict[str, str]]]] = field(default_factory=list)
+    _filename: str = field(default="order.json", init=False, repr=False)
+
+
+# ========== BENCHMARK ==========
+
+def _seed(n: int):
+    guests = [
+        {"id": f"G{i:06d}", "name": f"guest {i}", "preferences": [PREFERENCES[i % 4]],
+         "allergies": [ALLERGIES[i % 4], ALLERGIES[(i + 1) % 4]], "history": []}
+        for i in range(n)
+    ]
+    orders = [
+        {"id": f"O{i:06d}", "guest_id": f"G{i:06d}", "dishes": [
+            [DISHES[(i + d) % len(DISHES)], {INGREDIENTS[(i + d) % len(INGREDIENTS)]: "leave out"} if d % 2 else {}]
+            for d in range(3)
+        ]}
+        for i in range(n)
+    ]
+    for filename, rows in (("guest.json", guests), ("order.json", orders)):
+        with open(filename, "w") as f:
+            json.dump(rows, f)
+
+
+def legacy_load() -> tuple[list, list]:
+    # what Guest.all() and Order.all() did before
+    return (
+        [LegacyGuest(**g) for g in DB._load_json("guest.json")],
+        [LegacyOrder(**o) for o in DB._load_json("order.json")],
+    )
+
+
+def slots_load() -> tuple[list, list]:
+    return Guest.all(), Order.all()
+
+
+def _measure(load) -> tuple[float, float]:
+    JsonStorage.cache = JsonCache()
+    gc.collect()
+    start = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - start
+
+    # timed separately, tracing slows allocations down
+    JsonStorage.cache = JsonCache()
+    gc.collect()
+    tracemalloc.start()
+    records = load()
+    JsonStorage.cache = JsonCache()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return retained / 2**20, elapsed * 1e3
+
+
+def main():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            DB.use_storage(JsonStorage())
+            print(f"{'layout':<9} {'records':>8} {'memory (MiB)':>13} {'load (ms)':>10}")
+            for n in SIZES:
+                _seed(n)
+                for name, load in (("dataclass", legacy_load), ("slots", slots_load)):
+                    memory, elapsed = _measure(load)
+                    print(f"{name:<9} {n:>8} {memory:>13.1f} {elapsed:>10.1f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Wall time of the loop/agent.py writing pipeline by refinement candidates per iteration
+
+The agents answer from a ScriptedLlm (common/fake_llm.py) with lognormal latency. Every
+review of a draft passes with probability ACCEPT_RATE, so the serial loop needs
+1 / ACCEPT_RATE refinements on average and each of them costs a critic and a refiner
+round trip. Drafting K candidates per critique shortens the loop to the first
+iteration where any of them passes, at K times the refinement calls.
+
+Run from the repository root:
+    python -m benchmarks.bench_refinement
+"""
+from contextlib import redirect_stdout
+import statistics
+import asyncio
+import random
+import json
+import time
+import io
+
+from google.adk.agents import SequentialAgent
+from google.adk.models.llm_request import LlmRequest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from common import patching, speculative_loop
+from common.fake_llm import install, lognormal, Rule
+from common.speculative_loop import SpeculativeLoopAgent
+from loop.agent import (
+    COMPLETION_PHRASE, STATE_CRITICISM, STATE_CURRENT_DOC,
+    critic_agent_in_loop, initial_writer_agent, refinement_loop, refiner_agent_in_loop,
+)
+
+CANDIDATES = [1, 2, 3, 4]
+RUNS = 100
+CONCURRENT_RUNS = 10
+MEDIAN = 0.2
+ACCEPT_RATE = 0.25
+CRITIQUES = ["Needs a stronger opening sentence.", "Clarify the character's goal and give the ending more weight."]
+
+
+def review(llm_request: LlmRequest) -> list[dict]:
+    if random.random() < ACCEPT_RATE:
+        return [{"text": COMPLETION_PHRASE}]
+    return [{"text": random.choice(CRITIQUES)}]
+
+
+def refine(llm_request: LlmRequest) -> list[dict]:
+    instruction = str(llm_request.config.system_instruction)
+    if f"**Critique/Suggestions:**\n    {COMPLETION_PHRASE}" in instruction:
+        return [{"function_call": {"name": "exit_loop", "args": {}}}]
+    # the refiner is in patch mode, see common/patching.py
+    document = instruction.split("**Current Document:**\n    ```\n    ", 1)[1].split("\n    ```", 1)[0]
+    edit = {"op": "replace", "find": document, "text": f"Draft {random.randrange(10_000)}: the story, refined."}
+    return [{"text": json.dumps({"edits": [edit]})}]
+
+
+def pipeline(candidates: int) -> tuple[SequentialAgent, dict]:
+    loop = SpeculativeLoopAgent(
+        name=refinement_loop.name,
+        sub_agents=[critic_agent_in_loop.clone(), refiner_agent_in_loop.clone()],
+        max_iterations=refinement_loop.max_iterations,
+        candidates=candidates,
+        completion_phrase=COMPLETION_PHRASE,
+        document_key=STATE_CURRENT_DOC,
+        critique_key=STATE_CRITICISM,
+    )
+    root = SequentialAgent(name="IterativeWritingPipeline", sub_agents=[initial_writer_agent.clone(), loop])
+    rules = {
+        initial_writer_agent.name: [Rule(when="*", reply=[{"text": "Once upon a time, a first draft."}])],
+        critic_agent_in_loop.name: [Rule(when="*", reply=review)],
+        refiner_agent_in_loop.name: [Rule(when="tool:exit_loop", reply=[{"text": ""}]), Rule(when="*", reply=refine)],
+    }
+    # the candidate copies share the models of the agents they are cloned from
+    return root, install(root, rules, latency=lognormal(MEDIAN, sigma=0.4))
+
+
+async def run(root: SequentialAgent) -> list[tuple[float, int, bool]]:
+    sessions = InMemorySessionService()
+    runner = Runner(agent=root, app_name="bench_refinement", session_service=sessions)
+    slots = asyncio.Semaphore(CONCURRENT_RUNS)
+
+    async def one(n: int) -> tuple[float, int, bool]:
+        async with slots:
+            await sessions.create_session(app_name="bench_refinement", user_id="bench", session_id=str(n))
+            content = types.Content(role="user", parts=[types.Part(text="A story about a lighthouse keeper.")])
+            refinements = 0
+            start = time.perf_counter()
+            async for event in runner.run_async(user_id="bench", session_id=str(n), new_message=content):
+                # the refiner's output in the serial loop, the chosen candidate in the speculative one
+                if STATE_CURRENT_DOC in event.actions.state_delta and event.author != initial_writer_agent.name:
+                    refinements += 1
+            elapsed = time.perf_counter() - start
+            session = await sessions.get_session(app_name="bench_refinement", user_id="bench", session_id=str(n))
+            return elapsed, refinements, session.state.get(STATE_CRITICISM, "").strip() == COMPLETION_PHRASE
+
+    return await asyncio.gather(*(one(n) for n in range(RUNS)))
+
+
+def main():
+    random.seed(7)
+    print(
+        f"{RUNS} runs, model latency lognormal median {MEDIAN}s, reviews pass with p={ACCEPT_RATE}, "
+        f"max {refinement_loop.max_iterations} iterations"
+    )
+    print(f"{'candidates':>10} {'iterations':>11} {'model calls':>12} {'p50 (s)':>8} {'p95 (s)':>8} {'completed':>10}")
+    for candidates in CANDIDATES:
+        root, models = pipeline(candidates)
+        with redirect_stdout(io.StringIO()):
+            results = asyncio.run(run(root))
+        calls = sum(model.calls for model in models.values())
+        latencies = [elapsed for elapsed, _, _ in results]
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"{candidates:>10} {statistics.mean(r for _, r, _ in results):>11.2f} {calls / RUNS:>12.1f} "
+            f"{quantiles[49]:>8.3f} {quantiles[94]:>8.3f} {sum(done for _, _, done in results) / RUNS:>10.0%}"
+        )
+    stats = speculative_loop.STATS
+    print(
+        f"speculative: {stats.iterations} iterations, {stats.candidates} candidates, "
+        f"{stats.completed} completed, {stats.cancelled} cancelled early"
+    )
+    print(patching.STATS.report())
+
+
+if __name__ == "__main__":
+    main()
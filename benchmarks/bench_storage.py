@@ -0,0 +1,68 @@
+"""
+Save latency of the json and write-ahead-log storage backends as order.json grows
+
+Run from the repository root:
+    python -m benchmarks.bench_storage
+"""
+from contextlib import redirect_stdout
+from pathlib import Path
+import statistics
+import tempfile
+import json
+import time
+import io
+import os
+
+from waiter.models.schema import DB, Order
+from waiter.models.storage import JsonStorage, WalStorage
+
+SIZES = [100, 1_000, 5_000, 20_000]
+SAVES = 200
+
+
+def _seed(n: int):
+    orders = [
+        {"id": f"O{i:06d}", "guest_id": f"G{i:06d}", "dishes": [["Penne Alfredo", {"cream": "less"}]]}
+        for i in range(n)
+    ]
+    with open(Order._filename, "w") as f:
+        json.dump(orders, f, indent=2)
+    for suffix in (".wal", ".wal.old"):
+        Path(Order._filename + suffix).unlink(missing_ok=True)
+
+
+def _time_saves(n: int) -> list[float]:
+    timings = []
+    with redirect_stdout(io.StringIO()):
+        for i in range(SAVES):
+            order = Order(id=f"O{i % n:06d}", guest_id="G000000", dishes=[["Masala Chai", {}]])
+            start = time.perf_counter()
+            order.save()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            print(f"{'backend':<8} {'records':>8} {'p50 (us)':>10} {'p99 (us)':>10}")
+            for name, make_storage in (("json", JsonStorage), ("wal", WalStorage)):
+                for n in SIZES:
+                    DB.use_storage(JsonStorage())
+                    _seed(n)
+                    DB.use_storage(make_storage())
+                    # warm the wal replay so only the save path is timed
+                    Order.all()
+                    timings = sorted(_time_saves(n))
+                    p50 = statistics.median(timings) * 1e6
+                    p99 = timings[int(len(timings) * 0.99) - 1] * 1e6
+                    print(f"{name:<8} {n:>8} {p50:>10.1f} {p99:>10.1f}")
+            DB.use_storage(JsonStorage())
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Offline load test of the waiter agent tree
+
+Every LlmAgent gets a ScriptedLlm (common/fake_llm.py) answering from
+benchmarks/recordings/waiter.json with a lognormal latency, then N concurrent guests
+walk through introduction -> seating -> recommendation -> ordering. Reports turn
+latency percentiles, tool calls and storage calls per turn, by phase. --rounds repeats
+the four turns to simulate a long dinner, the history compactor keeps prompts bounded,
+benchmarks/bench_history.py shows it round by round.
+
+Run from the repository root:
+    python -m benchmarks.load_test --guests 50 --median-latency 0.2
+    python -m benchmarks.load_test --guests 10 --rounds 10
+    python -m benchmarks.load_test --guests 20 --stream
+"""
+from contextlib import redirect_stdout
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+from pathlib import Path
+import statistics
+import argparse
+import tempfile
+import pickle
+import json
+import asyncio
+import random
+import shutil
+import time
+import io
+import os
+
+from google.adk.agents.run_config import RunConfig
+from google.adk.runners import Runner
+from google.genai.types import Content, Part
+
+from common.fake_llm import install, last_user_text, load_recording, lognormal, Rule
+from common.prefix_cache import PrefixCache
+from common.session_store import session_service_from_env
+from common.tool_cache import TOOL_CACHE
+from common.tracing import TRACER
+from waiter.agent import root_agent
+from waiter.models.schema import DB
+from waiter.models.storage import CountingStorage, JsonStorage, io_scope, storage_from_env
+from waiter.shared_libraries import templates
+from waiter.shared_libraries.events import STREAMING, TurnTimer
+from waiter.tools import history, router
+from waiter.tools.allergens import _menu_delta
+
+APP_NAME = "waiter_load_test"
+RECORDING = Path(__file__).parent / "recordings" / "waiter.json"
+DATA_FILES = ["dish.json", "guest.json", "order.json", "recommendation.json", "table.json"]
+# guests differ in their allergies and cravings so per-guest prompt content differs like it would in the restaurant
+ALLERGIES = ["dairy", "gluten", "nuts", "egg"]
+CRAVINGS = ["something light", "something spicy", "a hearty meal", "a warm drink", "a dessert"]
+TURNS = [
+    ("introduction", "Hi, I'm guest {n}, I'm allergic to {allergy}"),
+    ("seating", "Could I get a table for 4?"),
+    ("recommendation", "What do you recommend? I'd like {craving}"),
+    ("ordering", "I'd like to order the Masala Chai"),
+]
+
+
+@dataclass
+class TurnResult:
+    phase: str
+    latency: float
+    tool_calls: int
+    storage_calls: int
+    # pickled size of the turn's state deltas, what a non in-memory session service would store
+    state_bytes: int = 0
+    # state deltas json can't encode, each one breaks a database-backed session service
+    unserializable_deltas: int = 0
+    error: Optional[str] = None
+    # seconds until the first reply text, None for turns without any
+    first_token: Optional[float] = None
+
+
+def note_allergy(llm_request) -> list[dict]:
+    """Introduction reply: save the allergy the guest introduced themselves with."""
+    allergy = last_user_text(llm_request).rsplit(" ", 1)[-1]
+    return [{"function_call": {"name": "set_allergies", "args": {"allergies": [allergy]}}}]
+
+
+def pick_free_table(llm_request) -> list[dict]:
+    """Seating reply: allot a random table from the find_tables response."""
+    response = llm_request.contents[-1].parts[0].function_response.response
+    # find_tables results are json snapshots, see common/tool_cache.py
+    tables = [t for t in response.get("result", []) if not t["occupied"]]
+    if not tables:
+        return [{"text": "Sorry, we're full right now."}]
+    return [{"function_call": {"name": "allot_to_guest", "args": {"table_id": random.choice(tables)["id"]}}}]
+
+
+def percentile(values: list[float], p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+async def run_guest(
+    n: int, runner: Runner, storage: CountingStorage, results: list[TurnResult], rounds: int = 1, run_config: Optional[RunConfig] = None
+):
+    user_id, session_id = f"guest_{n}", f"session_{n}"
+    await runner.session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    for turn, (phase, text) in enumerate(TURNS * rounds):
+        scope = f"{session_id}:{turn}:{phase}"
+        io_scope.set(scope)
+        content = Content(role="user", parts=[Part(text=text.format(n=n, allergy=ALLERGIES[n % len(ALLERGIES)], craving=CRAVINGS[n % len(CRAVINGS)]))])
+        tool_calls, state_bytes, unserializable, error = 0, 0, 0, None
+        start = time.perf_counter()
+        timer = TurnTimer()
+        try:
+            async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=content, run_config=run_config):
+                timer.observe(event)
+                if event.partial:
+                    continue
+                tool_calls += len(event.get_function_calls())
+                if event.actions.state_delta:
+                    state_bytes += len(pickle.dumps(dict(event.actions.state_delta)))
+                    try:
+                        json.dumps(event.actions.state_delta)
+                    except TypeError:
+                        unserializable += 1
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - start
+        first_token = timer.finish()["first_token_ms"]
+        results.append(TurnResult(
+            phase, latency, tool_calls, storage.total(scope), state_bytes, unserializable, error,
+            None if first_token is None else first_token / 1e3,
+        ))
+
+
+async def run(guests: int, median_latency: float, rounds: int = 1, stream: bool = False):
+    rules = load_recording(str(RECORDING))
+    rules["root_agent"].insert(0, Rule(when="tool:new_guest", reply=note_allergy))
+    rules["seating_agent"].insert(0, Rule(when="tool:find_tables", reply=pick_free_table))
+    cache = PrefixCache()
+    # gap between the chunks of a streamed answer, --stream only
+    models = install(root_agent, rules, latency=lognormal(median_latency), cache=cache, chunk_latency=lognormal(median_latency / 10))
+    storage = CountingStorage(storage_from_env())
+    DB.use_storage(storage)
+
+    runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service_from_env())
+    results: list[TurnResult] = []
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(run_guest(n, runner, storage, results, rounds, STREAMING if stream else None) for n in range(guests)))
+    elapsed = time.perf_counter() - start
+
+    by_phase: dict[str, list[TurnResult]] = defaultdict(list)
+    for result in results:
+        by_phase[result.phase].append(result)
+    print(f"{guests} guests, {len(results)} turns in {elapsed:.2f}s, {sum(m.calls for m in models.values())} model calls")
+    print(
+        f"{'phase':<16} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'ttft p50':>9} {'tools/turn':>11} {'io/turn':>8} "
+        f"{'state B/turn':>13} {'non-json':>9} {'errors':>7}"
+    )
+    for phase, _ in TURNS:
+        turns = by_phase[phase]
+        latencies = [t.latency for t in turns]
+        first_tokens = [t.first_token for t in turns if t.first_token is not None]
+        print(
+            f"{phase:<16} {percentile(latencies, 50):>8.3f} {percentile(latencies, 95):>8.3f} "
+            f"{percentile(latencies, 99):>8.3f} {percentile(first_tokens, 50):>9.3f} "
+            f"{statistics.mean(t.tool_calls for t in turns):>11.2f} "
+            f"{statistics.mean(t.storage_calls for t in turns):>8.2f} "
+            f"{statistics.mean(t.state_bytes for t in turns):>13.0f} {sum(t.unserializable_deltas for t in turns):>9} "
+            f"{sum(1 for t in turns if t.error):>7}"
+        )
+    stats = history.STATS
+    if stats.requests:
+        print(
+            f"history: {stats.compacted}/{stats.requests} requests compacted, prompt tokens/request "
+            f"{stats.tokens_before / stats.requests:.0f} -> {stats.tokens_after / stats.requests:.0f}, "
+            f"max {max(h['tokens_before'] for h in stats.history)} -> {max(h['tokens_after'] for h in stats.history)}"
+        )
+    prompts = templates.STATS
+    print("prompts: " + ", ".join(f"{name} {prompts.mean_ms(name):.3f}ms x{calls}" for name, calls in sorted(prompts.calls.items())))
+    menu = _menu_delta.cache_info()
+    print(f"menu renders: {menu.misses}, cache hits: {menu.hits}")
+    print(cache.report())
+    print(TRACER.report())
+    print(TOOL_CACHE.report())
+    files = JsonStorage.cache
+    print(f"json files: {files.misses} parses, {files.hits} cache hits ({files.hit_rate:.1%})")
+    print(
+        f"router: {router.STATS.avoided} root model calls avoided {dict(router.STATS.routed)}, "
+        f"fell back {dict(router.STATS.fallbacks)}"
+    )
+    errors = {t.error for t in results if t.error}
+    for error in sorted(errors):
+        print(f"error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guests", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=1, help="times each guest repeats the four turns")
+    parser.add_argument("--median-latency", type=float, default=0.05, help="median fake model latency in seconds")
+    parser.add_argument("--stream", action="store_true", help="run turns with SSE streaming, replies arrive in chunks")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in DATA_FILES:
+            shutil.copy(name, tmp)
+        os.chdir(tmp)
+        try:
+            asyncio.run(run(args.guests, args.median_latency, args.rounds, args.stream))
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Fire hundreds of simultaneous `TableStore.allot_to_guest` calls and count double bookings
+
+With `--processes N` the guests are split over N processes sharing the data files,
+each with its own TableStore, as several server workers would
+
+Run from the repository root:
+    python -m benchmarks.stress_tables --guests 500 --threads 64
+    python -m benchmarks.stress_tables --guests 500 --threads 16 --processes 4
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
+from collections import defaultdict
+from types import SimpleNamespace
+import multiprocessing
+import threading
+import argparse
+import tempfile
+import random
+import shutil
+import time
+import io
+import os
+
+from waiter.models.schema import Guest, Table
+from waiter.models.services import GuestStore, TableStore
+from waiter.shared_libraries import constants
+
+DATA_FILES = ["guest.json", "table.json"]
+
+
+def race(guest_ids: list[str], threads: int) -> dict[str, list[str]]:
+    """
+    Every guest tries to take a random table, returns table id -> guests it was allotted to
+    """
+    table_ids = [table.id for table in TableStore()._tables]
+    GuestStore()._guests.extend(Guest(id=guest_id, name=guest_id) for guest_id in guest_ids)
+
+    # every guest races for a table, all threads released at once
+    start_line = threading.Barrier(threads)
+    wins: dict[str, list[str]] = defaultdict(list)
+
+    def attempt(guest_id: str):
+        tool_context = SimpleNamespace(state={constants.GUEST_KEY: guest_id, constants.TABLE_KEY: None})
+        table_id = random.choice(table_ids)
+        try:
+            start_line.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        allotted, _ = TableStore.allot_to_guest(tool_context, table_id)
+        if allotted:
+            wins[table_id].append(guest_id)
+
+    with redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(attempt, guest_ids))
+    return dict(wins)
+
+
+def _race_in(directory: str, guest_ids: list[str], threads: int) -> dict[str, list[str]]:
+    # a worker process, the stores load from the data files of the directory
+    os.chdir(directory)
+    return race(guest_ids, threads)
+
+
+def run(guests: int, threads: int, processes: int = 1):
+    guest_ids = [f"stress_{n}" for n in range(guests)]
+    start = time.perf_counter()
+    if processes == 1:
+        wins = race(guest_ids, threads)
+    else:
+        wins = defaultdict(list)
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            shares = [guest_ids[i::processes] for i in range(processes)]
+            for result in pool.map(_race_in, [os.getcwd()] * processes, shares, [threads] * processes):
+                for table_id, winners in result.items():
+                    wins[table_id].extend(winners)
+    elapsed = time.perf_counter() - start
+
+    persisted = {table.id: table.guest_id for table in Table.all()}
+    double_booked = [table_id for table_id, winners in wins.items() if len(winners) > 1]
+    lost_updates = [table_id for table_id, winners in wins.items() if persisted.get(table_id) != winners[-1]]
+    print(f"{guests} allot calls on {len(persisted)} tables from {processes} x {threads} threads in {elapsed:.2f}s")
+    print(f"tables allotted: {len(wins)}, double bookings: {len(double_booked)}, lost updates: {len(lost_updates)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in DATA_FILES:
+            shutil.copy(name, tmp)
+        os.chdir(tmp)
+        try:
+            run(args.guests, args.threads, args.processes)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
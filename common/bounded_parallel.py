@@ -0,0 +1,187 @@
+"""
+ParallelAgent with a concurrency cap, per-branch deadlines and hedged attempts
+
+ADK's ParallelAgent starts every sub agent at once and finishes when the slowest
+one does. `BoundedParallelAgent` runs at most `max_concurrency` branches at a time
+and gives each branch `branch_timeout` seconds from the moment it gets a slot. A
+branch still running after `hedge_after` seconds, or one that failed, gets another
+attempt on its own sub branch, the first attempt to finish wins and the others are
+cancelled. A branch that times out or fails every attempt gets `missing_marker`
+written to its agent's `output_key`, so the agent merging the outputs always runs
+and can tell what didn't arrive.
+
+    research = BoundedParallelAgent(
+        name="Research",
+        sub_agents=[researcher_1, researcher_2, researcher_3],
+        max_concurrency=2,
+        branch_timeout=20,
+        hedge_after=8,
+    )
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from collections import Counter
+from typing import AsyncGenerator, Optional
+import asyncio
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.utils.context_utils import Aclosing
+
+
+@dataclass
+class ParallelStats:
+    """Process wide counters of BoundedParallelAgent branches."""
+    branches: int = 0
+    attempts: int = 0
+    hedges: int = 0
+    # branches won by an attempt other than the first
+    hedge_wins: int = 0
+    # branch outcome ("done", "timeout", "failed") -> count
+    outcomes: Counter = field(default_factory=Counter)
+
+
+STATS = ParallelStats()
+
+_BRANCH_DONE = object()
+
+
+class BoundedParallelAgent(BaseAgent):
+    """
+    Runs its sub agents concurrently on separate branches, bounded in number and time
+
+    Args:
+        max_concurrency (int): attempts running at once across all branches
+        branch_timeout (Optional[float]): seconds a branch may take once it has a slot, None waits forever
+        hedge_after (Optional[float]): seconds after which a still running branch gets another attempt, None never hedges
+        max_attempts (int): attempts per branch, hedges and retries after a failure included
+        missing_marker (str): written to the output_key of branches without a result, formatted with
+            `agent` and `reason`
+    """
+    max_concurrency: int = 4
+    branch_timeout: Optional[float] = None
+    hedge_after: Optional[float] = None
+    max_attempts: int = 2
+    missing_marker: str = "[MISSING: {agent} returned no result ({reason})]"
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if not self.sub_agents:
+            return
+        queue: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        branches = [asyncio.create_task(self._run_branch(ctx, sub_agent, slots, queue)) for sub_agent in self.sub_agents]
+        finished = 0
+        try:
+            while finished < len(branches):
+                item = await queue.get()
+                if item is _BRANCH_DONE:
+                    finished += 1
+                    continue
+                event, resume = item
+                yield event
+                # attempts wait until their event is processed, like ParallelAgent
+                resume.set()
+        finally:
+            for branch in branches:
+                branch.cancel()
+            await asyncio.gather(*branches, return_exceptions=True)
+
+    def _branch_ctx(self, ctx: InvocationContext, sub_agent: BaseAgent, attempt: int) -> InvocationContext:
+        # every attempt gets its own conversation branch, hedges don't see each other's events
+        branch_ctx = ctx.model_copy()
+        name = sub_agent.name if attempt == 1 else f"{sub_agent.name}_hedge{attempt - 1}"
+        branch_ctx.branch = f"{ctx.branch}.{self.name}.{name}" if ctx.branch else f"{self.name}.{name}"
+        return branch_ctx
+
+    async def _attempt(
+        self,
+        ctx: InvocationContext,
+        sub_agent: BaseAgent,
+        attempt: int,
+        slots: asyncio.Semaphore,
+        queue: asyncio.Queue,
+        running: asyncio.Event,
+    ):
+        async with slots:
+            running.set()
+            STATS.attempts += 1
+            events = sub_agent.run_async(self._branch_ctx(ctx, sub_agent, attempt))
+            async with Aclosing(events):
+                async for event in events:
+                    resume = asyncio.Event()
+                    await queue.put((event, resume))
+                    await resume.wait()
+
+    async def _race(self, ctx: InvocationContext, sub_agent: BaseAgent, slots: asyncio.Semaphore, queue: asyncio.Queue) -> Optional[str]:
+        """
+        Run attempts of one branch until one finishes, the deadline passes or all of them failed
+
+        Returns:
+            Optional[str]: why the branch has no result, None when it has one
+        """
+        loop = asyncio.get_running_loop()
+        running = asyncio.Event()
+        attempts = {asyncio.create_task(self._attempt(ctx, sub_agent, 1, slots, queue, running)): 1}
+        started = 1
+        reason = "failed"
+        try:
+            # the clocks start once the branch has a slot
+            waiting = asyncio.create_task(running.wait())
+            await asyncio.wait([waiting, *attempts], return_when=asyncio.FIRST_COMPLETED)
+            waiting.cancel()
+            now = loop.time()
+            deadline = None if self.branch_timeout is None else now + self.branch_timeout
+            next_hedge = None if self.hedge_after is None else now + self.hedge_after
+
+            while attempts:
+                wake_at = min((t for t in (deadline, next_hedge) if t is not None), default=None)
+                done, _ = await asyncio.wait(
+                    attempts,
+                    timeout=None if wake_at is None else max(0.0, wake_at - loop.time()),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    attempt = attempts.pop(task)
+                    if not task.cancelled() and task.exception() is None:
+                        if attempt > 1:
+                            STATS.hedge_wins += 1
+                        return None
+                    reason = "failed" if task.cancelled() else f"failed: {type(task.exception()).__name__}"
+                now = loop.time()
+                if deadline is not None and now >= deadline:
+                    return f"no result within {self.branch_timeout:g}s"
+                retry = bool(done) and not attempts
+                hedge = next_hedge is not None and now >= next_hedge
+                if (retry or hedge) and started < self.max_attempts:
+                    started += 1
+                    STATS.hedges += hedge and not retry
+                    attempts[asyncio.create_task(self._attempt(ctx, sub_agent, started, slots, queue, asyncio.Event()))] = started
+                    next_hedge = None if self.hedge_after is None else now + self.hedge_after
+                elif hedge:
+                    next_hedge = None
+            return reason
+        finally:
+            for task in attempts:
+                task.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+    async def _run_branch(self, ctx: InvocationContext, sub_agent: BaseAgent, slots: asyncio.Semaphore, queue: asyncio.Queue):
+        STATS.branches += 1
+        try:
+            reason = await self._race(ctx, sub_agent, slots, queue)
+            STATS.outcomes["done" if reason is None else "failed" if reason.startswith("failed") else "timeout"] += 1
+            output_key = sub_agent.output_key if isinstance(sub_agent, LlmAgent) else None
+            if reason is not None and output_key:
+                marker = self.missing_marker.format(agent=sub_agent.name, reason=reason)
+                event = Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(state_delta={output_key: marker}),
+                )
+                resume = asyncio.Event()
+                await queue.put((event, resume))
+                await resume.wait()
+        finally:
+            await queue.put(_BRANCH_DONE)
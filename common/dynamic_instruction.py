@@ -0,0 +1,53 @@
+"""
+Per-turn instructions sent after the conversation instead of before it
+
+ADK puts an agent's `instruction` in the system instruction, or, once the agent
+has a `static_instruction`, right before the latest batch of user messages. Both
+place text that changes every turn in front of content earlier requests already
+sent, so a provider's prefix cache stops matching there, and the insertion point
+moves between the model calls of a single turn.
+
+`dynamic_suffix` builds a before-model callback that renders the instruction and
+appends it as the last message: the static instruction, the tools and the whole
+conversation so far stay a prefix shared with the previous request.
+
+The static instruction is sent as `static_instruction` and must be identical for
+every guest and turn, byte for byte, so the provider can cache it across sessions.
+Anything read from storage goes in once, when the agent is constructed, everything
+that changes is left to the provider.
+
+    LlmAgent(
+        static_instruction=STATIC_PART,
+        before_model_callback=dynamic_suffix(dynamic_part_provider),
+    )
+"""
+from typing import Callable
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+BEGIN = "<turn_instructions>"
+END = "</turn_instructions>"
+
+
+def is_dynamic_instruction(content: types.Content) -> bool:
+    parts = content.parts or []
+    return content.role == "user" and bool(parts) and (parts[0].text or "").startswith(BEGIN)
+
+
+def dynamic_suffix(provider: Callable[[ReadonlyContext], str]):
+    """
+    Build the before-model callback appending `provider(context)` to the request
+
+    Args:
+        provider: instruction provider, called with the callback context on every model call
+    """
+    def append_dynamic_instruction(callback_context: CallbackContext, llm_request: LlmRequest):
+        text = provider(callback_context)
+        llm_request.contents.append(
+            types.Content(role="user", parts=[types.Part(text=f"{BEGIN}\n{text}\n{END}")])
+        )
+
+    return append_dynamic_instruction
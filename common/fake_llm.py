@@ -0,0 +1,196 @@
+"""
+Scripted model backend for running agent trees offline
+
+`ScriptedLlm` plugs into the `model` slot of an `LlmAgent` and answers from a list
+of rules instead of calling Gemini. A rule matches on the last tool response or on
+the latest user text and replies with recorded text / function-call parts, after
+sleeping for a delay drawn from a latency distribution.
+
+Recordings are json files shaped like:
+    {
+        "root_agent": [
+            {"when": "tool:new_guest", "reply": [{"text": "Welcome!"}]},
+            {"when": "user:table", "reply": [{"function_call": {"name": "transfer_to_agent", "args": {"agent_name": "seating_agent"}}}]},
+            {"when": "*", "reply": [{"function_call": {"name": "new_guest", "args": {"name": "guest"}}}]}
+        ]
+    }
+"""
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Callable, Optional, Union
+import asyncio
+import random
+import json
+import re
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from common.dynamic_instruction import is_dynamic_instruction
+
+Latency = Callable[[], float]
+Reply = Union[list[dict], Callable[[LlmRequest], list[dict]]]
+# words per partial response of a streamed answer
+CHUNK_WORDS = 3
+
+
+# ========== LATENCY DISTRIBUTIONS ==========
+
+def fixed(seconds: float) -> Latency:
+    return lambda: seconds
+
+def uniform(low: float, high: float) -> Latency:
+    return lambda: random.uniform(low, high)
+
+def lognormal(median: float, sigma: float = 0.5) -> Latency:
+    """Long-tailed latency, the shape real model round-trips tend to have."""
+    return lambda: random.lognormvariate(0, sigma) * median
+
+
+# ========== RULES ==========
+
+@dataclass
+class Rule:
+    """
+    when:
+        "tool:<name>"   the request ends with the response of tool <name>
+        "user:<regex>"  the latest user text matches <regex> (case-insensitive)
+        "*"             always
+    reply: parts as dicts (`types.Part` fields) or a callable building them from the request
+    """
+    when: str
+    reply: Reply
+
+    def matches(self, llm_request: LlmRequest) -> bool:
+        if self.when == "*":
+            return True
+        kind, _, pattern = self.when.partition(":")
+        if kind == "tool":
+            return last_tool_response(llm_request) == pattern
+        if kind == "user":
+            return re.search(pattern, last_user_text(llm_request), re.IGNORECASE) is not None
+        raise ValueError(f"Unknown rule condition: '{self.when}'")
+
+
+# the dynamic instruction of agents with a static_instruction rides in a user message,
+# fenced by ADK or appended by common/dynamic_instruction.py
+_INSTRUCTION_MARKER = "<<<BEGIN_SYSTEM_INSTRUCTION>>>"
+
+
+def _is_instruction(content: types.Content) -> bool:
+    return is_dynamic_instruction(content) or any(_INSTRUCTION_MARKER in (part.text or "") for part in content.parts or [])
+
+
+def last_tool_response(llm_request: LlmRequest) -> Optional[str]:
+    contents = [content for content in llm_request.contents if not _is_instruction(content)]
+    if not contents:
+        return None
+    for part in contents[-1].parts or []:
+        if part.function_response:
+            return part.function_response.name
+    return None
+
+
+def last_user_text(llm_request: LlmRequest) -> str:
+    for content in reversed(llm_request.contents):
+        if content.role != "user" or _is_instruction(content):
+            continue
+        text = "".join(part.text or "" for part in content.parts or [])
+        # other agents' turns are replayed to the model as "For context:" user messages
+        if text and not text.startswith("For context:"):
+            return text
+    return ""
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ========== MODEL ==========
+
+class ScriptedLlm(BaseLlm):
+    """
+    Model that answers from rules, the first rule whose condition matches wins
+
+    Args:
+        rules (list[Rule]): rules for the agent this instance is installed on
+        latency (Latency): seconds to wait before answering, drawn per call, the time to first token when streaming
+        chunk_latency (Latency): seconds between the partial responses of a streamed answer, drawn per chunk
+        cache (PrefixCache): prefix cache simulator every request is shown to, see common/prefix_cache.py
+    """
+    model: str = "scripted"
+    rules: list[Rule] = []
+    latency: Latency = fixed(0.0)
+    chunk_latency: Latency = fixed(0.0)
+    calls: int = 0
+    agent: str = ""
+    cache: Optional[Any] = None
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.calls += 1
+        cached = self.cache.observe(self.agent, llm_request) if self.cache is not None else 0
+        await asyncio.sleep(self.latency())
+        rule = next((r for r in self.rules if r.matches(llm_request)), None)
+        if rule is None:
+            parts = [{"text": ""}]
+        else:
+            parts = rule.reply(llm_request) if callable(rule.reply) else rule.reply
+        prompt = str(llm_request.config.system_instruction or "") + "".join(
+            str(content.model_dump(exclude_none=True)) for content in llm_request.contents
+        )
+        if stream:
+            # text arrives a few words at a time, then the whole response like Gemini's last SSE chunk
+            text = "".join(part.get("text") or "" for part in parts if isinstance(part, dict))
+            words = text.split(" ")
+            for i in range(0, len(words) if text else 0, CHUNK_WORDS):
+                if i:
+                    await asyncio.sleep(self.chunk_latency())
+                chunk = " ".join(words[i:i + CHUNK_WORDS]) + (" " if i + CHUNK_WORDS < len(words) else "")
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=chunk)]), partial=True)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part.model_validate(p) for p in parts]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=estimate_tokens(prompt),
+                candidates_token_count=estimate_tokens(json.dumps(parts, default=str)),
+                cached_content_token_count=cached // 4,
+            ),
+        )
+
+
+def load_recording(path: str) -> dict[str, list[Rule]]:
+    with open(path) as f:
+        return {agent: [Rule(**rule) for rule in rules] for agent, rules in json.load(f).items()}
+
+
+def install(
+    agent: BaseAgent,
+    rules: dict[str, list[Rule]],
+    latency: Latency = fixed(0.0),
+    cache: Optional[Any] = None,
+    chunk_latency: Latency = fixed(0.0),
+) -> dict[str, ScriptedLlm]:
+    """
+    Replace the model of every LlmAgent in the tree that has rules with a ScriptedLlm
+
+    Returns:
+        dict[str, ScriptedLlm]: installed models by agent name, to read call counts from
+    """
+    models: dict[str, ScriptedLlm] = {}
+    pending = [agent]
+    while pending:
+        current = pending.pop()
+        pending.extend(current.sub_agents)
+        if isinstance(current, LlmAgent) and current.name in rules:
+            # agents can share a name across subtrees (the refinement loop is cloned), share the model too
+            models.setdefault(
+                current.name,
+                ScriptedLlm(
+                    rules=rules[current.name], latency=latency, chunk_latency=chunk_latency, agent=current.name, cache=cache
+                ),
+            )
+            current.model = models[current.name]
+    return models
@@ -0,0 +1,231 @@
+"""
+Patch mode for agents that refine a document kept in state
+
+A refiner asked to apply a one sentence critique still writes the whole document
+again, and output tokens are what a model call spends most of its time on.
+`patch_mode` swaps the agent's instruction for one asking only for the edits, as
+JSON in PATCH_FORMAT, and applies them locally to the document in state: the
+model's response is replaced by the patched document, so `output_key` and every
+agent after it still see the full text. A patch that doesn't parse or apply falls
+back to one call with the original, full rewrite instruction: the agent's part of the
+system instruction is swapped and the call goes through the agent's model flow, so
+its model callbacks and plugins see it like any other.
+
+    refiner_patch_mode = patch_mode(refiner_agent, source_key="current_document", patch_instruction=f'''
+        ...
+        {PATCH_FORMAT}
+    ''')
+    print(STATS.report())
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from collections import Counter
+from typing import NamedTuple, Optional
+import json
+import re
+
+from google.adk.agents import LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.events import Event
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.utils.context_utils import Aclosing
+from google.adk.utils.instructions_utils import inject_session_state
+from google.genai import types
+
+OPS = ("replace", "insert_before", "insert_after", "delete")
+
+PATCH_FORMAT = """Do NOT output the whole text. Output *only* a JSON object listing your edits to it:
+{"edits": [{"op": "replace", "find": "<text to change>", "text": "<new text>"}]}
+`op` is one of "replace", "insert_before", "insert_after" or "delete" (no `text`).
+`find` is copied exactly from the current text and must occur in it once, keep it short but unique.
+Use as few edits as possible, an empty list keeps the text unchanged."""
+
+# requests waiting for their response, those of failed model calls are dropped oldest first
+MAX_PENDING = 1_000
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class PatchError(ValueError):
+    """Raised with (reason, detail) when a response isn't a patch that applies."""
+
+
+class Edit(NamedTuple):
+    op: str
+    find: str
+    text: str = ""
+
+
+def parse_edits(response: str) -> list[Edit]:
+    """
+    Edits of a patch mode response, raises PatchError when it isn't a patch
+    """
+    try:
+        patch = json.loads(_FENCE.sub("", response.strip()))
+    except json.JSONDecodeError as e:
+        raise PatchError("not json", e.msg) from None
+    edits = patch.get("edits") if isinstance(patch, dict) else None
+    if not isinstance(edits, list):
+        raise PatchError("not json", "no edits list")
+    parsed = []
+    for edit in edits:
+        if not isinstance(edit, dict) or edit.get("op", "replace") not in OPS:
+            raise PatchError("bad edit", repr(edit))
+        find, text = edit.get("find"), edit.get("text", "")
+        if not isinstance(find, str) or not find or not isinstance(text, str):
+            raise PatchError("bad edit", repr(edit))
+        parsed.append(Edit(edit.get("op", "replace"), find, text))
+    return parsed
+
+
+def apply_edits(document: str, edits: list[Edit]) -> str:
+    """
+    Apply the edits in order, each one to the result of the previous ones
+
+    Raises:
+        PatchError: an edit's `find` text doesn't occur exactly once
+    """
+    for edit in edits:
+        count = document.count(edit.find)
+        if count != 1:
+            raise PatchError("no match" if count == 0 else "ambiguous", edit.find[:40])
+        new = {
+            "replace": edit.text,
+            "insert_before": edit.text + edit.find,
+            "insert_after": edit.find + edit.text,
+            "delete": "",
+        }[edit.op]
+        document = document.replace(edit.find, new, 1)
+    return document
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class PatchStats:
+    """Process wide counters of patch mode model calls."""
+    patches: int = 0
+    # fallback reason -> count
+    fallbacks: Counter = field(default_factory=Counter)
+    # output tokens the patches took, and what writing the patched documents would have taken
+    patch_tokens: int = 0
+    rewrite_tokens: int = 0
+    # output tokens of patches that failed, spent on top of their rewrite
+    wasted_tokens: int = 0
+    # output tokens saved per refinement, negative for fallbacks
+    history: list[int] = field(default_factory=list)
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.rewrite_tokens - self.patch_tokens - self.wasted_tokens
+
+    def report(self) -> str:
+        refinements = len(self.history)
+        per = self.saved_tokens / refinements if refinements else 0.0
+        return (
+            f"patches: {self.patches}/{refinements} refinements applied as patches, "
+            f"fell back {dict(self.fallbacks)}, output tokens saved {self.saved_tokens} ({per:.0f}/refinement)"
+        )
+
+
+STATS = PatchStats()
+
+
+class PatchMode:
+    """
+    Callbacks turning an agent's patch responses into the patched document
+
+    Args:
+        source_key (str): state key of the document the edits apply to
+        rewrite_instruction (str): instruction for a full rewrite, used when a patch fails
+        patch_instruction (str): the agent's instruction in patch mode, swapped for the rewrite one
+    """
+
+    def __init__(self, source_key: str, rewrite_instruction: str, patch_instruction: str = ""):
+        self.source_key = source_key
+        self.rewrite_instruction = rewrite_instruction
+        self.patch_instruction = patch_instruction
+        self._pending: dict[tuple[str, str], LlmRequest] = {}
+        # (invocation, agent) of rewrites in flight, their model call passes through these callbacks
+        self._rewriting: set[tuple[str, str]] = set()
+
+    def before_model(self, callback_context: CallbackContext, llm_request: LlmRequest):
+        if (callback_context.invocation_id, callback_context.agent_name) in self._rewriting:
+            return
+        if len(self._pending) >= MAX_PENDING:
+            self._pending.pop(next(iter(self._pending)))
+        self._pending[(callback_context.invocation_id, callback_context.agent_name)] = llm_request
+
+    async def after_model(self, callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        if llm_response.partial or (callback_context.invocation_id, callback_context.agent_name) in self._rewriting:
+            return None
+        llm_request = self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        parts = llm_response.content.parts if llm_response.content else None
+        # function calls, e.g. an exit tool, and empty turns pass through
+        if llm_request is None or not parts or any(part.function_call for part in parts):
+            return None
+        response = "".join(part.text or "" for part in parts)
+        if not response.strip():
+            return None
+        usage = llm_response.usage_metadata
+        patch_tokens = usage.candidates_token_count if usage and usage.candidates_token_count else _tokens(response)
+        try:
+            document = apply_edits(str(callback_context.state.get(self.source_key, "")), parse_edits(response))
+        except PatchError as e:
+            STATS.fallbacks[e.args[0]] += 1
+            STATS.wasted_tokens += patch_tokens
+            STATS.history.append(-patch_tokens)
+            return await self._rewrite(callback_context, llm_request)
+        STATS.patches += 1
+        STATS.patch_tokens += patch_tokens
+        STATS.rewrite_tokens += _tokens(document)
+        STATS.history.append(_tokens(document) - patch_tokens)
+        return LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=document)]),
+            usage_metadata=usage,
+        )
+
+    async def _rewrite(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        request = llm_request.model_copy(deep=True)
+        system = str(request.config.system_instruction or "")
+        patch = await inject_session_state(self.patch_instruction, callback_context)
+        rewrite = await inject_session_state(self.rewrite_instruction, callback_context)
+        # only the agent's own instruction changes, global and transfer instructions stay
+        request.config.system_instruction = system.replace(patch, rewrite, 1) if patch and patch in system else rewrite
+        # the agent running right now, copies of the patched agent share its callbacks
+        ctx = callback_context._invocation_context
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        # state changes of the call's callbacks land on the event of the response being replaced
+        event = Event(invocation_id=ctx.invocation_id, author=ctx.agent.name, branch=ctx.branch, actions=callback_context.actions)
+        self._rewriting.add(key)
+        response = None
+        try:
+            async with Aclosing(ctx.agent._llm_flow._call_llm_async(ctx, request, event)) as responses:
+                async for chunk in responses:
+                    if not chunk.partial:
+                        response = chunk
+        finally:
+            self._rewriting.discard(key)
+        return response
+
+
+def patch_mode(agent: LlmAgent, source_key: str, patch_instruction: str) -> PatchMode:
+    """
+    Make the agent answer with edits to `state[source_key]` instead of the whole text
+
+    The agent's instruction is kept as the fallback for patches that fail to apply
+
+    Args:
+        source_key (str): state key of the document the edits apply to
+        patch_instruction (str): instruction asking for the edits, typically ending with PATCH_FORMAT
+    """
+    mode = PatchMode(source_key, agent.instruction, patch_instruction)
+    agent.instruction = patch_instruction
+    for attribute, callback in (("before_model_callback", mode.before_model), ("after_model_callback", mode.after_model)):
+        current = getattr(agent, attribute)
+        callbacks = [] if current is None else list(current) if isinstance(current, list) else [current]
+        setattr(agent, attribute, [*callbacks, callback])
+    return mode
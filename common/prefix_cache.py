@@ -0,0 +1,114 @@
+"""
+Local simulation of provider-side prompt prefix caching
+
+Providers cache the longest prefix a request shares with earlier requests, in
+fixed size blocks: system instruction first, then tool declarations, then the
+conversation. `PrefixCache` replays that on the requests it is shown, hashing
+each block together with everything before it, so a block only hits when the
+whole prefix up to it was seen before. Hit rates are kept per agent, together
+with how often the static part (system instruction + tools) hit as a whole.
+
+    cache = PrefixCache()
+    install(root_agent, rules, cache=cache)   # common/fake_llm.py feeds it every request
+    ...
+    print(cache.report())
+"""
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from hashlib import sha1
+import threading
+
+from google.adk.models.llm_request import LlmRequest
+
+
+@dataclass
+class AgentCacheStats:
+    requests: int = 0
+    prompt_chars: int = 0
+    cached_chars: int = 0
+    # requests whose system instruction and tool declarations were seen before, byte for byte
+    static_hits: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.cached_chars / self.prompt_chars if self.prompt_chars else 0.0
+
+
+def static_prefix(llm_request: LlmRequest) -> str:
+    """
+    Serialised system instruction and tool declarations, the part meant to stay constant
+    """
+    config = llm_request.config
+    instruction = config.system_instruction if config else None
+    if instruction is not None and not isinstance(instruction, str):
+        instruction = instruction.model_dump_json(exclude_none=True) if hasattr(instruction, "model_dump_json") else str(instruction)
+    tools = "".join(tool.model_dump_json(exclude_none=True) for tool in (config.tools or [])) if config else ""
+    return (instruction or "") + tools
+
+
+def serialise(llm_request: LlmRequest) -> tuple[str, int]:
+    """
+    The request as the provider would see it, and the length of its static part
+    """
+    static = static_prefix(llm_request)
+    contents = "".join(content.model_dump_json(exclude_none=True) for content in llm_request.contents)
+    return static + contents, len(static)
+
+
+class PrefixCache:
+    """
+    Block level LRU prefix cache shared by every agent, like a provider's
+
+    Args:
+        block_chars (int): characters per cached block, ~4 characters per token
+        capacity_blocks (int): blocks kept before the least recently used are evicted
+    """
+
+    def __init__(self, block_chars: int = 256, capacity_blocks: int = 100_000):
+        self.block_chars = block_chars
+        self.capacity_blocks = capacity_blocks
+        self._blocks: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: defaultdict[str, AgentCacheStats] = defaultdict(AgentCacheStats)
+        self._statics: defaultdict[str, set[str]] = defaultdict(set)
+
+    def observe(self, agent: str, llm_request: LlmRequest) -> int:
+        """
+        Look the request up and cache its blocks
+
+        Returns:
+            int: number of leading characters served from the cache
+        """
+        text, static_len = serialise(llm_request)
+        static = sha1(text[:static_len].encode()).hexdigest()
+        cached, chain, hit = 0, "", True
+        with self._lock:
+            # only full blocks are cacheable, like the providers' minimum cacheable size
+            for start in range(0, len(text) - self.block_chars + 1, self.block_chars):
+                chain = sha1((chain + text[start:start + self.block_chars]).encode()).hexdigest()
+                if hit and chain in self._blocks:
+                    cached += self.block_chars
+                    self._blocks.move_to_end(chain)
+                    continue
+                hit = False
+                self._blocks[chain] = None
+            while len(self._blocks) > self.capacity_blocks:
+                self._blocks.popitem(last=False)
+
+            stats = self.stats[agent]
+            stats.requests += 1
+            stats.prompt_chars += len(text)
+            stats.cached_chars += cached
+            if static in self._statics[agent]:
+                stats.static_hits += 1
+            self._statics[agent].add(static)
+        return cached
+
+    def report(self) -> str:
+        lines = [f"{'agent':<24} {'requests':>9} {'hit rate':>9} {'static hits':>12}"]
+        for agent, stats in sorted(self.stats.items()):
+            lines.append(
+                f"{agent:<24} {stats.requests:>9} {stats.hit_rate:>9.1%} "
+                f"{stats.static_hits / stats.requests:>12.1%}"
+            )
+        return "\n".join(lines)
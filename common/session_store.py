@@ -0,0 +1,298 @@
+"""
+File-backed session service, a drop-in for ADK's `InMemorySessionService`
+
+Sessions survive a restart: every event (with its state delta) is appended to an
+sqlite file and never rewritten. A session is only read back from disk the first
+time it is touched, by replaying its events on top of the state it was created
+with, and stays in an LRU of hot sessions afterwards so later turns don't replay
+anything. Cold sessions cost nothing but disk.
+
+`app:` and `user:` scoped state is shared across sessions like in ADK and is kept
+in small key/value tables instead of being replayed.
+
+Pick the backend with `session_service_from_env()`:
+    SESSION_SERVICE     "memory" (default) or "sqlite"
+    SESSION_DB          sqlite file, defaults to sessions.db
+    SESSION_CACHE_SIZE  hot sessions kept in memory, defaults to 256
+"""
+from collections import OrderedDict
+from typing import Any, Optional
+import threading
+import sqlite3
+import copy
+import json
+import os
+import time
+import uuid
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.errors.session_not_found_error import SessionNotFoundError
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session, State
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, id TEXT NOT NULL,
+    state TEXT NOT NULL, create_time REAL NOT NULL, update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_state (
+    app_name TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+    PRIMARY KEY (app_name, key)
+);
+CREATE TABLE IF NOT EXISTS user_state (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, key)
+);
+"""
+
+SessionKey = tuple[str, str, str]
+
+
+def _split_delta(delta: dict[str, Any]) -> tuple[dict, dict, dict]:
+    """app, user and session scoped parts of a state delta, prefixes stripped from the first two"""
+    app, user, session = {}, {}, {}
+    for key, value in delta.items():
+        if key.startswith(State.APP_PREFIX):
+            app[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    Append-only sqlite session store with an LRU of hot sessions
+
+    Args:
+        path (str): database file, opened in WAL journal mode
+        cache_size (int): number of sessions kept in memory, least recently used are evicted
+    """
+
+    def __init__(self, path: str = "sessions.db", cache_size: int = 256):
+        self.path = path
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # session state here is session scoped only, app/user state is merged into the copies handed out
+        self._hot: "OrderedDict[SessionKey, Session]" = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+
+    # ========== CACHE ==========
+
+    def _session(self, key: SessionKey) -> Optional[Session]:
+        """
+        Hot copy of a session, replayed from disk on a miss
+        """
+        with self._lock:
+            if key in self._hot:
+                self._hot.move_to_end(key)
+                return self._hot[key]
+            session = self._load(key)
+            if session is None:
+                return None
+            self._remember(key, session)
+            return session
+
+    def _remember(self, key: SessionKey, session: Session):
+        self._hot[key] = session
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.cache_size:
+            self._hot.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, key: SessionKey) -> Optional[Session]:
+        app_name, user_id, session_id = key
+        row = self._conn.execute(
+            "SELECT state, update_time FROM sessions WHERE app_name=? AND user_id=? AND id=?", key
+        ).fetchone()
+        if row is None:
+            return None
+        self.loads += 1
+        state, update_time = json.loads(row[0]), row[1]
+        events = []
+        for (data,) in self._conn.execute(
+            "SELECT data FROM events WHERE app_name=? AND user_id=? AND session_id=? ORDER BY seq", key
+        ):
+            event = Event.model_validate_json(data)
+            if event.actions and event.actions.state_delta:
+                state.update(_split_delta(event.actions.state_delta)[2])
+            events.append(event)
+        return Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=state,
+            events=events,
+            last_update_time=update_time,
+        )
+
+    def _view(self, session: Session, config: Optional[GetSessionConfig] = None) -> Session:
+        """
+        Copy handed to callers, events are shared but the lists aren't, state is merged with app/user state
+        """
+        view = session.model_copy(deep=False)
+        view.events = list(session.events)
+        view.state = copy.deepcopy(session.state)
+        if config is not None:
+            if config.num_recent_events is not None:
+                view.events = view.events[-config.num_recent_events:] if config.num_recent_events else []
+            if config.after_timestamp:
+                view.events = [e for e in view.events if e.timestamp >= config.after_timestamp]
+        for key, value in self._scoped_state(session.app_name, session.user_id).items():
+            view.state[key] = value
+        return view
+
+    def _scoped_state(self, app_name: str, user_id: str) -> dict[str, Any]:
+        with self._lock:
+            app = self._conn.execute("SELECT key, value FROM app_state WHERE app_name=?", (app_name,)).fetchall()
+            user = self._conn.execute(
+                "SELECT key, value FROM user_state WHERE app_name=? AND user_id=?", (app_name, user_id)
+            ).fetchall()
+        state = {State.APP_PREFIX + key: json.loads(value) for key, value in app}
+        state.update({State.USER_PREFIX + key: json.loads(value) for key, value in user})
+        return state
+
+    def _write_scoped(self, app_name: str, user_id: str, app: dict, user: dict):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO app_state (app_name, key, value) VALUES (?, ?, ?)",
+            [(app_name, key, json.dumps(value)) for key, value in app.items()],
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO user_state (app_name, user_id, key, value) VALUES (?, ?, ?, ?)",
+            [(app_name, user_id, key, json.dumps(value)) for key, value in user.items()],
+        )
+
+    # ========== SESSION SERVICE ==========
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id else str(uuid.uuid4())
+        app, user, session_state = _split_delta(state or {})
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions (app_name, user_id, id, state, create_time, update_time) VALUES (?, ?, ?, ?, ?, ?)",
+                    (app_name, user_id, session_id, json.dumps(session_state), now, now),
+                )
+            except sqlite3.IntegrityError:
+                self._conn.execute("ROLLBACK")
+                raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+            self._write_scoped(app_name, user_id, app, user)
+            self._conn.execute("COMMIT")
+            session = Session(app_name=app_name, user_id=user_id, id=session_id, state=session_state, last_update_time=now)
+            self._remember((app_name, user_id, session_id), session)
+        return self._view(session)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = self._session((app_name, user_id, session_id.strip()))
+        return None if session is None else self._view(session, config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        query = "SELECT user_id, id, update_time FROM sessions WHERE app_name=?"
+        params: tuple = (app_name,)
+        if user_id is not None:
+            query, params = query + " AND user_id=?", (app_name, user_id)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY update_time, user_id, id", params).fetchall()
+        # like ADK's services, listed sessions carry neither events nor state
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=uid, id=sid, last_update_time=update_time)
+            for uid, sid, update_time in rows
+        ])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id.strip())
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM events WHERE app_name=? AND user_id=? AND session_id=?", key)
+            self._conn.execute("DELETE FROM sessions WHERE app_name=? AND user_id=? AND id=?", key)
+            self._conn.execute("COMMIT")
+            self._hot.pop(key, None)
+
+    async def get_user_state(self, *, app_name: str, user_id: str) -> dict[str, Any]:
+        return {
+            key[len(State.USER_PREFIX):]: value
+            for key, value in self._scoped_state(app_name, user_id).items()
+            if key.startswith(State.USER_PREFIX)
+        }
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        stored = self._session(key)
+        if stored is None:
+            raise SessionNotFoundError(f"Session {session.id} not found.")
+        # the same event can be delivered to several references of the session, apply it once
+        if any(e == event for e in stored.events if e.id == event.id):
+            return event
+
+        # applies the delta to the caller's copy and strips temp: keys before it is stored
+        await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        app, user, session_delta = _split_delta(event.actions.state_delta if event.actions else {})
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO events (app_name, user_id, session_id, data) VALUES (?, ?, ?, ?)",
+                (*key, event.model_dump_json(exclude_none=True)),
+            )
+            self._conn.execute(
+                "UPDATE sessions SET update_time=? WHERE app_name=? AND user_id=? AND id=?",
+                (event.timestamp, *key),
+            )
+            self._write_scoped(session.app_name, session.user_id, app, user)
+            self._conn.execute("COMMIT")
+            if stored is not session:
+                stored.events.append(event)
+                stored.state.update(session_delta)
+                stored.last_update_time = event.timestamp
+        return event
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def session_service_from_env() -> BaseSessionService:
+    """
+    Picks the session service from `SESSION_SERVICE` ("memory" or "sqlite"), defaults to memory
+    """
+    backend = os.getenv("SESSION_SERVICE", "memory").lower()
+    if backend == "sqlite":
+        return SqliteSessionService(
+            os.getenv("SESSION_DB", "sessions.db"),
+            cache_size=int(os.getenv("SESSION_CACHE_SIZE", "256")),
+        )
+    if backend == "memory":
+        return InMemorySessionService()
+    raise ValueError(f"Unknown session service: '{backend}'")
@@ -0,0 +1,169 @@
+"""
+Critique and refine loop that drafts several refinements of each critique at once
+
+A LoopAgent over [critic, refiner] spends two model round trips per iteration and
+needs as many iterations as the refiner needs attempts to satisfy the critic.
+`SpeculativeLoopAgent` critiques the document once, then every iteration runs
+`candidates` refiner copies on the same critique concurrently, each followed by a
+critic copy reviewing that candidate. The first candidate whose review is the
+completion phrase ends the loop right away, the other candidates are cancelled.
+Otherwise the candidate with the shortest review, the one with the least left to
+fix, becomes the document and its review the critique of the next iteration.
+
+    refinement_loop = SpeculativeLoopAgent(
+        name="RefinementLoop",
+        sub_agents=[critic_agent, refiner_agent],
+        max_iterations=5,
+        candidates=3,
+        completion_phrase="No major issues found.",
+        document_key="current_document",
+        critique_key="criticism",
+    )
+
+With `candidates=1` it runs exactly like a LoopAgent
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import AsyncGenerator, Optional
+import asyncio
+
+from google.adk.agents import LlmAgent, LoopAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.utils.context_utils import Aclosing
+from pydantic import PrivateAttr
+
+
+@dataclass
+class SpeculationStats:
+    """Process wide counters of SpeculativeLoopAgent runs."""
+    iterations: int = 0
+    candidates: int = 0
+    # candidates cancelled once another one completed the document
+    cancelled: int = 0
+    completed: int = 0
+
+
+STATS = SpeculationStats()
+
+_CANDIDATE_DONE = object()
+
+
+class SpeculativeLoopAgent(LoopAgent):
+    """
+    LoopAgent over [critic, refiner] refining `candidates` drafts per iteration
+
+    Args:
+        candidates (int): refinements drafted concurrently per iteration, 1 is a plain LoopAgent
+        completion_phrase (str): critique meaning the document is done
+        document_key (str): state key the refiner writes the document to
+        critique_key (str): state key the critic writes the critique to
+    """
+    candidates: int = 1
+    completion_phrase: str = ""
+    document_key: str = ""
+    critique_key: str = ""
+    _pairs: list[tuple[LlmAgent, LlmAgent]] = PrivateAttr(default_factory=list)
+
+    def _candidate_pairs(self) -> list[tuple[LlmAgent, LlmAgent]]:
+        # cloned on first use, so the copies pick up callbacks and models set on the originals after construction
+        if len(self._pairs) == self.candidates:
+            return self._pairs
+        critic, refiner = self.sub_agents
+        if not isinstance(critic.instruction, str) or f"{{{self.document_key}}}" not in critic.instruction:
+            raise ValueError(f"'{critic.name}' must review '{{{self.document_key}}}' from a string instruction to review candidates")
+        self._pairs = []
+        for i in range(1, self.candidates + 1):
+            draft_key = f"{self.document_key}_candidate_{i}"
+            self._pairs.append((
+                refiner.clone(update={"name": f"{refiner.name}_{i}", "output_key": draft_key}),
+                critic.clone(update={
+                    "name": f"{critic.name}_{i}",
+                    "instruction": critic.instruction.replace(f"{{{self.document_key}}}", f"{{{draft_key}}}"),
+                    "output_key": f"{self.critique_key}_candidate_{i}",
+                }),
+            ))
+        return self._pairs
+
+    def _is_complete(self, critique: Optional[str]) -> bool:
+        return (critique or "").strip() == self.completion_phrase
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if self.candidates <= 1:
+            async with Aclosing(super()._run_async_impl(ctx)) as events:
+                async for event in events:
+                    yield event
+            return
+        critic, _ = self.sub_agents
+        async with Aclosing(critic.run_async(ctx)) as events:
+            async for event in events:
+                yield event
+        iterations = 0
+        while self.max_iterations is None or iterations < self.max_iterations:
+            if self._is_complete(ctx.session.state.get(self.critique_key)):
+                # what the refiner's exit tool would do, without a model call to decide on it
+                yield Event(invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch, actions=EventActions(escalate=True))
+                return
+            iterations += 1
+            STATS.iterations += 1
+            chosen: dict[str, str] = {}
+            async with Aclosing(self._speculate(ctx, chosen)) as events:
+                async for event in events:
+                    yield event
+            yield Event(invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch, actions=EventActions(state_delta=chosen))
+
+    def _branch_ctx(self, ctx: InvocationContext, agent: LlmAgent) -> InvocationContext:
+        branch_ctx = ctx.model_copy()
+        branch_ctx.branch = f"{ctx.branch}.{self.name}.{agent.name}" if ctx.branch else f"{self.name}.{agent.name}"
+        return branch_ctx
+
+    async def _draft(self, ctx: InvocationContext, pair: tuple[LlmAgent, LlmAgent], queue: asyncio.Queue):
+        try:
+            for agent in pair:
+                async with Aclosing(agent.run_async(self._branch_ctx(ctx, agent))) as events:
+                    async for event in events:
+                        resume = asyncio.Event()
+                        await queue.put((event, resume))
+                        await resume.wait()
+        finally:
+            await queue.put(_CANDIDATE_DONE)
+
+    async def _speculate(self, ctx: InvocationContext, chosen: dict[str, str]) -> AsyncGenerator[Event, None]:
+        """
+        Draft and review the candidates, filling `chosen` with the document and critique to keep
+        """
+        pairs = self._candidate_pairs()
+        queue: asyncio.Queue = asyncio.Queue()
+        drafts = [asyncio.create_task(self._draft(ctx, pair, queue)) for pair in pairs]
+        STATS.candidates += len(drafts)
+        documents: dict[int, str] = {}
+        reviews: dict[int, str] = {}
+        keys = {pair[0].output_key: (i, documents) for i, pair in enumerate(pairs)}
+        keys |= {pair[1].output_key: (i, reviews) for i, pair in enumerate(pairs)}
+        finished = 0
+        try:
+            while finished < len(drafts):
+                item = await queue.get()
+                if item is _CANDIDATE_DONE:
+                    finished += 1
+                    continue
+                event, resume = item
+                yield event
+                resume.set()
+                for key, value in event.actions.state_delta.items():
+                    if key in keys:
+                        i, values = keys[key]
+                        values[i] = str(value)
+                        if values is reviews and i in documents and self._is_complete(value):
+                            STATS.completed += 1
+                            STATS.cancelled += sum(not draft.done() for j, draft in enumerate(drafts) if j != i)
+                            chosen |= {self.document_key: documents[i], self.critique_key: self.completion_phrase}
+                            return
+            reviewed = [i for i in reviews if i in documents]
+            if reviewed:
+                best = min(reviewed, key=lambda i: len(reviews[i]))
+                chosen |= {self.document_key: documents[best], self.critique_key: reviews[best]}
+        finally:
+            for draft in drafts:
+                draft.cancel()
+            await asyncio.gather(*drafts, return_exceptions=True)
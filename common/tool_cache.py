@@ -0,0 +1,217 @@
+"""
+Result cache for idempotent tools
+
+Read-only tools are called again and again with the same arguments, within a turn
+and across turns. A tool opts in with `@cacheable`, naming what its result depends
+on besides its arguments: `version(tool_context)` returns the generation of the data
+it reads, e.g. the storage generation of a file or the current order's version. Results
+are keyed on (tool name, canonical json of the args, version) and kept LRU with a
+TTL, a hit answers from the before-tool callback so neither the tool nor the
+conversion of its result to json runs.
+
+    class TableStore:
+        @staticmethod
+        @cacheable(version=lambda tool_context: Table._generation(Table._filename), ttl=30)
+        def find_tables(tool_context: ToolContext, party_size: int) -> list[Table]: ...
+
+    attach(root_agent)                  # every LlmAgent below it
+    print(TOOL_CACHE.report())
+
+`TOOL_CACHE_SIZE` and `TOOL_CACHE_TTL` configure the process wide `TOOL_CACHE`
+"""
+from __future__ import annotations
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, asdict, is_dataclass
+from typing import Any, Callable, Hashable, Optional
+import threading
+import json
+import time
+import os
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.tools import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from pydantic import BaseModel
+
+Version = Callable[[ToolContext], Hashable]
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    # None: the result only depends on the arguments
+    version: Optional[Version] = None
+    # seconds a result stays valid, None uses the cache's default
+    ttl: Optional[float] = None
+
+
+def cacheable(version: Optional[Version] = None, ttl: Optional[float] = None):
+    """
+    Mark a tool function as safe to answer from the cache
+
+    Args:
+        version: generation of the data the tool reads, called with the tool context on every call
+        ttl (Optional[float]): seconds a result stays valid, for data that changes without a new version
+    """
+    def mark(func):
+        func._tool_cache = CachePolicy(version, ttl)
+        return func
+    return mark
+
+
+def _plain(value: Any) -> Any:
+    # what the model is shown, detached from live objects the tool returned
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if is_dataclass(value) and not isinstance(value, type):
+        return _plain(value.to_dict() if hasattr(value, "to_dict") else asdict(value))
+    return value
+
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+class ToolCache:
+    """
+    LRU cache of tool results with a TTL, shared by every agent it is attached to
+
+    Args:
+        maxsize (int): results kept, the least recently used is evicted first
+        ttl (float): default seconds a result stays valid
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.evictions = 0
+        self.expirations = 0
+        # key -> (expires at, result)
+        self._results: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+        # function call id -> key of the miss waiting for its result
+        self._pending: dict[str, tuple] = {}
+        self._attached: set[int] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def policy(tool: BaseTool) -> Optional[CachePolicy]:
+        return getattr(getattr(tool, "func", None), "_tool_cache", None)
+
+    def _key(self, tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, policy: CachePolicy) -> tuple:
+        version = policy.version(tool_context) if policy.version is not None else None
+        return (tool.name, json.dumps(args, sort_keys=True, separators=(",", ":"), default=str), version)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is None:
+                return None
+            expires_at, result = cached
+            if expires_at <= time.monotonic():
+                del self._results[key]
+                self.expirations += 1
+                return None
+            self._results.move_to_end(key)
+            return result
+
+    def put(self, key: tuple, result: dict, ttl: Optional[float] = None):
+        with self._lock:
+            self._results[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._pending.clear()
+
+    # ---------- tool callbacks ----------
+
+    def before_tool(self, tool: BaseTool, args: dict[str, Any], tool_context: ToolContext) -> Optional[dict]:
+        policy = self.policy(tool)
+        if policy is None:
+            return None
+        key = self._key(tool, args, tool_context, policy)
+        result = self.get(key)
+        if result is not None:
+            self.hits[tool.name] += 1
+            return _copy(result)
+        self.misses[tool.name] += 1
+        with self._lock:
+            # misses of tool calls that raised never get their result
+            if len(self._pending) >= self.maxsize:
+                self._pending.pop(next(iter(self._pending)))
+            self._pending[tool_context.function_call_id] = key
+        return None
+
+    def after_tool(self, tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, tool_response: Any):
+        with self._lock:
+            key = self._pending.pop(tool_context.function_call_id, None)
+        if key is None:
+            return None
+        result = _plain(tool_response)
+        if not isinstance(result, dict):
+            result = {"result": result}
+        if "error" not in result:
+            self.put(key, result, self.policy(tool).ttl)
+        # the model gets the same snapshot on a miss as on later hits
+        return _copy(result)
+
+    # ---------- metrics ----------
+
+    @property
+    def hit_rate(self) -> float:
+        total = sum(self.hits.values()) + sum(self.misses.values())
+        return sum(self.hits.values()) / total if total else 0.0
+
+    def report(self) -> str:
+        tools = sorted(set(self.hits) | set(self.misses))
+        per_tool = ", ".join(
+            f"{tool} {self.hits[tool]}/{self.hits[tool] + self.misses[tool]}" for tool in tools
+        )
+        return (
+            f"tool cache: {self.hit_rate:.1%} hits ({per_tool or 'no cacheable calls'}), "
+            f"{len(self._results)} results, {self.evictions} evicted, {self.expirations} expired"
+        )
+
+
+def attach(agent: BaseAgent, cache: Optional[ToolCache] = None) -> BaseAgent:
+    """
+    Add the cache's tool callbacks to the agent and every sub agent, once per agent
+
+    Args:
+        cache (Optional[ToolCache]): defaults to the process wide TOOL_CACHE
+    """
+    cache = TOOL_CACHE if cache is None else cache
+    if id(agent) in cache._attached:
+        return agent
+    cache._attached.add(id(agent))
+    if isinstance(agent, LlmAgent):
+        for attribute, callback in (("before_tool_callback", cache.before_tool), ("after_tool_callback", cache.after_tool)):
+            current = getattr(agent, attribute)
+            callbacks = [] if current is None else list(current) if isinstance(current, list) else [current]
+            setattr(agent, attribute, [*callbacks, callback])
+    for sub_agent in agent.sub_agents:
+        attach(sub_agent, cache)
+    return agent
+
+
+def tool_cache_from_env() -> ToolCache:
+    return ToolCache(
+        maxsize=int(os.getenv("TOOL_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("TOOL_CACHE_TTL", "300")),
+    )
+
+
+TOOL_CACHE = tool_cache_from_env()
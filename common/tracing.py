@@ -0,0 +1,298 @@
+"""
+Spans and latency histograms for agent runs, model calls, tool calls and storage ops
+
+Finished spans go to a bounded ring buffer, a background thread drains it to a
+JSON lines file every `flush_interval` seconds, the callbacks never touch the
+disk. Without a path the buffer just keeps the latest spans for inspection.
+Every span also lands in a histogram keyed by (kind, name), so per agent and
+per tool latencies are available without the file.
+
+    TRACER = Tracer(path="trace.jsonl")
+    instrument(root_agent, TRACER)          # every agent, model and tool call below it
+    with TRACER.span("storage", "upsert", file="order.json"):
+        ...
+    print(TRACER.report())
+
+`TRACE_PATH`, `TRACE_CAPACITY` and `TRACE_FLUSH_INTERVAL` configure the process wide `TRACER`
+"""
+from __future__ import annotations
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from functools import partial
+from typing import Any, Optional
+from bisect import bisect_left
+import threading
+import atexit
+import json
+import time
+import os
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools import BaseTool
+from google.adk.tools.tool_context import ToolContext
+
+# upper bounds of the histogram buckets in milliseconds, 4 per doubling from 0.05ms to ~7 minutes
+BUCKETS_MS = [0.05 * 2 ** (i / 4) for i in range(96)]
+# spans opened by a before callback whose after callback never came, e.g. a failed model call
+MAX_OPEN_SPANS = 10_000
+
+
+@dataclass(slots=True)
+class Span:
+    kind: str
+    name: str
+    # epoch seconds the span started at, durations come from the monotonic clock
+    started_at: float
+    duration_ms: float
+    attrs: dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class Histogram:
+    """
+    Latency histogram with fixed log scale buckets, percentiles are bucket upper bounds
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms: float):
+        self.counts[bisect_left(BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS_MS[bucket], self.max_ms) if bucket < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class Tracer:
+    """
+    Collects spans into a ring buffer and histograms, optionally flushing them to a file
+
+    Args:
+        path (Optional[str]): JSON lines file spans are appended to, None keeps them in memory only
+        capacity (int): spans buffered between flushes, the oldest are dropped when it fills up
+        flush_interval (float): seconds between background flushes
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 10_000, flush_interval: float = 1.0):
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.histograms: defaultdict[tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.dropped = 0
+        self.flushed = 0
+        self._buffer: deque[Span] = deque(maxlen=capacity)
+        self._open: dict[tuple, tuple[int, float, str, str, dict]] = {}
+        self._instrumented: set[int] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        if path is not None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="trace-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    # ---------- recording ----------
+
+    def record(self, span: Span):
+        with self._lock:
+            self.histograms[(span.kind, span.name)].add(span.duration_ms)
+            if len(self._buffer) == self.capacity and self.path is not None:
+                self.dropped += 1
+            self._buffer.append(span)
+            full = len(self._buffer) >= self.capacity // 2
+        if full and self.path is not None:
+            with self._wakeup:
+                self._wakeup.notify()
+
+    def start(self, key: tuple, kind: str, name: str, **attrs):
+        with self._lock:
+            if len(self._open) >= MAX_OPEN_SPANS:
+                self._open.pop(next(iter(self._open)))
+            self._open[key] = (time.perf_counter_ns(), time.time(), kind, name, attrs)
+
+    def end(self, key: tuple, **attrs) -> Optional[Span]:
+        with self._lock:
+            opened = self._open.pop(key, None)
+        if opened is None:
+            return None
+        start_ns, started_at, kind, name, start_attrs = opened
+        span = Span(kind, name, started_at, (time.perf_counter_ns() - start_ns) / 1e6, start_attrs | attrs)
+        self.record(span)
+        return span
+
+    def discard(self, key: tuple):
+        with self._lock:
+            self._open.pop(key, None)
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs):
+        """
+        Time the body as one span, exceptions are recorded in the `error` attribute and re-raised
+        """
+        started_at, start_ns = time.time(), time.perf_counter_ns()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(Span(kind, name, started_at, (time.perf_counter_ns() - start_ns) / 1e6, attrs))
+
+    def spans(self) -> list[Span]:
+        """
+        Spans not flushed yet, the latest `capacity` ones when there is no path
+        """
+        with self._lock:
+            return list(self._buffer)
+
+    # ---------- agent callbacks ----------
+
+    @staticmethod
+    def _state(callback_context: CallbackContext, state_keys: tuple[str, ...]) -> dict:
+        return {key: callback_context.state.get(key) for key in state_keys}
+
+    def before_agent(self, callback_context: CallbackContext, state_keys: tuple[str, ...] = ()):
+        key = ("agent", callback_context.invocation_id, callback_context.agent_name)
+        attrs = {"state_before": self._state(callback_context, state_keys)} if state_keys else {}
+        self.start(key, "agent", callback_context.agent_name, **attrs)
+
+    def after_agent(self, callback_context: CallbackContext, state_keys: tuple[str, ...] = ()):
+        # a model call cut short by an error never reaches after_model
+        self.discard(("model", callback_context.invocation_id, callback_context.agent_name))
+        key = ("agent", callback_context.invocation_id, callback_context.agent_name)
+        attrs = {"state_after": self._state(callback_context, state_keys)} if state_keys else {}
+        self.end(key, **attrs)
+
+    def before_model(self, callback_context: CallbackContext, llm_request: LlmRequest):
+        key = ("model", callback_context.invocation_id, callback_context.agent_name)
+        self.start(key, "model", callback_context.agent_name, contents=len(llm_request.contents))
+
+    def after_model(self, callback_context: CallbackContext, llm_response: LlmResponse):
+        if llm_response.partial:
+            return
+        usage = llm_response.usage_metadata
+        attrs = {}
+        if usage is not None:
+            attrs = {
+                "prompt_tokens": usage.prompt_token_count,
+                "cached_tokens": usage.cached_content_token_count,
+                "output_tokens": usage.candidates_token_count,
+            }
+        if llm_response.error_code:
+            attrs["error"] = llm_response.error_code
+        self.end(("model", callback_context.invocation_id, callback_context.agent_name), **attrs)
+
+    def before_tool(self, tool: BaseTool, args: dict[str, Any], tool_context: ToolContext):
+        self.start(("tool", tool_context.function_call_id), "tool", tool.name, agent=tool_context.agent_name)
+
+    def after_tool(self, tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, tool_response: Any):
+        attrs: dict[str, Any] = {"escalate": bool(tool_context.actions.escalate)}
+        if isinstance(tool_response, dict) and "error" in tool_response:
+            attrs["error"] = str(tool_response["error"])
+        self.end(("tool", tool_context.function_call_id), **attrs)
+
+    # ---------- export ----------
+
+    def flush(self):
+        with self._lock:
+            spans = list(self._buffer)
+            self._buffer.clear()
+        if not spans or self.path is None:
+            return
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        self.flushed += len(spans)
+
+    def _flush_loop(self):
+        while True:
+            with self._wakeup:
+                if not self._closed:
+                    self._wakeup.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self):
+        if self._flusher is None or self._closed:
+            return
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        self._flusher.join()
+
+    def report(self) -> str:
+        lines = [f"{'kind':<8} {'name':<38} {'count':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}"]
+        for (kind, name), histogram in sorted(self.histograms.items()):
+            lines.append(
+                f"{kind:<8} {name:<38} {histogram.count:>6} {histogram.percentile(50):>9.2f} "
+                f"{histogram.percentile(95):>9.2f} {histogram.percentile(99):>9.2f} {histogram.max_ms:>9.2f}"
+            )
+        return "\n".join(lines)
+
+
+def _prepend(agent: BaseAgent, attribute: str, callback):
+    current = getattr(agent, attribute)
+    callbacks = [] if current is None else list(current) if isinstance(current, list) else [current]
+    # first, so the span starts before a callback can answer in place of the model or tool
+    setattr(agent, attribute, [callback, *callbacks])
+
+
+def instrument(agent: BaseAgent, tracer: Optional[Tracer] = None, state_keys: tuple[str, ...] = ()) -> BaseAgent:
+    """
+    Attach the tracer's callbacks to the agent and every sub agent, once per agent
+
+    Args:
+        tracer (Optional[Tracer]): defaults to the process wide TRACER
+        state_keys (tuple[str, ...]): state recorded on the agent spans when they start and end
+    """
+    tracer = TRACER if tracer is None else tracer
+    if id(agent) in tracer._instrumented:
+        return agent
+    tracer._instrumented.add(id(agent))
+    _prepend(agent, "before_agent_callback", partial(tracer.before_agent, state_keys=state_keys))
+    _prepend(agent, "after_agent_callback", partial(tracer.after_agent, state_keys=state_keys))
+    if isinstance(agent, LlmAgent):
+        _prepend(agent, "before_model_callback", tracer.before_model)
+        _prepend(agent, "after_model_callback", tracer.after_model)
+        _prepend(agent, "before_tool_callback", tracer.before_tool)
+        _prepend(agent, "after_tool_callback", tracer.after_tool)
+    for sub_agent in agent.sub_agents:
+        instrument(sub_agent, tracer, state_keys)
+    return agent
+
+
+def tracer_from_env() -> Tracer:
+    return Tracer(
+        path=os.getenv("TRACE_PATH") or None,
+        capacity=int(os.getenv("TRACE_CAPACITY", "10000")),
+        flush_interval=float(os.getenv("TRACE_FLUSH_INTERVAL", "1.0")),
+    )
+
+
+TRACER = tracer_from_env()
@@ -3,10 +3,11 @@ load_dotenv()
 from google.genai import types
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
-from google.adk.agents import LoopAgent, LlmAgent, SequentialAgent
-from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents import LlmAgent, SequentialAgent
 from google.adk.tools.tool_context import ToolContext
-from google.adk.tools import BaseTool
+from common.tracing import Tracer, instrument
+from common.speculative_loop import SpeculativeLoopAgent
+from common.patching import PATCH_FORMAT, patch_mode
 
 # --- Constants ---
 APP_NAME = "doc_writing_app_v3" # New App Name
@@ -20,6 +21,8 @@ STATE_CURRENT_DOC = "current_document"
 STATE_CRITICISM = "criticism"
 # Define the exact phrase the Critic should use to signal completion
 COMPLETION_PHRASE = "No major issues found."
+# refinements drafted concurrently from each critique, 1 refines one draft at a time
+REFINE_CANDIDATES = 3
 
 # --- Tool Definition ---
 def exit_loop(tool_context: ToolContext):
@@ -46,45 +49,6 @@ initial_writer_agent = LlmAgent(
     output_key=STATE_CURRENT_DOC
 )
 
-def log_callback(context: CallbackContext): 
-    return "".join([
-            f"criticism - {context.state.get("criticism")}\n",
-            f"current_document - {context.state.get("current_document")}\n"
-        ])
-
-def before_agent_log(callback_context: CallbackContext):
-    with open("log.txt", "a") as f: 
-        f.write("\n=================================\n")
-        f.write(f"::START {callback_context.agent_name} START::\n")
-        f.write("BEFORE AGENT RESPONSE\n")
-        f.write(log_callback(callback_context))
-        f.write("---------------------------------\n")
-
-def after_agent_log(callback_context: CallbackContext):
-    with open("log.txt", "a") as f: 
-        f.write("AFTER AGENT RESPONSE\n")
-        f.write(log_callback(callback_context))
-        f.write(f"::END {callback_context.agent_name} END::\n")
-        f.write("=================================\n")
-
-def tool_log_callback(tool: BaseTool, context: ToolContext):
-    return f"{tool.name}::escalate - {context.actions.escalate}\n"
-
-def before_tool_log(tool: BaseTool, args: dict[str, any], tool_context: ToolContext):
-    with open("log.txt", "a") as f: 
-        f.write("\n=================================\n")
-        f.write(f"::START TOOL {tool.name} TOOL START::\n")
-        f.write("BEFORE TOOL INVOCATION\n")
-        f.write(tool_log_callback(tool, tool_context))
-        f.write("---------------------------------\n")
-
-def after_tool_log(tool: BaseTool, args: dict[str, any], tool_context: ToolContext, tool_response: dict[str, str]):
-    with open("log.txt", "a") as f: 
-        f.write("AFTER TOOL INVOCATION\n")
-        f.write(tool_log_callback(tool, tool_context))
-        f.write(f"::END TOOL {tool.name} TOOL END::\n")
-        f.write("=================================\n")
-
 # STEP 2a: Critic Agent (Inside the Refinement Loop)
 critic_agent_in_loop = LlmAgent(
     name="CriticAgent",
@@ -111,8 +75,6 @@ critic_agent_in_loop = LlmAgent(
 """,
     description="Reviews the current draft, providing critique if clear improvements are needed, otherwise signals completion.",
     output_key=STATE_CRITICISM,
-    before_agent_callback=before_agent_log,
-    after_agent_callback=after_agent_log,
 )
 
 
@@ -142,15 +104,33 @@ refiner_agent_in_loop = LlmAgent(
     description="Refines the document based on critique, or calls exit_loop if critique indicates completion.",
     tools=[exit_loop], # Provide the exit_loop tool
     output_key=STATE_CURRENT_DOC, # Overwrites state['current_document'] with the refined version
-    before_agent_callback=before_agent_log,
-    after_agent_callback=after_agent_log,
-    before_tool_callback=before_tool_log,
-    after_tool_callback=after_tool_log
 )
+# The refiner answers with edits to the current document, applied locally; the instruction
+# above is what it falls back to when they don't apply, see common/patching.py
+refiner_patch_mode = patch_mode(refiner_agent_in_loop, source_key=STATE_CURRENT_DOC, patch_instruction=f"""You are a Creative Writing Assistant refining a document based on feedback OR exiting the process.
+    **Current Document:**
+    ```
+    {{current_document}}
+    ```
+    **Critique/Suggestions:**
+    {{criticism}}
+
+    **Task:**
+    Analyze the 'Critique/Suggestions'.
+    IF the critique is *exactly* "{COMPLETION_PHRASE}":
+    You MUST call the 'exit_loop' function. Do not output any text.
+    ELSE (the critique contains actionable feedback):
+    Carefully apply the suggestions to improve the 'Current Document', changing only what the critique asks for.
+    {PATCH_FORMAT}
+
+    Do not add explanations. Either output the edits OR call the exit_loop function.
+""")
 
 
 # STEP 2: Refinement Loop Agent
-refinement_loop = LoopAgent(
+# Drafts REFINE_CANDIDATES refinements of every critique at once and stops as soon as one
+# of them is reviewed with the COMPLETION_PHRASE, see common/speculative_loop.py
+refinement_loop = SpeculativeLoopAgent(
     name="RefinementLoop",
     # Agent order is crucial: Critique first, then Refine/Exit
     sub_agents=[
@@ -158,6 +138,10 @@ refinement_loop = LoopAgent(
         refiner_agent_in_loop,
     ],
     max_iterations=5, # Limit loops
+    candidates=REFINE_CANDIDATES,
+    completion_phrase=COMPLETION_PHRASE,
+    document_key=STATE_CURRENT_DOC,
+    critique_key=STATE_CRITICISM,
 )
 
 # STEP 3: Overall Sequential Pipeline
@@ -170,7 +154,7 @@ root_agent = SequentialAgent(
     ],
     description="Writes an initial document and then iteratively refines it with critique using an exit tool."
 )
-async def call_agent(query): 
+async def call_agent(query, tracer: Tracer): 
     APP_NAME = "weather_app"
     USER_ID = "1234"
     SESSION_ID = "session1234"
@@ -184,6 +168,12 @@ async def call_agent(query):
     content = types.Content(role='user', parts=[types.Part(text=query)])
     async for event in runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=content):
         pass
-
-import asyncio
-asyncio.run(call_agent("Write a professional letter to my boss explaining that I'm not enjoying my work here"))
\ No newline at end of file
+    print(tracer.report())
+
+if __name__ == "__main__":
+    import asyncio
+    # agent runs with the critique and document before and after, model and tool calls, see common/tracing.py
+    # created here so importing the pipeline doesn't start a flusher thread
+    tracer = Tracer(path="trace.jsonl")
+    instrument(root_agent, tracer, state_keys=(STATE_CRITICISM, STATE_CURRENT_DOC))
+    asyncio.run(call_agent("Write a professional letter to my boss explaining that I'm not enjoying my work here"))
@@ -12,10 +12,13 @@ from google.genai.types import GenerateContentConfig
 import datetime
 from zoneinfo import ZoneInfo
 
+from common.tool_cache import attach, cacheable
+
 def compute_sine(val: int): 
     """
     Compute
     """
+@cacheable()
 def xyz(abc: str) -> dict:
     """Retrieves the current weather AND TEMPERATURE report for a specified city.
     Args:
@@ -40,6 +43,8 @@ def xyz(abc: str) -> dict:
         }
 
 
+# the report is to the second
+@cacheable(ttl=1)
 def get_current_time(city: str) -> dict:
     """Returns the current time in a specified city.
 
@@ -73,6 +78,7 @@ root_agent = LlmAgent(
     instruction="You are an agent that returns time and weather",
     tools=[xyz, get_current_time],
 )
+attach(root_agent)
 
 import dotenv
 dotenv.load_dotenv("./.env")
@@ -3,11 +3,13 @@ load_dotenv()
 from google.genai import types
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
-from google.adk.agents import LoopAgent, LlmAgent, SequentialAgent, ParallelAgent
+from google.adk.agents import LoopAgent, LlmAgent, SequentialAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.tools.tool_context import ToolContext
 from google.adk.tools import BaseTool, google_search
 
+from common.bounded_parallel import BoundedParallelAgent
+
 # --- Constants ---
 APP_NAME = "doc_writing_app_v3" # New App Name
 USER_ID = "dev_user_01"
@@ -71,13 +73,22 @@ Output *only* the summary.
     output_key="carbon_capture_result"
 )
 
-# --- 2. Create the ParallelAgent (Runs researchers concurrently) ---
+# --- 2. Create the BoundedParallelAgent (Runs researchers concurrently) ---
 # This agent orchestrates the concurrent execution of the researchers.
-# It finishes once all researchers have completed and stored their results in state.
-parallel_research_agent = ParallelAgent(
+# It finishes once every researcher has stored its result in state, or was given up on:
+# a researcher still searching after RESEARCH_HEDGE_AFTER seconds gets a second attempt,
+# one without a result after RESEARCH_TIMEOUT seconds gets a MISSING marker instead.
+RESEARCH_CONCURRENCY = 4
+RESEARCH_TIMEOUT = 30
+RESEARCH_HEDGE_AFTER = 12
+
+parallel_research_agent = BoundedParallelAgent(
     name="ParallelWebResearchAgent",
     sub_agents=[researcher_agent_1, researcher_agent_2, researcher_agent_3],
-    description="Runs multiple research agents in parallel to gather information."
+    description="Runs multiple research agents in parallel to gather information.",
+    max_concurrency=RESEARCH_CONCURRENCY,
+    branch_timeout=RESEARCH_TIMEOUT,
+    hedge_after=RESEARCH_HEDGE_AFTER,
 )
 
 # --- 3. Define the Merger Agent (Runs *after* the parallel agents) ---
@@ -92,6 +103,8 @@ Your primary task is to synthesize the following research summaries, clearly att
 
 **Crucially: Your entire response MUST be grounded *exclusively* on the information provided in the 'Input Summaries' below. Do NOT add any external knowledge, facts, or details not present in these specific summaries.**
 
+A summary that reads `[MISSING: ...]` did not arrive in time. Write "No findings available." under its heading instead of synthesizing it, and leave it out of the conclusion.
+
 **Input Summaries:**
 
 *   **Renewable Energy:**
@@ -131,7 +144,7 @@ Output *only* the structured report following this format. Do not include introd
 
 
 # --- 4. Create the SequentialAgent (Orchestrates the overall flow) ---
-# This is the main agent that will be run. It first executes the ParallelAgent
+# This is the main agent that will be run. It first executes the BoundedParallelAgent
 # to populate the state, and then executes the MergerAgent to produce the final output.
 sequential_pipeline_agent = SequentialAgent(
     name="ResearchAndSynthesisPipeline",
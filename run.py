@@ -1,12 +1,12 @@
 import dotenv
 dotenv.load_dotenv("waiter/.env")
 
-from datetime import datetime
-from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
-from google.adk.events import Event
 from google.genai.types import Content, Part
+from common.session_store import session_service_from_env
 from waiter.agent import root_agent
+from common.tracing import TRACER
+from waiter.shared_libraries.events import C, log_line, partial_text, render_event, STREAMING, TurnTimer
 
 import asyncio
 
@@ -15,144 +15,63 @@ APP_NAME = "waiter"
 USER_ID = "akhilesh"
 SESSION_ID = "session_akhilesh"
 
-session_service = InMemorySessionService()
+# SESSION_SERVICE=sqlite keeps the conversation across restarts
+# TRACE_PATH=trace.jsonl also writes a span per agent run, model, tool and storage call
+session_service = session_service_from_env()
 runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
 
 
-class C:
-    HEADER = "\033[95m"
-    BLUE = "\033[94m"
-    CYAN = "\033[96m"
-    GREEN = "\033[92m"
-    YELLOW = "\033[93m"
-    RED = "\033[91m"
-    END = "\033[0m"
-    BOLD = "\033[1m"
-    DIM = "\033[2m"
-
-def log_line(prefix: str, msg: str, color: str = C.END, indent: int = 0):
-    pad = "    " * indent
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    print(f"{pad}{color}{prefix:<12}{C.END} {C.DIM}[{timestamp}]{C.END} {msg}")
-
 async def call_agent(query: str):
     content = Content(role="user", parts=[Part(text=query)])
+    timer = TurnTimer()
+    # agent whose reply is being streamed onto the current line
+    streaming = None
 
     async for event in runner.run_async(
         user_id=USER_ID,
         session_id=SESSION_ID,
         new_message=content,
+        run_config=STREAMING,
     ):
-        agent_name = event.author or "agent"
-        indent = 0
-
-        # 🧠 Handle model output (final or partial)
-        if event.is_final_response():
-            if event.content and hasattr(event.content, "parts"):
-                text_parts = [
-                    getattr(p, "text", None)
-                    for p in event.content.parts
-                    if getattr(p, "text", None)
-                ]
-                if text_parts:
-                    text = "".join(text_parts)
-                    log_line(f"{agent_name} ✅", text, C.GREEN, indent)
-                else:
-                    log_line(
-                        f"{agent_name} ⚙️",
-                        "Final response contained no text parts (likely function call or escalation).",
-                        C.DIM,
-                        indent,
-                    )
-            else:
-                log_line(
-                    f"{agent_name} ⚙️",
-                    "Final response had no content (likely loop exit or escalation).",
-                    C.DIM,
-                    indent,
-                )
-
-        # 🧩 Tool / function calls
-        function_calls = event.get_function_calls()
-        if function_calls:
-            for fn in function_calls:
-                log_line(
-                    f"{agent_name} 🧩",
-                    f"Function call → {fn.name}({fn.args})",
-                    C.YELLOW,
-                    indent,
-                )
-
-        # 🧰 Tool / function responses
-        function_responses = event.get_function_responses()
-        if function_responses:
-            for fnr in function_responses:
-                log_line(
-                    f"{agent_name} 🔧",
-                    f"Function response ← {fnr.name}: {fnr.response}",
-                    C.BLUE,
-                    indent,
-                )
-
-        # 🗂️ State or artifact updates
-        if event.actions.state_delta:
-            log_line(
-                f"{agent_name} 🗂️",
-                f"State delta: {event.actions.state_delta}",
-                C.CYAN,
-                indent,
-            )
-        if event.actions.artifact_delta:
-            log_line(
-                f"{agent_name} 📦",
-                f"Artifact delta: {event.actions.artifact_delta}",
-                C.CYAN,
-                indent,
-            )
-
-        # 🔁 Escalation or transfer
-        if event.actions.transfer_to_agent:
-            log_line(
-                f"{agent_name} 🔁",
-                f"Transferred to agent: {event.actions.transfer_to_agent}",
-                C.HEADER,
-                indent,
-            )
-        if event.actions.escalate:
-            log_line(
-                f"{agent_name} ⤴️",
-                "Escalated to higher-level agent (loop exit triggered).",
-                C.HEADER,
-                indent,
-            )
-
-        # ℹ️ Debug fallback for unhandled events
-        if not (
-            event.is_final_response()
-            or function_calls
-            or function_responses
-            or event.actions.state_delta
-            or event.actions.artifact_delta
-            or event.actions.transfer_to_agent
-            or event.actions.escalate
-        ):
-            log_line(
-                f"{agent_name} ℹ️",
-                f"Event (unhandled): {event.model_dump(exclude_none=True)}",
-                C.DIM,
-                indent,
-            )
+        timer.observe(event)
+        text = partial_text(event)
+        if text:
+            if streaming != event.author:
+                if streaming is not None:
+                    print()
+                print(f"{C.GREEN}{event.author:<12}{C.END} ", end="")
+                streaming = event.author
+            print(text, end="", flush=True)
+            continue
+        if event.partial:
+            continue
+        # the complete event repeats what was streamed, its text is only printed if nothing was
+        streamed = streaming is not None
+        if streamed:
+            print()
+            streaming = None
+        for prefix, msg, color in render_event(event, streamed=streamed):
+            log_line(prefix, msg, color)
+    if streaming is not None:
+        print()
+    timing = timer.finish()
+    first_token = f"{timing['first_token_ms'] / 1e3:.2f}s" if timing["first_token_ms"] is not None else "-"
+    print(f"{C.DIM}first token {first_token}, turn {timing['total_ms'] / 1e3:.2f}s{C.END}")
 
 
 async def main():
-    await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+    session = await session_service.get_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+    if session is None:
+        await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
     print("Welcome to XYZ hotel Agent! Type 'exit' to quit.\n")
     while True:
         query = input("You: ")
         if query.lower() in {"exit", "quit"}:
             print("Goodbye!")
+            print(TRACER.report())
             break
         await call_agent(query)
 
 # Run the main loop
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,6 +4,7 @@ from google.genai import types
 from google.adk.runners import Runner
 from google.adk.agents import LlmAgent, SequentialAgent
 from google.adk.sessions import InMemorySessionService
+from common.patching import PATCH_FORMAT, patch_mode
 # Code Writer Agent
 # Takes the initial specification (from user query) and writes code.
 GEMINI_MODEL = "gemini-2.0-flash" 
@@ -80,6 +81,27 @@ Do not add any other text before or after the code block.
     description="Refactors code based on review comments.",
     output_key="refactored_code", # Stores output in state['refactored_code']
 )
+# The refactorer answers with edits to the generated code, applied locally; the instruction
+# above is what it falls back to when they don't apply, see common/patching.py
+refactorer_patch_mode = patch_mode(code_refactorer_agent, source_key="generated_code", patch_instruction=f"""You are a Python Code Refactoring AI.
+Your goal is to improve the given Python code based on the provided review comments.
+
+  **Original Code:**
+  ```python
+  {{generated_code}}
+  ```
+
+  **Review Comments:**
+  {{review_comments}}
+
+**Task:**
+Carefully apply the suggestions from the review comments to refactor the original code, changing only what they ask for.
+If the review comments state "No major issues found," output no edits.
+Ensure the final code stays complete, functional, and includes necessary imports and docstrings.
+
+**Output:**
+{PATCH_FORMAT}
+""")
 
 
 # --- 2. Create the SequentialAgent ---
@@ -111,5 +133,6 @@ async def call_agent(query):
             final_answer = event.content.parts[0].text.strip()
             print("\n🟢 FINAL ANSWER\n", final_answer, "\n")
 
-import asyncio
-asyncio.run(call_agent("Prime numbers from 1 to 100"))
\ No newline at end of file
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(call_agent("Prime numbers from 1 to 100"))
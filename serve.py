@@ -0,0 +1,174 @@
+"""
+Multi-table HTTP / WebSocket front end for the waiter agent
+
+Every (table, guest) pair gets its own ADK session, created on first contact and
+reused afterwards. Turns stream back as they happen, the number of concurrent
+`runner.run_async` invocations is capped and each client has a bounded queue, so
+a slow reader stalls only its own turn and is dropped once it falls too far behind
+
+Run with:
+    uvicorn serve:app --port 8000
+
+Endpoints:
+    POST /tables/{table_id}/guests/{guest_id}/turns   {"query": "..."} -> ndjson stream
+    WS   /ws/tables/{table_id}/guests/{guest_id}      text in, one json message per line out
+
+Messages of a turn:
+    {"type": "delta", "author", "text"}                   reply text as the model generates it
+    {"type": "progress", "author", "tool", "status"}      a tool call is "running" or "done"
+    {"type": "event", "author", "prefix", "message"}      a complete event, see render_event
+    {"type": "timing", "first_token_ms", "total_ms"}      once the turn is over
+    {"type": "error", "message"} / {"type": "done"}
+"""
+import dotenv
+dotenv.load_dotenv("waiter/.env")
+
+from typing import AsyncIterator
+import asyncio
+import weakref
+import json
+import os
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.adk.utils.context_utils import Aclosing
+from google.genai.types import Content, Part
+from pydantic import BaseModel
+
+from common.session_store import session_service_from_env
+from waiter.agent import root_agent
+from waiter.shared_libraries.events import partial_text, render_event, tool_progress, STREAMING, TurnTimer
+
+APP_NAME = "waiter"
+# invocations of the agent tree allowed to run at once across all tables
+MAX_CONCURRENT_TURNS = int(os.getenv("WAITER_MAX_CONCURRENT_TURNS", "16"))
+# lines buffered per client before the turn producing them is paused
+CLIENT_QUEUE_SIZE = max(2, int(os.getenv("WAITER_CLIENT_QUEUE_SIZE", "64")))
+# seconds a turn may stay paused on a full client queue before it is abandoned
+CLIENT_SEND_TIMEOUT = float(os.getenv("WAITER_CLIENT_SEND_TIMEOUT", "10"))
+
+session_service = session_service_from_env()
+runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
+app = FastAPI(title="waiter")
+
+_turn_slots = asyncio.Semaphore(MAX_CONCURRENT_TURNS)
+# one turn at a time per session, ADK sessions aren't safe for concurrent invocations
+# a lock lives as long as a turn of its session holds or waits for it
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+_DONE = object()
+
+
+class Turn(BaseModel):
+    query: str
+
+
+def session_ids(table_id: str, guest_id: str) -> tuple[str, str]:
+    """
+    Sessions are owned by the table (user id) and keyed by guest
+
+    Returns:
+        tuple[str, str]: user id and session id to pass to the runner
+    """
+    return table_id, f"{table_id}:{guest_id}"
+
+
+async def _ensure_session(user_id: str, session_id: str):
+    session = await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    if session is None:
+        await session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+
+
+def _messages(event: Event) -> list[dict]:
+    text = partial_text(event)
+    if text:
+        return [{"type": "delta", "author": event.author, "text": text}]
+    messages = [
+        {"type": "progress", "author": event.author, "tool": tool, "status": status}
+        for tool, status in tool_progress(event)
+    ]
+    messages += [
+        {"type": "event", "author": event.author, "prefix": prefix, "message": msg}
+        for prefix, msg, _ in render_event(event)
+    ]
+    return messages
+
+
+async def _produce(user_id: str, session_id: str, query: str, queue: asyncio.Queue):
+    content = Content(role="user", parts=[Part(text=query)])
+    lock = _session_locks.setdefault(session_id, asyncio.Lock())
+    try:
+        async with lock, _turn_slots:
+            await _ensure_session(user_id, session_id)
+            timer = TurnTimer()
+            # closed on every exit, an abandoned turn doesn't leave the agent tree suspended
+            async with Aclosing(runner.run_async(
+                user_id=user_id, session_id=session_id, new_message=content, run_config=STREAMING
+            )) as events:
+                async for event in events:
+                    timer.observe(event)
+                    for message in _messages(event):
+                        # backpressure: wait for the client to drain, give up on clients that never do
+                        await asyncio.wait_for(queue.put(message), CLIENT_SEND_TIMEOUT)
+            await asyncio.wait_for(queue.put({"type": "timing", **timer.finish()}), CLIENT_SEND_TIMEOUT)
+    except asyncio.TimeoutError:
+        # the reader stopped draining: drop what it hasn't read and end its stream
+        _finish(queue, {"type": "error", "message": "client too slow, turn abandoned"})
+        return
+    except Exception as e:
+        _finish(queue, {"type": "error", "message": str(e)})
+        return
+    await queue.put(_DONE)
+
+
+def _finish(queue: asyncio.Queue, error: dict):
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(error)
+    queue.put_nowait(_DONE)
+
+
+async def stream_turn(table_id: str, guest_id: str, query: str) -> AsyncIterator[dict]:
+    """
+    Run one guest turn and yield the rendered events as they are produced
+    """
+    user_id, session_id = session_ids(table_id, guest_id)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    producer = asyncio.create_task(_produce(user_id, session_id, query, queue))
+    try:
+        while True:
+            message = await queue.get()
+            if message is _DONE:
+                break
+            yield message
+        yield {"type": "done"}
+    finally:
+        # the client went away mid-turn, don't keep a turn slot for it
+        if not producer.done():
+            producer.cancel()
+
+
+@app.post("/tables/{table_id}/guests/{guest_id}/turns")
+async def post_turn(table_id: str, guest_id: str, turn: Turn):
+    async def ndjson():
+        async for message in stream_turn(table_id, guest_id, turn.query):
+            yield json.dumps(message, ensure_ascii=False) + "\n"
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.websocket("/ws/tables/{table_id}/guests/{guest_id}")
+async def guest_socket(websocket: WebSocket, table_id: str, guest_id: str):
+    await websocket.accept()
+    try:
+        while True:
+            query = await websocket.receive_text()
+            async for message in stream_turn(table_id, guest_id, query):
+                await websocket.send_json(message)
+    except WebSocketDisconnect:
+        return
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("WAITER_PORT", "8000")))
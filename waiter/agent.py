@@ -9,18 +9,39 @@ from waiter.sub_agents.recommendation.agent import recommendations_refinement_lo
 from waiter.sub_agents.ordering.agent import ordering_agent
 
 from waiter.tools.memory import guest_model_init
+from waiter.tools.history import make_history_compactor
+from waiter.tools.router import make_fast_path_router
+from common.dynamic_instruction import dynamic_suffix
+from common.tool_cache import attach
+from common.tracing import instrument
 from waiter.models.services import GuestStore
 
 root_agent = LlmAgent(
     model="gemini-2.0-flash",
     name="root_agent",
     description="A waiter in a restaurant, helping order dishes and seating guests.",
-    instruction=prompt.ROOT_AGENT_INSTR,
+    static_instruction=prompt.ROOT_AGENT_STATIC,
     sub_agents=[
         seating_agent,
         recommendations_refinement_loop_agent,
         ordering_agent
     ],
     before_agent_callback=guest_model_init,
+    before_model_callback=[
+        # obvious phase transitions skip the model, the other callbacks only run when it is called
+        make_fast_path_router({
+            "seating": seating_agent.name,
+            "recommendation": recommendations_refinement_loop_agent.name,
+            "ordering": ordering_agent.name,
+        }),
+        make_history_compactor(),
+        dynamic_suffix(prompt.root_agent_instr),
+    ],
     tools=[GuestStore.new_guest, GuestStore.set_preferences, GuestStore.set_allergies]
 )
+
+# results of idempotent tools, see common/tool_cache.py
+attach(root_agent)
+
+# spans and latency histograms for every agent, model and tool call, see common/tracing.py
+instrument(root_agent)
@@ -0,0 +1,180 @@
+"""
+Time ordered record ids
+
+Snowflake style 63 bit ids written as 16 hex characters, so sorting ids as strings
+sorts them by creation time:
+
+    41 bits  milliseconds since EPOCH_MS (~69 years)
+    10 bits  node, distinct per process: `WAITER_NODE_ID`, else the first free one of
+             1024 lock files in `WAITER_NODE_DIR`, held until the process exits
+    12 bits  sequence within the millisecond, 4096 ids per millisecond per node
+
+Ids only ever increase within a process: when the clock moves back or a millisecond
+runs out of sequence numbers, the generator keeps counting on the last millisecond
+"""
+from pathlib import Path
+from typing import Optional
+import threading
+import tempfile
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+EPOCH_MS = 1_700_000_000_000
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+ID_LENGTH = 16
+
+
+# (node, open lock file) this process holds, the lock goes away with the process
+_claimed: Optional[tuple[int, object]] = None
+
+
+def _claim_node() -> int:
+    global _claimed
+    if _claimed is not None:
+        return _claimed[0]
+    if fcntl is None:
+        raise RuntimeError("node ids can't be locked on this platform, set WAITER_NODE_ID per process")
+    directory = Path(os.getenv("WAITER_NODE_DIR", Path(tempfile.gettempdir()) / "waiter-nodes"))
+    directory.mkdir(parents=True, exist_ok=True)
+    # start at the pid so processes starting together don't all race for node 0
+    for i in range(MAX_NODE + 1):
+        node = (os.getpid() + i) & MAX_NODE
+        lock = open(directory / f"{node}.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        _claimed = (node, lock)
+        return node
+    raise RuntimeError(f"all {MAX_NODE + 1} node ids in {directory} are taken, set WAITER_NODE_ID per process")
+
+
+def node_id() -> int:
+    """
+    Node of this process: `WAITER_NODE_ID` when set, which must then be unique across
+    processes and hosts, else one no other process on this host holds
+    """
+    if os.getenv("WAITER_NODE_ID"):
+        return int(os.environ["WAITER_NODE_ID"]) & MAX_NODE
+    return _claim_node()
+
+
+class IdGenerator:
+    """
+    Thread safe generator of time ordered ids for one node
+
+    Args:
+        node (Optional[int]): node component, derived from the environment when None
+    """
+
+    def __init__(self, node: Optional[int] = None):
+        self.node = node_id() if node is None else node & MAX_NODE
+        self._node_bits = self.node << SEQUENCE_BITS
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, n: int) -> tuple[int, int]:
+        # (millisecond, first sequence number) of n consecutive ids in one millisecond
+        with self._lock:
+            ms = time.time_ns() // 1_000_000 - EPOCH_MS
+            if ms > self._last_ms:
+                self._last_ms, self._sequence = ms, 0
+            else:
+                self._sequence += 1
+            if self._sequence + n - 1 > MAX_SEQUENCE:
+                # borrow the next millisecond, the clock catches up within a millisecond
+                self._last_ms, self._sequence = self._last_ms + 1, 0
+            first = self._sequence
+            self._sequence += n - 1
+            return self._last_ms, first
+
+    def next(self) -> str:
+        # _reserve(1) inlined, this is the hot path
+        with self._lock:
+            ms = time.time_ns() // 1_000_000 - EPOCH_MS
+            if ms > self._last_ms:
+                self._last_ms, self._sequence = ms, 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                self._last_ms, self._sequence = self._last_ms + 1, 0
+            value = (self._last_ms << (NODE_BITS + SEQUENCE_BITS)) | self._node_bits | self._sequence
+        return f"{value:016x}"
+
+    def take(self, n: int) -> list[str]:
+        """
+        n ids at once for bulk inserts, at most 4096 per reservation
+        """
+        ids: list[str] = []
+        while n > 0:
+            count = min(n, MAX_SEQUENCE + 1)
+            ms, sequence = self._reserve(count)
+            base = (ms << (NODE_BITS + SEQUENCE_BITS)) | self._node_bits | sequence
+            ids.extend([f"{value:016x}" for value in range(base, base + count)])
+            n -= count
+        return ids
+
+
+_generator = IdGenerator()
+
+
+def _reset_after_fork():
+    # a forked child would otherwise share the parent's node and hand out the same ids
+    global _generator, _claimed
+    if _claimed is not None:
+        # the parent keeps its lock, the child claims a node of its own
+        _claimed[1].close()
+        _claimed = None
+    _generator = IdGenerator()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def new_id() -> str:
+    return _generator.next()
+
+
+def new_ids(n: int) -> list[str]:
+    return _generator.take(n)
+
+
+def is_time_ordered(record_id: Optional[str]) -> bool:
+    """
+    Whether the id was made by an IdGenerator, ids of older records aren't
+    """
+    if not record_id or len(record_id) != ID_LENGTH:
+        return False
+    try:
+        int(record_id, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def created_at(record_id: str) -> float:
+    """
+    Epoch seconds the id was generated at
+    """
+    return ((int(record_id, 16) >> (NODE_BITS + SEQUENCE_BITS)) + EPOCH_MS) / 1000
+
+
+def id_range(start: float, end: float) -> tuple[str, str]:
+    """
+    Bounds [low, high) of the ids generated from `start` until `end` epoch seconds
+    """
+    def bound(seconds: float) -> str:
+        ms = max(0, int(seconds * 1000) - EPOCH_MS)
+        return f"{ms << (NODE_BITS + SEQUENCE_BITS):016x}"
+    return bound(start), bound(end)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable
+import threading
+
+from google.adk.agents.readonly_context import ReadonlyContext
+
+
+class SessionRegistry:
+    """
+    Process-local home of the per-session service objects
+    Session state only keeps the ids the services are built from, so a service that
+    isn't cached here (new process, evicted session) is rebuilt from the state on demand
+    Singleton for consistency across all instantiations
+    """
+    _instance = None
+    MAX_SESSIONS = 10_000
+    # session id -> {service kind: (state version the service reflects, service)}, least recently used first
+    _sessions: "OrderedDict[str, dict[str, tuple[int, Any]]]" = OrderedDict()
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    @staticmethod
+    def session_id(context: ReadonlyContext) -> str:
+        return context.session.id
+
+    def get(
+        self,
+        context: ReadonlyContext,
+        kind: str,
+        factory: Callable[[ReadonlyContext], Any],
+        version: int = 0,
+    ) -> Any:
+        """
+        The `kind` service of the context's session
+
+        Args:
+            context: context of the session the service belongs to
+            kind (str): state key the service is stored under, e.g. constants.ORDER_KEY
+            factory: builds the service from the context when it isn't cached
+            version (int): version counter kept in state, a cached service built at another
+                version was saved elsewhere since and is rebuilt
+        """
+        session_id = self.session_id(context)
+        with self._lock:
+            services = self._sessions.setdefault(session_id, {})
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+            cached = services.get(kind)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        # built outside the lock, factories hit storage
+        service = factory(context)
+        with self._lock:
+            self._sessions.setdefault(session_id, {})[kind] = (version, service)
+        return service
+
+    def saved(self, context: ReadonlyContext, kind: str, version: int):
+        """
+        Record that the cached `kind` service was saved at `version`
+        """
+        with self._lock:
+            cached = self._sessions.get(self.session_id(context), {}).get(kind)
+            if cached is not None:
+                self._sessions[self.session_id(context)][kind] = (version, cached[1])
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
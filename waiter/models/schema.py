@@ -1,36 +1,133 @@
 from __future__ import annotations
+from contextlib import contextmanager
 from dataclasses import dataclass, field, asdict
-from typing import List, Optional, Union
+from typing import ClassVar, Hashable, List, NamedTuple, Optional, Union
 from random import randint
 from pathlib import Path
+from time import time
 import json
+import sys
+import gc
+
+from waiter.models.storage import Storage, storage_from_env
+from waiter.models.ids import id_range, is_time_ordered, new_id
+from common.tracing import TRACER
+
+
+def _intern(values: List[str]) -> List[str]:
+    # ingredients, categories and allergies repeat across thousands of rows, keep one copy of each
+    return [sys.intern(value) for value in values]
+
+
+@contextmanager
+def _bulk_load():
+    # records hold no reference cycles, collecting while thousands of them are built only costs time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# ========== DISH ENTRIES ==========
+
+class Modification(NamedTuple):
+    ingredient: str
+    change: str
+
+
+class DishEntry(NamedTuple):
+    """
+    Dish on an order or recommendation with its modifications
+    Stored in json as `[name, {ingredient: change}]`
+    """
+    name: str
+    modifications: tuple[Modification, ...] = ()
+
+    @staticmethod
+    def of(name: str, modifications: dict[str, str]) -> "DishEntry":
+        return DishEntry(
+            sys.intern(name),
+            tuple(Modification(sys.intern(ingredient), change) for ingredient, change in modifications.items()),
+        )
+
+    @staticmethod
+    def from_json(entry: Union[DishEntry, list]) -> "DishEntry":
+        if isinstance(entry, DishEntry):
+            return entry
+        name, modifications = entry
+        return DishEntry.of(name, modifications)
+
+    def to_json(self) -> list:
+        return [self.name, self.modifications_dict()]
+
+    def modifications_dict(self) -> dict[str, str]:
+        return dict(self.modifications)
+
+    def merged(self, modifications: dict[str, str]) -> "DishEntry":
+        """
+        Entry with the modifications added, replacing earlier changes to the same ingredients
+        """
+        return DishEntry.of(self.name, self.modifications_dict() | modifications)
 
 
 # ========== BASE CLASS ==========
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class DB:
     id: Optional[str] = field(default=None)
-    _filename: str = field(default="db.json", repr=False)
+    # json file the records live in, set by every child class
+    _filename: ClassVar[str] = "db.json"
+    _storage: ClassVar[Storage] = storage_from_env()
+    # files the current storage has, checked once instead of once per record
+    _connected: ClassVar[set[str]] = set()
 
     def __post_init__(self):
-        if not Path(self._filename).exists():
-            raise FileNotFoundError(f"DB connection wasn't possible for: '{self._filename}'")
+        if self._filename not in DB._connected:
+            if not DB._storage.exists(self._filename):
+                raise FileNotFoundError(f"DB connection wasn't possible for: '{self._filename}'")
+            DB._connected.add(self._filename)
         if not self.id:
-            self.id = str(randint(1, 100))
+            self.id = new_id()
+
+    @staticmethod
+    def use_storage(storage: Storage):
+        """
+        Swap the backend every model persists through, closing the previous one
+        """
+        DB._storage.close()
+        DB._storage = storage
+        DB._connected = set()
 
-    def _save_json(self, data: list[dict]):
-        print("Saving to DB:", Path(self._filename).absolute())
-        with open(self._filename, "w") as f:
-            json.dump(data, f, indent=2)
+    def _upsert(self):
+        with TRACER.span("storage", "upsert", file=self._filename):
+            DB._storage.upsert(self._filename, self.to_dict())
+
+    def _upsert_if(self, field: str, expected, default=None) -> bool:
+        with TRACER.span("storage", "upsert", file=self._filename):
+            return DB._storage.upsert_if(self._filename, self.to_dict(), field, expected, default)
 
     @staticmethod
     def _load_json(filename: str) -> list[dict]:
-        path = Path(filename)
-        if not path.exists():
-            return []
-        with open(path) as f:
-            return json.load(f)
+        with TRACER.span("storage", "load", file=filename):
+            return DB._storage.load(filename)
+
+    @staticmethod
+    def _find(filename: str, field: str, value) -> list[dict]:
+        with TRACER.span("storage", "find", file=filename, field=field):
+            return DB._storage.find(filename, field, value)
+
+    @staticmethod
+    def _scan(filename: str, field: str, low: str, high: str) -> list[dict]:
+        with TRACER.span("storage", "scan", file=filename, field=field):
+            return DB._storage.scan(filename, field, low, high)
+
+    @staticmethod
+    def _generation(filename: str) -> Hashable:
+        # not traced, called on every cached tool call to key its result
+        return DB._storage.generation(filename)
 
     @staticmethod
     def all() -> List["DB"]:
@@ -40,108 +137,171 @@ class DB:
         raise NotImplementedError
 
     def to_dict(self):
-        d = asdict(self)
-        d.pop("_filename", None)
-        return d
+        return asdict(self)
 
 
 # ========== CHILD CLASSES ==========
 
-@dataclass
+@dataclass(slots=True)
 class Dish(DB):
     name: Optional[str] = None
     price: Optional[float] = None
     ingredients: List[str] = field(default_factory=list)
     category: Optional[str] = None
     description: Optional[str] = None
-    _filename: str = field(default="dish.json", init=False, repr=False)
+    _filename: ClassVar[str] = "dish.json"
+
+    def __post_init__(self):
+        DB.__post_init__(self)
+        self.ingredients = _intern(self.ingredients)
+        if self.category is not None:
+            self.category = sys.intern(self.category)
 
     @staticmethod
     def all() -> List["Dish"]:
-        return [Dish(**d) for d in Dish._load_json(Dish._filename)]
+        rows = Dish._load_json(Dish._filename)
+        with _bulk_load():
+            return [Dish(**d) for d in rows]
 
     def save(self):
-        dishes = self._load_json(Dish._filename)
-        dishes = [d for d in dishes if d.get("id") != self.id]
-        dishes.append(self.to_dict())
-        self._save_json(dishes)
+        self._upsert()
 
 
-@dataclass
+@dataclass(slots=True)
 class Guest(DB):
     name: Optional[str] = None
     preferences: List[str] = field(default_factory=list)
     allergies: List[str] = field(default_factory=list)
     history: List[Dish] = field(default_factory=list)
-    _filename: str = field(default="guest.json", init=False, repr=False)
+    _filename: ClassVar[str] = "guest.json"
+
+    def __post_init__(self):
+        DB.__post_init__(self)
+        self.preferences = _intern(self.preferences)
+        self.allergies = _intern(self.allergies)
 
     @staticmethod
     def all() -> List["Guest"]:
-        return [Guest(**g) for g in Guest._load_json(Guest._filename)]
+        rows = Guest._load_json(Guest._filename)
+        with _bulk_load():
+            return [Guest(**g) for g in rows]
 
     def save(self):
-        guests = self._load_json(Guest._filename)
-        guests = [g for g in guests if g.get("id") != self.id]
-        guests.append(self.to_dict())
-        self._save_json(guests)
+        self._upsert()
 
 
-@dataclass
+@dataclass(slots=True)
 class Recommendation(DB):
     guest_id: Optional[str] = None
-    # dish name, {ingredient: modifications}
-    recommended_dishes: List[List[Union[str, dict[str, str]]]] = field(default_factory=list)
+    # lowercased dish name, modifications
+    recommended_dishes: List[DishEntry] = field(default_factory=list)
     reason: str = field(default_factory=str)
-    _filename: str = field(default="recommendation.json", init=False, repr=False)
+    _filename: ClassVar[str] = "recommendation.json"
+
+    def __post_init__(self):
+        DB.__post_init__(self)
+        self.recommended_dishes = [DishEntry.from_json(entry) for entry in self.recommended_dishes]
 
     @staticmethod
     def all() -> List["Recommendation"]:
-        return [Recommendation(**r) for r in Recommendation._load_json(Recommendation._filename)]
+        rows = Recommendation._load_json(Recommendation._filename)
+        with _bulk_load():
+            return [Recommendation(**r) for r in rows]
+
+    @staticmethod
+    def by_guest(guest_id: str) -> Optional["Recommendation"]:
+        recs = Recommendation._find(Recommendation._filename, "guest_id", guest_id)
+        return Recommendation(**recs[0]) if recs else None
 
     def save(self):
-        recs = self._load_json(Recommendation._filename)
-        recs = [r for r in recs if r["id"] != self.id]
-        recs.append(self.to_dict())
-        self._save_json(recs)
+        self._upsert()
+
+    def to_dict(self):
+        d = DB.to_dict(self)
+        d["recommended_dishes"] = [entry.to_json() for entry in self.recommended_dishes]
+        return d
 
 
-@dataclass
+@dataclass(slots=True)
 class Order(DB):
     guest_id: Optional[str] = None
-    # order name, modifications
-    dishes: List[List[Union[str, dict[str, str]]]] = field(default_factory=list)
-    _filename: str = field(default="order.json", init=False, repr=False)
+    # dish name, modifications
+    dishes: List[DishEntry] = field(default_factory=list)
+    _filename: ClassVar[str] = "order.json"
+
+    def __post_init__(self):
+        DB.__post_init__(self)
+        self.dishes = [DishEntry.from_json(entry) for entry in self.dishes]
 
     @staticmethod
     def all() -> List["Order"]:
-        return [Order(**o) for o in Order._load_json(Order._filename)]
+        rows = Order._load_json(Order._filename)
+        with _bulk_load():
+            return [Order(**o) for o in rows]
+
+    @staticmethod
+    def by_guest(guest_id: str) -> Optional["Order"]:
+        orders = Order._find(Order._filename, "guest_id", guest_id)
+        return Order(**orders[0]) if orders else None
+
+    @staticmethod
+    def created_between(start: float, end: float) -> List["Order"]:
+        """
+        Orders created from `start` until `end` epoch seconds, oldest first
+        Ids sort by creation time, so this is a range scan over the id
+        """
+        low, high = id_range(start, end)
+        # ids of records from before time ordered ids can fall inside the bounds
+        return [Order(**o) for o in Order._scan(Order._filename, "id", low, high) if is_time_ordered(o["id"])]
 
     def save(self):
-        orders = self._load_json(Order._filename)
-        orders = [o for o in orders if o["id"] != self.id]
-        orders.append(self.to_dict())
-        self._save_json(orders)
+        self._upsert()
+
+    def to_dict(self):
+        d = DB.to_dict(self)
+        d["dishes"] = [entry.to_json() for entry in self.dishes]
+        return d
 
 
-@dataclass
+@dataclass(slots=True)
 class Table(DB):
     capacity: Optional[int] = None
     environment: List[str] = field(default_factory=list)
     occupied: bool = False
     guest_id: Optional[str] = None
-    _filename: str = field(default="table.json", init=False, repr=False)
+    # epoch seconds after which the allotment lapses, None never lapses
+    reserved_until: Optional[float] = None
+    # bumped on every allot / release so stale copies can be detected
+    version: int = 0
+    _filename: ClassVar[str] = "table.json"
 
     @staticmethod
     def all() -> List["Table"]:
-        return [Table(**t) for t in Table._load_json(Table._filename)]
+        rows = Table._load_json(Table._filename)
+        with _bulk_load():
+            return [Table(**t) for t in rows]
 
-    def save(self):
-        tables = self._load_json(Table._filename)
-        tables = [t for t in tables if str(t["id"]) != str(self.id)]
-        tables.append(self.to_dict())
-        self._save_json(tables)
+    def save(self) -> bool:
+        """
+        Write the table if the stored copy is still the one this was changed from, `version - 1`
+        False means another process changed it first, reload it before deciding again
+        """
+        return self._upsert_if("version", self.version - 1, default=0)
 
-    def allot_table(self, guest_id: str):
+    def allot_table(self, guest_id: str, ttl: Optional[float] = None) -> bool:
         self.guest_id = guest_id
         self.occupied = True
-        self.save()
+        self.reserved_until = time() + ttl if ttl else None
+        self.version += 1
+        return self.save()
+
+    def release(self) -> bool:
+        self.guest_id = None
+        self.occupied = False
+        self.reserved_until = None
+        self.version += 1
+        return self.save()
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        now = time() if now is None else now
+        return self.occupied and self.reserved_until is not None and self.reserved_until <= now
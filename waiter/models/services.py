@@ -3,7 +3,31 @@ from google.adk.agents.callback_context import CallbackContext
 from google.adk.sessions.state import State
 
 from waiter.models.schema import *
+from waiter.models.registry import SessionRegistry
 from waiter.shared_libraries import constants
+from common.tool_cache import cacheable
+
+from bisect import bisect_left
+import threading
+import heapq
+
+def _saved(tool_context: ToolContext, kind: str, version_key: str):
+    # state only holds ids, the version counter tells other processes their cached service is stale
+    version = tool_context.state.get(version_key, 0) + 1
+    tool_context.state[version_key] = version
+    SessionRegistry().saved(tool_context, kind, version)
+
+def _order_version(tool_context: ToolContext) -> tuple:
+    return (
+        SessionRegistry.session_id(tool_context),
+        tool_context.state.get(constants.ORDER_KEY),
+        tool_context.state.get(constants.ORDER_VERSION_KEY, 0),
+    )
+
+def _tables_version(tool_context: ToolContext) -> tuple:
+    # the stored tables change with saves by any process, reservations also run out without one,
+    # a miss syncs and sweeps them in the tool itself
+    return (Table._generation(Table._filename), TableStore()._reservation_due())
 
 class DishStore:
     """
@@ -12,19 +36,71 @@ class DishStore:
     """
     _instance = None
     _dishes: List[Dish] = []
+    # lowercased name -> dish, id -> dish, lowercased ingredient -> dish ids
+    _by_name: dict[str, Dish] = {}
+    _by_id: dict[str, Dish] = {}
+    _by_ingredient: dict[str, set[str]] = {}
+    # bumped on every change to the menu, caches built from the dishes key on it
+    _version: int = 0
+    _init_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._dishes = Dish.all()
+            # tools run in a thread pool, a concurrent first call waits for the indexes instead of seeing them half built
+            with cls._init_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    cls._dishes = Dish.all()
+                    cls._by_name, cls._by_id, cls._by_ingredient = {}, {}, {}
+                    for dish in cls._dishes:
+                        cls._index(dish)
+                    cls._instance = instance
         return cls._instance
-    
+
+    @classmethod
+    def _index(cls, dish: Dish):
+        cls._by_id[dish.id] = dish
+        if dish.name:
+            cls._by_name[dish.name.lower()] = dish
+        for ingredient in dish.ingredients:
+            cls._by_ingredient.setdefault(ingredient.lower(), set()).add(dish.id)
+
+    @classmethod
+    def _unindex(cls, dish: Dish):
+        cls._by_id.pop(dish.id, None)
+        if dish.name and cls._by_name.get(dish.name.lower()) is dish:
+            del cls._by_name[dish.name.lower()]
+        for ingredient in dish.ingredients:
+            dish_ids = cls._by_ingredient.get(ingredient.lower(), set())
+            dish_ids.discard(dish.id)
+            if not dish_ids:
+                cls._by_ingredient.pop(ingredient.lower(), None)
+
     def _get_dish(self, dish_name: str) -> Optional[Dish]: 
-        dish_names: list[str] = [dish.name.lower() for dish in self._dishes]
-        try: 
-            return self._dishes[dish_names.index(dish_name.lower())]
-        except ValueError:
-            return None
+        return self._by_name.get(dish_name.lower())
+
+    def save_dish(self, dish: Dish):
+        """
+        Persist a new or changed dish and update the indexes for it only
+        """
+        dish.save()
+        previous = self._by_id.get(dish.id)
+        if previous is not None:
+            self._unindex(previous)
+            self._dishes[self._dishes.index(previous)] = dish
+        else:
+            self._dishes.append(dish)
+        self._index(dish)
+        DishStore._version += 1
+
+    def dishes_with(self, ingredients: list[str]) -> list[Dish]:
+        """
+        Dishes containing any of the ingredients, matched case-insensitively
+        """
+        dish_ids: set[str] = set()
+        for ingredient in ingredients:
+            dish_ids |= self._by_ingredient.get(ingredient.lower(), set())
+        return [self._by_id[dish_id] for dish_id in sorted(dish_ids)]
 
     @staticmethod
     def request_modification(dish_name: str, modification: dict[str, str]) -> tuple[bool, str]:
@@ -96,11 +172,15 @@ class GuestStore:
     """
     _instance = None
     _guests: List[Guest] = []
+    _init_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._guests = Guest.all()
+            with cls._init_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    cls._guests = Guest.all()
+                    cls._instance = instance
         return cls._instance
     
     @staticmethod
@@ -125,8 +205,7 @@ class GuestStore:
         """
         guest = Guest(name=name)
         guest.save()
-        guest_store: "GuestStore" = tool_context.state[constants.GUEST_KEY]
-        guest_store._guests.append(guest)
+        GuestStore()._guests.append(guest)
         tool_context.state[constants.GUEST_KEY] = guest.id
         return guest
     
@@ -176,16 +255,13 @@ class RecommendationService:
     Class to get, modify, and store recommendations for a guest for a dish
     """
     _recommendation: Recommendation
-    _recommendations: list[Recommendation] = []
     _guest: Optional[Guest] = None
 
     def __init__(self, callback_context: CallbackContext):
-        self._recommendations = Recommendation.all()
         current_guest: Guest = GuestStore().get_curr_guest(callback_context.state)
         self._guest = current_guest
-        self._recommendations = Recommendation.all()
         # get recommendation for guest only
-        self._recommendation = next((rec for rec in self._recommendations if rec.guest_id == self._guest.id), None)
+        self._recommendation = Recommendation.by_guest(self._guest.id)
         if self._recommendation is None: 
             self._recommendation = Recommendation(
                 guest_id=self._guest.id,
@@ -193,26 +269,26 @@ class RecommendationService:
             )
             self._recommendation.save()
         
-    def get_modifications_for_dish(self, dish: Dish) -> dict[str, str]: 
+    def get_modifications_for_dish(self, dish: Dish) -> tuple[Modification, ...]: 
         # doesn't handle case when guest asks for multiple modifications of same dish
-        recommended_dish_names: list[str] = [dish_with_mods[0].lower() for dish_with_mods in self._recommendation.recommended_dishes]
+        recommended_dish_names: list[str] = [entry.name.lower() for entry in self._recommendation.recommended_dishes]
         if dish.name.lower() not in recommended_dish_names: 
-            return {}
+            return ()
         ind = recommended_dish_names.index(dish.name.lower())
-        return self._recommendation.recommended_dishes[ind][1] 
+        return self._recommendation.recommended_dishes[ind].modifications
 
     def store_recommended_dish(self, dish: Dish, modifications: dict[str, str], reason: str): 
-        recommended_dish_names: list[str] = [dish_with_mods[0].lower() for dish_with_mods in self._recommendation.recommended_dishes]
+        recommended_dish_names: list[str] = [entry.name.lower() for entry in self._recommendation.recommended_dishes]
         self._recommendation.reason += reason
 
         if dish.name.lower() not in recommended_dish_names:
-            self._recommendation.recommended_dishes.append((dish.name.lower(), modifications))
+            self._recommendation.recommended_dishes.append(DishEntry.of(dish.name.lower(), modifications))
             self._recommendation.save()
             return
 
         ind = recommended_dish_names.index(dish.name.lower())
         # merge modifications to keep old info
-        self._recommendation.recommended_dishes[ind][1] |= modifications
+        self._recommendation.recommended_dishes[ind] = self._recommendation.recommended_dishes[ind].merged(modifications)
         self._recommendation.save()
 
     @staticmethod
@@ -238,27 +314,31 @@ class RecommendationService:
         recommended_dish: Optional[Dish] = DishStore()._get_dish(dish_name)
         if recommended_dish is None:
             return [False, "We don't make that dish or isn't in stock"]            
-        recommendation_service: RecommendationService = tool_context.state[constants.RECOMMENDATION_KEY]
+        recommendation_service = RecommendationService.get_curr_recommendation_service(tool_context)
         recommendation_service.store_recommended_dish(recommended_dish, modifications, reason)
+        _saved(tool_context, constants.RECOMMENDATION_KEY, constants.RECOMMENDATION_VERSION_KEY)
         return (True, "")
     
     @staticmethod
     def get_curr_recommendation_service(tool_context: ToolContext) -> "RecommendationService": 
-        return tool_context.state[constants.RECOMMENDATION_KEY]
+        return SessionRegistry().get(
+            tool_context,
+            constants.RECOMMENDATION_KEY,
+            RecommendationService,
+            tool_context.state.get(constants.RECOMMENDATION_VERSION_KEY, 0),
+        )
 
 class OrderService: 
     """
     Class to access state of order for guest
     """
-    _orders: list[Order] = []
     _order: Order
     _guest: Guest
     
     def __init__(self, callback_context: CallbackContext): 
         self._guest = GuestStore().get_curr_guest(callback_context.state)
         self._recommendation_service: RecommendationService = RecommendationService.get_curr_recommendation_service(callback_context)
-        self._orders = Order.all()
-        self._order = next((order for order in self._orders if order.guest_id == self._guest.id), None)
+        self._order = Order.by_guest(self._guest.id)
         if self._order is None: 
             self._order = Order(
                 guest_id=self._guest.id,
@@ -266,84 +346,191 @@ class OrderService:
             )
     
     def _get_dish_index(self, dish: Dish):
-        dish_names: list[str] = [dish_dto[0] for dish_dto in self._order.dishes]
+        dish_names: list[str] = [entry.name for entry in self._order.dishes]
         return dish_names.index(dish.name)
 
-    def _add_dish(self, dish: Dish, modifications: Optional[dict[str, str]] = {}): 
-        try: 
-            ind = self._get_dish_index(dish)
-            # overwrite mods here because handling of modifications should occur through recommendation service
-            self._order.dishes[ind][1] = modifications
-        except: 
-            self._order.dishes.append((dish.name, modifications))
-        self._order.save()
+    def _resolve(self, dish_names: list[str]) -> tuple[list[tuple[Dish, tuple[Modification, ...]]], list[str]]:
+        """
+        Look up every dish and its recommended modifications in one pass
+
+        Returns:
+            Tuple:
+                list[tuple[Dish, tuple[Modification, ...]]]: dishes on the menu with their modifications, in order and without repeats
+                list[str]: names that aren't on the menu
+        """
+        dishes: dict[str, tuple[Dish, tuple[Modification, ...]]] = {}
+        unknown: list[str] = []
+        for dish_name in dish_names:
+            dish: Optional[Dish] = DishStore()._get_dish(dish_name)
+            if dish is None:
+                unknown.append(dish_name)
+            elif dish.name not in dishes:
+                dishes[dish.name] = (dish, self._recommendation_service.get_modifications_for_dish(dish))
+        return list(dishes.values()), unknown
+
+    def _add_dishes(self, dishes: list[tuple[Dish, tuple[Modification, ...]]]):
+        """
+        Put the dishes on the order and save it once, the order is left untouched if the save fails
+        """
+        # entries are immutable, a shallow copy is enough to roll back
+        previous = list(self._order.dishes)
+        try:
+            for dish, modifications in dishes:
+                try:
+                    ind = self._get_dish_index(dish)
+                    # overwrite mods here because handling of modifications should occur through recommendation service
+                    self._order.dishes[ind] = DishEntry(dish.name, modifications)
+                except ValueError:
+                    self._order.dishes.append(DishEntry(dish.name, modifications))
+            self._order.save()
+        except Exception:
+            self._order.dishes = previous
+            raise
+
+    def _add_dish(self, dish: Dish, modifications: tuple[Modification, ...] = ()): 
+        self._add_dishes([(dish, modifications)])
     
     @staticmethod
     def get_curr_order_service(tool_context: ToolContext) -> "OrderService": 
-        return tool_context.state[constants.ORDER_KEY]
+        return SessionRegistry().get(
+            tool_context,
+            constants.ORDER_KEY,
+            OrderService,
+            tool_context.state.get(constants.ORDER_VERSION_KEY, 0),
+        )
 
     @staticmethod
+    @cacheable(version=_order_version)
     def get_dishes(tool_context: ToolContext): 
         """
         Get the current dishes on the guests order list with modifications
         
         Returns: 
-            List[tuple[Dish, dict[str, str]]] : list of dishes with their modifications as a tuple
+            List[list[str, dict[str, str]]] : list of dish names with their modifications
         """
         order_service = OrderService.get_curr_order_service(tool_context)
-        return order_service._order.dishes
+        return [entry.to_json() for entry in order_service._order.dishes]
 
     @staticmethod
-    def update_dishes(tool_context: ToolContext, dish_names: list[str]):
+    def update_dishes(tool_context: ToolContext, dish_names: list[str]) -> tuple[bool, str]:
         """
         Updates the current state of the dishes to be ordered with new dishes
+        All of the dishes are added with a single save, or none of them if any isn't on the menu
 
         Args: 
             dishes(list[str]): name of the dishes as a list
+
+        Returns: 
+            Tuple:
+                bool: whether the dishes were added
+                str: reason the dishes couldn't be added
         """
         order_service = OrderService.get_curr_order_service(tool_context)
 
-        for dish_name in dish_names:
-            dish: Dish = DishStore()._get_dish(dish_name)
-            modifications: dict[str, str] = order_service._recommendation_service.get_modifications_for_dish(dish)
-            order_service._add_dish((dish, modifications))
+        dishes, unknown = order_service._resolve(dish_names)
+        if unknown:
+            return (False, f"We don't make these dishes or they aren't in stock: {', '.join(unknown)}")
+        order_service._add_dishes(dishes)
+        _saved(tool_context, constants.ORDER_KEY, constants.ORDER_VERSION_KEY)
+        return (True, "")
     
     @staticmethod
-    def add_dish(tool_context: ToolContext, dish_name: str):
+    def add_dish(tool_context: ToolContext, dish_name: str) -> tuple[bool, str]:
         """
         Adds a dish to the order list
         Args: 
             dish(str): name of the dish
         """
-        order_service = OrderService.get_curr_order_service(tool_context)
-        recommendation_state: RecommendationService = tool_context.state[constants.RECOMMENDATION_KEY]
-
-        dish: Dish = DishStore()._get_dish(dish_name)
-        modifications: dict[str, str] = recommendation_state.get_modifications_for_dish(dish)
-
-        order_service._add_dish(dish, modifications)
+        return OrderService.update_dishes(tool_context, [dish_name])
   
     @staticmethod
     def place_order(tool_context: ToolContext):
         """
         Places the order of the dishes
         """
-        order_service: "OrderService" = tool_context.state[constants.ORDER_KEY]
+        order_service = OrderService.get_curr_order_service(tool_context)
         order_service._order.save()
-        print(f"ORDER HAS BEEN PLACED FOR: {json.dumps(order_service._order, indent=2)}")
+        _saved(tool_context, constants.ORDER_KEY, constants.ORDER_VERSION_KEY)
+        print(f"ORDER HAS BEEN PLACED FOR: {json.dumps(order_service._order.to_dict(), indent=2)}")
 
 class TableStore:
     """
     Class to access the state of available tables
+    Allotments are decided under a per-table lock on a copy refreshed from storage, and
+    written with `Table.save`, a compare-and-set on the table's version: when another
+    process changed the table in between the write is refused and the decision is made
+    again on its copy. That holds across processes on the json and sqlite backends, the
+    wal backend is single process
     """
     _instance = None
     _tables: List[Table] = []
+    _locks: dict[str, threading.Lock] = {}
+    _locks_guard = threading.Lock()
+    # (capacity, table id, position in _tables) sorted, capacities kept alongside for bisect
+    _by_capacity: list[tuple[int, str, int]] = []
+    _capacities: list[int] = []
+    # lowercased environment -> bitmap of positions in _tables
+    _env_bits: dict[str, int] = {}
+    # table id -> position in _tables
+    _positions: dict[str, int] = {}
+    # storage generation of the table file the copies in _tables were last synced at
+    _synced: Hashable = None
+    # (reserved_until, position in _tables) of reservations that lapse, soonest first
+    _reservations: list[tuple[float, int]] = []
+    _reservations_lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._tables = Table.all()
+            # see DishStore.__new__, the instance is published once the indexes are complete
+            with cls._locks_guard:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    cls._synced = Table._generation(Table._filename)
+                    cls._tables = Table.all()
+                    cls._build_indexes()
+                    cls._reservations = [
+                        (table.reserved_until, pos) for pos, table in enumerate(cls._tables)
+                        if table.occupied and table.reserved_until is not None
+                    ]
+                    heapq.heapify(cls._reservations)
+                    cls._instance = instance
         return cls._instance
+
+    @classmethod
+    def _build_indexes(cls):
+        cls._by_capacity = sorted((table.capacity or 0, str(table.id), pos) for pos, table in enumerate(cls._tables))
+        cls._capacities = [capacity for capacity, _, _ in cls._by_capacity]
+        cls._env_bits = {}
+        cls._positions = {str(table.id): pos for pos, table in enumerate(cls._tables)}
+        for pos, table in enumerate(cls._tables):
+            for environment in table.environment:
+                key = environment.lower()
+                cls._env_bits[key] = cls._env_bits.get(key, 0) | (1 << pos)
+
+    def find(
+        self,
+        party_size: int,
+        environments: Optional[list[str]] = None,
+        exclude_occupied: bool = True,
+        k: int = 3,
+    ) -> list[Table]:
+        """
+        Top-k tables seating the party, best first
+
+        Tables matching more of the requested environments rank first, then the
+        smallest table that fits, then the lowest table number
+        """
+        wanted = [self._env_bits.get(environment.lower(), 0) for environment in environments or []]
+        self._sync()
+        self._expire_reservations()
+        candidates = []
+        for capacity, table_id, pos in self._by_capacity[bisect_left(self._capacities, party_size):]:
+            table = self._tables[pos]
+            if exclude_occupied and table.occupied:
+                continue
+            matched = sum(1 for bits in wanted if bits >> pos & 1)
+            candidates.append((-matched, capacity, table_id, pos))
+        return [self._tables[pos] for *_, pos in heapq.nsmallest(k, candidates)]
     
     def _get_table(self, table_id: str) -> Optional[Table]: 
         # can add deterministic logic / another agent to filter tables by weather condns
@@ -352,20 +539,160 @@ class TableStore:
                 return table
         return None
 
+    def _lock_for(self, table_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(table_id, threading.Lock())
+
     @staticmethod
-    def allot_to_guest(tool_context: ToolContext, table_id: str): 
+    def _refresh(table: Table, force: bool = False):
+        # force: a write was refused, the stored copy may have the same version as ours with other values
+        stored = Table._find(Table._filename, "id", table.id)
+        if stored and (force or stored[0].get("version", 0) > table.version):
+            for key, value in stored[0].items():
+                setattr(table, key, value)
+
+    def _sync(self):
+        """
+        Pick up the tables other processes saved since the last sync, one load when the file changed
+        """
+        generation = Table._generation(Table._filename)
+        if generation == TableStore._synced:
+            return
+        for stored in Table._load_json(Table._filename):
+            pos = self._positions.get(str(stored.get("id")))
+            if pos is None:
+                continue
+            table = self._tables[pos]
+            with self._lock_for(table.id):
+                if stored.get("version", 0) <= table.version:
+                    continue
+                for key, value in stored.items():
+                    setattr(table, key, value)
+                self._track(pos)
+        # saves made during the load move the generation again, the next call syncs once more
+        TableStore._synced = generation
+
+    @classmethod
+    def _reservation_due(cls) -> bool:
+        with cls._reservations_lock:
+            return bool(cls._reservations) and cls._reservations[0][0] <= time()
+
+    def _track(self, pos: int):
+        table = self._tables[pos]
+        if table.occupied and table.reserved_until is not None:
+            with self._reservations_lock:
+                heapq.heappush(self._reservations, (table.reserved_until, pos))
+
+    def _release_expired(self, table: Table, now: Optional[float] = None):
+        # under the table's lock, on a refreshed copy
+        while table.expired(now):
+            if table.release():
+                return
+            self._refresh(table, force=True)
+
+    def _expire_reservations(self):
+        now = time()
+        while True:
+            with self._reservations_lock:
+                if not self._reservations or self._reservations[0][0] > now:
+                    return
+                _, pos = heapq.heappop(self._reservations)
+            table = self._tables[pos]
+            with self._lock_for(table.id):
+                self._refresh(table)
+                self._release_expired(table, now)
+                # re-allotted since the entry was pushed, by this process or another one
+                if table.reserved_until is not None and table.reserved_until > now:
+                    self._track(pos)
+
+    def try_allot(self, table_id: str, guest_id: str, ttl: Optional[float] = constants.TABLE_RESERVATION_TTL) -> tuple[bool, str]:
+        """
+        Atomically allot a free table to a guest
+
+        Returns:
+            Tuple:
+                bool: whether the table was allotted
+                str: reason the table couldn't be allotted
+        """
+        table = self._get_table(table_id)
+        if table is None:
+            return (False, f"Table {table_id} doesn't exist")
+        with self._lock_for(table_id):
+            self._refresh(table)
+            while True:
+                self._release_expired(table)
+                if table.occupied and table.guest_id != guest_id:
+                    return (False, f"Table {table_id} is already occupied")
+                if table.allot_table(guest_id, ttl):
+                    break
+                # another process changed the table since it was read, decide again on its copy
+                self._refresh(table, force=True)
+            self._track(self._positions[str(table_id)])
+        return (True, "")
+
+    def release(self, table_id: str, guest_id: Optional[str] = None) -> tuple[bool, str]:
+        """
+        Free a table for the next guest, only if `guest_id` holds it when one is passed
+        """
+        table = self._get_table(table_id)
+        if table is None:
+            return (False, f"Table {table_id} doesn't exist")
+        with self._lock_for(table_id):
+            self._refresh(table)
+            while True:
+                if guest_id is not None and table.guest_id != guest_id:
+                    return (False, f"Table {table_id} isn't allotted to this guest")
+                if table.release():
+                    break
+                self._refresh(table, force=True)
+        return (True, "")
+
+    @staticmethod
+    def allot_to_guest(tool_context: ToolContext, table_id: str) -> tuple[bool, str]: 
         """
         Allots a table to the guest currently being serviced
         Args:
             table_id(str): id of table you want to allot to guest
+
+        Returns:
+            Tuple:
+                bool: whether the table was allotted
+                str: reason the table couldn't be allotted, pick another table if it was taken
+        """
+        allotted, reason = TableStore().try_allot(table_id, GuestStore().get_curr_guest(tool_context.state).id)
+        if allotted:
+            tool_context.state[constants.TABLE_KEY] = table_id
+        return (allotted, reason)
+
+    @staticmethod
+    def release_table(tool_context: ToolContext, table_id: str) -> tuple[bool, str]:
+        """
+        Frees the table of the guest currently being serviced once they leave
+        Args:
+            table_id(str): id of the table the guest was seated at
+        """
+        released, reason = TableStore().release(table_id, GuestStore().get_curr_guest(tool_context.state).id)
+        if released and tool_context.state.get(constants.TABLE_KEY) == table_id:
+            tool_context.state[constants.TABLE_KEY] = None
+        return (released, reason)
+
+    @staticmethod
+    @cacheable(version=_tables_version)
+    def find_tables(tool_context: ToolContext, party_size: int, environments: list[str]) -> list[Table]:
+        """
+        Finds the best free tables for the guest, best match first
+
+        Args:
+            party_size(int): number of people to seat
+            environments(list[str]): preferred surroundings, e.g. ["Window Seat"], ["VIP", "Private Area"], or []
+
+        Returns:
+            List[Table]: up to 3 unoccupied tables that seat the party, best match first
         """
-        table_store: "TableStore" = tool_context.state[constants.TABLE_KEY]
-        table: Table = table_store._get_table(table_id)
-        if table.occupied: 
-            raise Exception(f"ERROR: Table {table.id} is already occupied")
-        table.allot_table(GuestStore().get_curr_guest(tool_context.state).id)
+        return TableStore().find(party_size, environments)
 
     @staticmethod
+    @cacheable(version=_tables_version)
     def get_tables(tool_context: ToolContext) -> list[Table]:
         """
         Gets a list of available tables according to user preference
@@ -375,6 +702,7 @@ class TableStore:
         Returns:
             List[Table]: List of available tables according to user preference
         """
-        table_state: "TableStore" = tool_context.state[constants.TABLE_KEY]
-        return table_state._tables
-    
\ No newline at end of file
+        table_store = TableStore()
+        table_store._sync()
+        table_store._expire_reservations()
+        return table_store._tables
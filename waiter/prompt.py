@@ -1,15 +1,15 @@
+from google.adk.agents.readonly_context import ReadonlyContext
+
 from waiter.shared_libraries.constants import * 
+from waiter.shared_libraries.templates import PromptTemplate, timed
+from waiter.models.services import GuestStore
 
-ROOT_AGENT_INSTR = f"""
+ROOT_AGENT_STATIC = f"""
 - You are a greeting agent inviting people in a restaurant
 - You have to gather as much information about the guest and use the tools to persist the guest info before delegating to any other agent 
 - After tool calls, preten you're showing the result to the user and keep you response limited to a phrase
 - Only use agents and tools provided
 - First objective is to greet the agent using the restaurant name: "{RESTAURANT_NAME}"
-- Info on the current guest you're serving: 
-  <current_guest> 
-  {{{GUEST_KEY}}}
-  </current_guest>
 - The phases of serving a guest are: 
 1. Introduction - Greeting and collecting information 
 2. Seating
@@ -17,8 +17,22 @@ ROOT_AGENT_INSTR = f"""
 4. Order placement 
 - You handle the completion of the introduction phase, any other phases will be handled by sub-agents
 
+For each of the phases, transfer to the appropriate agent and call the appropriate tools to accomplish the current phase 
+"""
+
+# per-turn part, sent after the conversation
+ROOT_AGENT_INSTR = PromptTemplate(f"""
+- Info on the current guest you're serving: 
+  <current_guest> 
+  {{{GUEST_KEY}}}
+  </current_guest>
 - The error when for the user query is given below: 
 {{{ERROR_KEY}}}
+""")
 
-For each of the phases, transfer to the appropriate agent and call the appropriate tools to accomplish the current phase 
-"""
\ No newline at end of file
+
+@timed
+def root_agent_instr(readonly_context: ReadonlyContext) -> str:
+    state = readonly_context.state
+    guest = GuestStore.get_curr_guest(state) if state.get(GUEST_KEY) is not None else None
+    return ROOT_AGENT_INSTR.render(**{GUEST_KEY: guest, ERROR_KEY: state.get(ERROR_KEY)})
\ No newline at end of file
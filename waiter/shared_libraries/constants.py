@@ -10,6 +10,8 @@ RESTAURANT_NAME = "Hotel Agent"
 PHASE_KEY = "phase"
 ERROR_KEY = "error"
 GUEST_KEY = "guest"
+# root agent model calls the fast-path router answered itself this session
+ROUTER_AVOIDED_KEY = "_router_avoided"
 
 # Recommendations, refinement depending on allergies
 RECOMMENDATION_KEY = "recommendation"
@@ -17,10 +19,25 @@ SPECIALS_KEY = "specials"
 INITIAL_RECOMMENDATION_KEY = "_recommendation"
 INITIAL_CRITIQUE_KEY = "_critique"
 USER_QUERY_KEY = "_query"
+LOOP_ITERATION_KEY = "_loop_iteration"
+LOOP_SNAPSHOT_KEY = "_loop_snapshot"
+# recommended dishes as saved when the loop started, json form
+LOOP_START_DISHES_KEY = "_loop_start_dishes"
+
+RECOMMENDATION_VERSION_KEY = "_recommendation_version"
 
 # Ordering 
 ORDER_KEY = "order"
+ORDER_VERSION_KEY = "_order_version"
 INITIAL_USER_QUERY_KEY = "_query"
 
 # Seating 
-TABLE_KEY="table"
\ No newline at end of file
+TABLE_KEY="table"
+# seconds an allotted table stays reserved before it is freed for turnover
+TABLE_RESERVATION_TTL = 3 * 60 * 60
+
+# History compaction
+# estimated prompt tokens above which old turns are summarised
+HISTORY_TOKEN_BUDGET = 4000
+# most recent guest turns always sent verbatim
+HISTORY_KEEP_TURNS = 4
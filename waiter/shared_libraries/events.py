@@ -0,0 +1,155 @@
+"""Rendering of runner events shared by the terminal REPL and the server."""
+from datetime import datetime
+from typing import Optional
+import time
+
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
+
+from common.tracing import Span, TRACER
+
+# model text arrives as partial events while it is generated, followed by the complete event
+STREAMING = RunConfig(streaming_mode=StreamingMode.SSE)
+
+
+class C:
+    HEADER = "\033[95m"
+    BLUE = "\033[94m"
+    CYAN = "\033[96m"
+    GREEN = "\033[92m"
+    YELLOW = "\033[93m"
+    RED = "\033[91m"
+    END = "\033[0m"
+    BOLD = "\033[1m"
+    DIM = "\033[2m"
+
+def log_line(prefix: str, msg: str, color: str = C.END, indent: int = 0):
+    pad = "    " * indent
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"{pad}{color}{prefix:<12}{C.END} {C.DIM}[{timestamp}]{C.END} {msg}")
+
+def render_event(event: Event, streamed: bool = False) -> list[tuple[str, str, str]]:
+    """
+    Describe an event as the lines a client should show
+
+    Args:
+        streamed (bool): the reply text was already shown chunk by chunk with partial_text, leave it out
+
+    Returns:
+        list[tuple[str, str, str]]: (prefix, message, color) per line, in display order
+    """
+    agent_name = event.author or "agent"
+    lines: list[tuple[str, str, str]] = []
+    # streamed chunks are shown with partial_text, the complete event that follows them is rendered here
+    if event.partial:
+        return lines
+
+    # 🧠 Handle model output (final or partial)
+    if event.is_final_response():
+        if event.content and hasattr(event.content, "parts"):
+            text_parts = [
+                getattr(p, "text", None)
+                for p in event.content.parts
+                if getattr(p, "text", None)
+            ]
+            if text_parts:
+                if streamed:
+                    return _render_actions(event, agent_name)
+                text = "".join(text_parts)
+                lines.append((f"{agent_name} ✅", text, C.GREEN))
+            else:
+                lines.append((
+                    f"{agent_name} ⚙️",
+                    "Final response contained no text parts (likely function call or escalation).",
+                    C.DIM,
+                ))
+        else:
+            lines.append((
+                f"{agent_name} ⚙️",
+                "Final response had no content (likely loop exit or escalation).",
+                C.DIM,
+            ))
+
+    lines += _render_actions(event, agent_name)
+
+    # ℹ️ Debug fallback for unhandled events
+    if not lines:
+        lines.append((f"{agent_name} ℹ️", f"Event (unhandled): {event.model_dump(exclude_none=True)}", C.DIM))
+
+    return lines
+
+
+def _render_actions(event: Event, agent_name: str) -> list[tuple[str, str, str]]:
+    lines: list[tuple[str, str, str]] = []
+
+    # 🧩 Tool / function calls
+    function_calls = event.get_function_calls()
+    if function_calls:
+        for fn in function_calls:
+            lines.append((f"{agent_name} 🧩", f"Function call → {fn.name}({fn.args})", C.YELLOW))
+
+    # 🧰 Tool / function responses
+    function_responses = event.get_function_responses()
+    if function_responses:
+        for fnr in function_responses:
+            lines.append((f"{agent_name} 🔧", f"Function response ← {fnr.name}: {fnr.response}", C.BLUE))
+
+    # 🗂️ State or artifact updates
+    if event.actions.state_delta:
+        lines.append((f"{agent_name} 🗂️", f"State delta: {event.actions.state_delta}", C.CYAN))
+    if event.actions.artifact_delta:
+        lines.append((f"{agent_name} 📦", f"Artifact delta: {event.actions.artifact_delta}", C.CYAN))
+
+    # 🔁 Escalation or transfer
+    if event.actions.transfer_to_agent:
+        lines.append((f"{agent_name} 🔁", f"Transferred to agent: {event.actions.transfer_to_agent}", C.HEADER))
+    if event.actions.escalate:
+        lines.append((f"{agent_name} ⤴️", "Escalated to higher-level agent (loop exit triggered).", C.HEADER))
+
+    return lines
+
+
+def partial_text(event: Event) -> str:
+    """
+    Text a streamed event adds to its agent's reply, empty for complete events
+    """
+    if not event.partial or not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text and not part.thought)
+
+
+def tool_progress(event: Event) -> list[tuple[str, str]]:
+    """
+    Progress markers of the tool calls an event starts or finishes
+
+    Returns:
+        list[tuple[str, str]]: (tool name, "running" or "done") per call
+    """
+    return [(fn.name, "running") for fn in event.get_function_calls()] + [
+        (fnr.name, "done") for fnr in event.get_function_responses()
+    ]
+
+
+class TurnTimer:
+    """
+    Time to first token and total latency of one turn, recorded as "turn" spans of TRACER
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.first_token_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+
+    def observe(self, event: Event):
+        if self.first_token_ms is not None or event.author == "user" or not event.content or not event.content.parts:
+            return
+        if any(part.text and not part.thought for part in event.content.parts):
+            self.first_token_ms = (time.perf_counter() - self._start) * 1e3
+
+    def finish(self) -> dict[str, Optional[float]]:
+        self.total_ms = (time.perf_counter() - self._start) * 1e3
+        if self.first_token_ms is not None:
+            TRACER.record(Span("turn", "first_token", self.started_at, self.first_token_ms))
+        TRACER.record(Span("turn", "total", self.started_at, self.total_ms))
+        return {"first_token_ms": self.first_token_ms, "total_ms": self.total_ms}
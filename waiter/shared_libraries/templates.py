@@ -0,0 +1,59 @@
+"""Precompiled prompt templates and timing of the instruction providers."""
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from functools import wraps
+from string import Formatter
+from time import perf_counter
+from typing import Callable, Optional
+
+
+class PromptTemplate:
+    """
+    Template parsed once into static text and named `{slots}`
+    Rendering only joins the static chunks with the slot values, `{{` and `}}` are literal braces
+
+    Example:
+        PromptTemplate("- Allergies: {allergies}").render(allergies=["dairy"])
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._chunks: list[tuple[str, Optional[str]]] = [
+            (literal, name) for literal, name, _, _ in Formatter().parse(text)
+        ]
+        self.slots = [name for _, name in self._chunks if name is not None]
+
+    def render(self, **values) -> str:
+        return "".join(
+            literal if name is None else literal + str(values[name])
+            for literal, name in self._chunks
+        )
+
+
+@dataclass
+class PromptStats:
+    """Process wide timing of the instruction providers."""
+    calls: Counter = field(default_factory=Counter)
+    # provider name -> total seconds spent building its prompts
+    seconds: defaultdict = field(default_factory=lambda: defaultdict(float))
+
+    def mean_ms(self, provider: str) -> float:
+        return 1000 * self.seconds[provider] / self.calls[provider] if self.calls[provider] else 0.0
+
+
+STATS = PromptStats()
+
+
+def timed(provider: Callable[..., str]) -> Callable[..., str]:
+    """
+    Record how long an instruction provider takes in `STATS`
+    """
+    @wraps(provider)
+    def timed_provider(readonly_context) -> str:
+        start = perf_counter()
+        try:
+            return provider(readonly_context)
+        finally:
+            STATS.calls[provider.__name__] += 1
+            STATS.seconds[provider.__name__] += perf_counter() - start
+    return timed_provider
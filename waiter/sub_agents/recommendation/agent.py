@@ -6,6 +6,9 @@ from google.genai.types import GenerateContentConfig
 
 from waiter.sub_agents.recommendation import prompt
 from waiter.tools.memory import recommendation_model_init
+from waiter.tools.convergence import make_convergence_check
+from waiter.tools.history import make_history_compactor
+from common.dynamic_instruction import dynamic_suffix
 from waiter.models.services import *
 from waiter.shared_libraries import constants
 
@@ -48,29 +51,34 @@ def exit_if_perfect(tool_context: ToolContext):
 #     max_iterations=5
 # )
 
+MAX_REFINEMENT_ITERATIONS = 5
+
 def instantiate_refinement_loop_agent(): 
     recommendation_agent = Agent(
         model="gemini-2.0-flash",
         name="recommendation_agent",
         description="Handles the recommendation, possible modifications, checking of dishes as per user query.",
-        instruction=prompt.recommendation_agent_instr,
+        static_instruction=prompt.recommendation_agent_static(),
         tools=[
             DishStore.request_modification,
         ],
-        output_key=constants.INITIAL_RECOMMENDATION_KEY
+        output_key=constants.INITIAL_RECOMMENDATION_KEY,
+        before_model_callback=[make_history_compactor(), dynamic_suffix(prompt.recommendation_agent_instr)]
     )
 
     critique_agent = Agent(
         model="gemini-2.0-flash",
         name="critique_agent",
         description="Critiques the recommendation based off of the ingredients and the allergies and the preferences that the user has",
-        instruction=prompt.critique_agent_instr,
+        static_instruction=prompt.CRITIQUE_AGENT_STATIC,
         tools=[
             DishStore.request_modification,
             RecommendationService.save_recommendation,
             exit_if_perfect,
         ],
-        output_key=constants.INITIAL_CRITIQUE_KEY
+        output_key=constants.INITIAL_CRITIQUE_KEY,
+        before_model_callback=[make_history_compactor(), dynamic_suffix(prompt.critique_agent_instr)],
+        after_agent_callback=make_convergence_check(MAX_REFINEMENT_ITERATIONS)
     )
 
     recommendations_refinement_loop_agent = LoopAgent(
@@ -78,7 +86,7 @@ def instantiate_refinement_loop_agent():
         description="Handles all the recommendations, modifications of the dishes as per customers requirement",
         before_agent_callback=recommendation_model_init, # init recom object for guest
         sub_agents=[recommendation_agent, critique_agent],
-        max_iterations=5
+        max_iterations=MAX_REFINEMENT_ITERATIONS
     )
     return recommendations_refinement_loop_agent
 
@@ -1,92 +1,122 @@
 """Prompt for the booking agent and sub-agents."""
-import json 
+
+from functools import lru_cache
 
 from google.adk.agents.readonly_context import ReadonlyContext
-from waiter.shared_libraries import constants 
-from waiter.models.schema import Dish
+from waiter.shared_libraries import constants
+from waiter.shared_libraries.templates import PromptTemplate, timed
 from waiter.models.services import *
+from waiter.tools.allergens import full_menu, menu_delta
 
-
-def recommendation_agent_instr(readonly_context: ReadonlyContext) -> str:
-    base_recommendation_prompt = f"""
-    - You are a waiter at a restaurant taking an order and handling all modifications and queries regarding the dishes 
+recommendation_agent_base = """
+    - You are a waiter at a restaurant taking an order and handling all modifications and queries regarding the dishes
     - If a dish doesn't fit the users preference and allergies, call tool to try and modify ingredients to fit the users liking
     - Respond with all the dishes which satisfy the users preference, for most of the other dishes try making modifications to ingredients to satisfy preference
+    - This is the full menu, your instruction for this turn lists the dishes that are unsafe for the guest and
+      the swaps that make the modifiable dishes safe, every other dish is safe as served
+    {menu}
+    """
+
+
+@lru_cache(maxsize=1)
+def _static_menu() -> tuple[int, str]:
+    # the menu version is read first, a menu changed while rendering is resent in the dynamic part
+    return DishStore()._version, full_menu()
+
+
+def recommendation_agent_static() -> str:
+    """
+    Instructions with the full menu, read from storage on the first agent construction
+    """
+    return recommendation_agent_base.format(menu=_static_menu()[1])
+
+
+CRITIQUE_AGENT_STATIC = """
+    - You are a culinary critic reviewing another waiter's dish recommendations and modifications to dishes.
+    - Your job is to **analyze and critique** the recommended dishes based on the user's stated ALLERGIES and check if the modifications are possible and accepted.
+    - Be objective and concise, your goal is to identify what works and what doesn't, not to recommend new dishes yourself.
+    - For ALL modifications are listed in the recommendations, perform the tool call to verify that they are possible.
+    - For ALL the recommendations which comply with allergies, if THE MODIFICATIONS ARE POSSIBLE: save the recommendations using a tool call
+    """
+
+# compiled once, instruction providers skip ADK's {state} injection so every slot is filled here
+user_query = PromptTemplate("""
     - The following is the users query
     <query>
-    {{{constants.USER_QUERY_KEY}}}
+    {query}
     </query>
-    """
+    """)
 
-    user_preferences = """
+user_preferences = PromptTemplate("""
     - The following are the users preferences
-    <preferences> 
+    <preferences>
     {preferences}
     </preferences>
-    """
+    """)
 
-    dish_information = """
-    - These are all the dishes being served now
+dish_information = PromptTemplate("""
+    - These are the changes to the menu for the users allergies, don't recommend unsafe dishes
+    - Modifiable dishes need the listed swaps requested through a tool call
     {dish_info}
-    """
+    """)
 
-    previous_recommendations = """
-    - These are the previous suggestions you made: 
-    {}
-    """
+changed_menu = PromptTemplate("""
+    - The menu changed since your instructions were written, this is the current one
+    {menu}
+    """)
 
-    critique = """
+previous_recommendations = PromptTemplate("""
+    - These are the previous suggestions you made:
+    {recommendations}
+    """)
+
+critique = PromptTemplate("""
     - These are the problems with the previous dishes you recommended (if any, take them into consideration and correct them)
     <problems>
     {issues}
-    </problems> 
-    """
+    </problems>
+    """)
 
-    base_prompt = base_recommendation_prompt
-    guest = GuestStore().get_curr_guest(readonly_context.state)
-    base_prompt += user_preferences.format(
-        preferences = guest.preferences,
-        allergies = guest.allergies
-    )
+critique_recommendations = PromptTemplate("\n- These are the previous dish recommendations and modifications you must critique:'{recommendations}'")
+critique_allergies = PromptTemplate("\n- These are the allergies that the user has: {allergies}")
+critique_query = PromptTemplate("\n- The user originally asked:\n{query}\n")
+
+
+@timed
+def recommendation_agent_instr(readonly_context: ReadonlyContext) -> str:
+    state = readonly_context.state
+    guest = GuestStore().get_curr_guest(state)
+    base_prompt = user_query.render(query=state.get(constants.USER_QUERY_KEY, ""))
+    base_prompt += user_preferences.render(preferences=guest.preferences)
 
     # Determine whether this is the first or a refinement iteration
-    if readonly_context.state[constants.INITIAL_RECOMMENDATION_KEY] == "":
-        # First iteration → show all dishes
-        dish_store = DishStore()
-        dish_dto: dict[str, list[str]] = {
-            dish.name: dish.ingredients for dish in dish_store._dishes
-        }
-        base_prompt += dish_information.format(
-            dish_info=json.dumps(dish_dto, indent=2)
-        )
+    if state[constants.INITIAL_RECOMMENDATION_KEY] == "":
+        # First iteration → only what differs from the static menu for this guest, rendered once per menu version
+        if DishStore()._version != _static_menu()[0]:
+            base_prompt += changed_menu.render(menu=full_menu())
+        base_prompt += dish_information.render(dish_info=menu_delta(guest.allergies))
     else:
         # Refinement iteration → only show filtered dishes
-        base_prompt += previous_recommendations.format(f"{{{constants.INITIAL_RECOMMENDATION_KEY}}}")
-        base_prompt += critique.format(issues=f"{{{constants.INITIAL_CRITIQUE_KEY}}}")
+        base_prompt += previous_recommendations.render(recommendations=state[constants.INITIAL_RECOMMENDATION_KEY])
+        base_prompt += critique.render(issues=state.get(constants.INITIAL_CRITIQUE_KEY, ""))
 
     return base_prompt
 
 
+@timed
 def critique_agent_instr(readonly_context: ReadonlyContext) -> str:
-    base_critique_prompt = """
-    - You are a culinary critic reviewing another waiter's dish recommendations and modifications to dishes.
-    - Your job is to **analyze and critique** the recommended dishes based on the user's stated ALLERGIES and check if the modifications are possible and accepted.
-    - Be objective and concise, your goal is to identify what works and what doesn't, not to recommend new dishes yourself.
-    - For ALL modifications are listed in the recommendations, perform the tool call to verify that they are possible.
-    - For ALL the recommendations which comply with allergies, if THE MODIFICATIONS ARE POSSIBLE: save the recommendations using a tool call
-    """
-
     # Get relevant state info
-    user_query = readonly_context.state.get(constants.USER_QUERY_KEY, "")
-    previous_recommendations = readonly_context.state.get(constants.INITIAL_RECOMMENDATION_KEY, "")
+    query = readonly_context.state.get(constants.USER_QUERY_KEY, "")
+    recommendations = readonly_context.state.get(constants.INITIAL_RECOMMENDATION_KEY, "")
     allergies = GuestStore().get_curr_guest(readonly_context.state).allergies
 
     # Build context
-    if previous_recommendations:
-        base_critique_prompt += f"\n- These are the previous dish recommendations and modifications you must critique:'{previous_recommendations}'"
-    if len(allergies): 
-        base_critique_prompt += f"\n- These are the allergies that the user has: {allergies}"
+    prompt = ""
+    if recommendations:
+        prompt += critique_recommendations.render(recommendations=recommendations)
+    if len(allergies):
+        prompt += critique_allergies.render(allergies=allergies)
 
-    base_critique_prompt += f"\n- The user originally asked:\n{user_query}\n"
+    prompt += critique_query.render(query=query)
 
-    return base_critique_prompt
+    return prompt
@@ -1,6 +1,7 @@
 from google.adk.agents import Agent
 from waiter.sub_agents.seating import prompt
 from waiter.tools.memory import seating_state_init
+from waiter.tools.history import make_history_compactor
 from waiter.models.services import *
 
 
@@ -8,10 +9,12 @@ seating_agent = Agent(
     model="gemini-2.0-flash",
     name="seating_agent",
     description="Handles the table selection for incoming guests",
-    instruction=prompt.seating_agent_instr,
+    static_instruction=prompt.seating_agent_static(),
     tools=[
-        TableStore.get_tables,
-        TableStore.allot_to_guest
+        TableStore.find_tables,
+        TableStore.allot_to_guest,
+        TableStore.release_table
     ],
-    before_agent_callback=seating_state_init
+    before_agent_callback=seating_state_init,
+    before_model_callback=make_history_compactor()
 )
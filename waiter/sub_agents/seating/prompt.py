@@ -1,3 +1,7 @@
+from functools import lru_cache
+
+from waiter.models.schema import Table
+
 seating_agent_instr = """
 You are a friendly and professional seating agent in a restaurant.
 Your goal is to help guests find the most suitable table based on their preferences and current availability.
@@ -9,11 +13,13 @@ Guidelines:
    - Smoking or non-smoking
    - Special needs (high chair, wheelchair access, etc.)
 
-2. Only suggest tables that are currently unoccupied.
+2. Search for tables with the party size and the preferred environments. The search only returns
+   unoccupied tables and lists the best match first, allot that one unless the guest objects.
 
-3. If multiple tables match the guest's preferences, select the table with the lowest table number.
+3. If the best match doesn't have every preferred environment, offer it as the best possible
+   alternative and explain why it's a good choice.
 
-4. If no perfect match is available, offer the best possible alternative and explain why it's a good choice.
+4. If allotting fails because the table was just taken, allot the next table from the search.
 
 5. When responding, speak naturally and conversationally, like a real restaurant host.
    Do NOT output raw JSON or structured data. 
@@ -26,3 +32,23 @@ Example responses:
 
 Your goal is to provide polite, human-like responses that sound natural in conversation.
 """
+
+
+def floor_plan(tables: list[Table]) -> str:
+    """
+    Tables with their capacity and surroundings, sorted so the text doesn't depend on save order
+    Occupancy changes every turn and is left to the find_tables tool
+    """
+    lines = "\n".join(
+        f"{table.id}: seats {table.capacity}, {', '.join(table.environment) or 'no preference'}"
+        for table in sorted(tables, key=lambda table: str(table.id))
+    )
+    return f"<floor_plan>\n{lines}\n</floor_plan>"
+
+
+@lru_cache(maxsize=1)
+def seating_agent_static() -> str:
+    """
+    Instructions with the floor plan, read from storage on the first agent construction
+    """
+    return seating_agent_instr + "\nThe restaurant's tables:\n" + floor_plan(Table.all()) + "\n"
@@ -0,0 +1,220 @@
+"""Deterministic allergen checks run before the recommendation prompt is built."""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional, Sequence
+import re
+
+from waiter.models.schema import Dish
+from waiter.models.services import DishStore
+
+# allergy category -> ingredients (or ingredient words) that belong to it
+ALLERGEN_CATEGORIES: dict[str, set[str]] = {
+    "dairy": {"milk", "cream", "butter", "cheese", "mozzarella", "parmesan", "yogurt", "ghee", "paneer", "tzatziki"},
+    "lactose": {"milk", "cream", "butter", "cheese", "mozzarella", "parmesan", "yogurt", "paneer", "tzatziki"},
+    "gluten": {"wheat", "flour", "pasta", "penne", "bread", "pita", "croutons"},
+    "wheat": {"wheat", "flour", "pasta", "penne", "bread", "pita", "croutons"},
+    "egg": {"egg", "eggs"},
+    "eggs": {"egg", "eggs"},
+    "fish": {"anchovy", "tuna", "salmon", "cod"},
+    "seafood": {"anchovy", "tuna", "salmon", "cod", "shrimp", "prawn", "crab", "lobster"},
+    "shellfish": {"shrimp", "prawn", "crab", "lobster"},
+    "nuts": {"almond", "cashew", "walnut", "pecan", "pistachio", "hazelnut"},
+    "peanut": {"peanut", "peanuts"},
+    "soy": {"soy", "tofu", "edamame"},
+}
+
+# ingredient word -> substitute the kitchen can make, dishes whose conflicts all have one are modifiable
+SUBSTITUTES: dict[str, str] = {
+    "milk": "oat milk",
+    "cream": "coconut cream",
+    "butter": "olive oil",
+    "yogurt": "coconut yogurt",
+    "mozzarella": "vegan mozzarella",
+    "parmesan": "nutritional yeast",
+    "cheese": "vegan cheese",
+    "tzatziki": "dairy-free tzatziki",
+    "flour": "gluten-free flour",
+    "penne": "gluten-free penne",
+    "pita": "gluten-free wrap",
+    "croutons": "no croutons",
+    "anchovy": "olive oil dressing",
+}
+
+# words that make the ingredient after them free of these allergies, "oat milk" isn't dairy
+FREE_OF: dict[str, set[str]] = {
+    "vegan": {"dairy", "egg", "fish", "seafood"},
+    "oat": {"dairy"},
+    "coconut": {"dairy"},
+    "almond": {"dairy"},
+    "soy": {"dairy"},
+    "rice": {"dairy"},
+}
+
+# first words of a change that takes the ingredient out, "no croutons"
+REMOVALS = {"remove", "omit", "no", "without", "hold", "skip", "drop", "exclude"}
+
+# words that only change how much of an ingredient goes in, "less" or "extra cream" is still the ingredient
+AMOUNTS = {"less", "more", "extra", "light", "double", "half", "little", "some", "on", "the", "side"}
+
+_INSTEAD = re.compile(r"^(?:substitute|replace|swap|change|switch|use)\w*(?:\s+(?:it|with|for|to|by))*\s+")
+_FREE = re.compile(r"([a-z]+)-free")
+
+
+@dataclass
+class MenuSplit:
+    """Menu partitioned against a guest's allergies."""
+    safe: list[Dish] = field(default_factory=list)
+    # dish, {conflicting ingredient: substitute}
+    modifiable: list[tuple[Dish, dict[str, str]]] = field(default_factory=list)
+    unsafe: list[Dish] = field(default_factory=list)
+
+
+def _words(ingredient: str) -> set[str]:
+    return set(re.findall(r"[a-z]+", ingredient.lower()))
+
+
+def allergen_terms(allergies: list[str]) -> set[str]:
+    """
+    Expand allergies into the ingredient words they cover, "dairy" -> {"milk", "cream", ...}
+    """
+    terms: set[str] = set()
+    for allergy in allergies:
+        allergy = allergy.lower().strip()
+        terms |= ALLERGEN_CATEGORIES.get(allergy, set()) | _words(allergy)
+    return terms
+
+
+def conflicting_ingredients(dish: Dish, allergies: list[str]) -> list[str]:
+    terms = allergen_terms(allergies)
+    return [ingredient for ingredient in dish.ingredients if _words(ingredient) & terms]
+
+
+def _free_of(allergy: str, free_of: set[str]) -> bool:
+    # "gluten-free" covers wheat and "dairy" lactose, their ingredients are a subset
+    covered = set().union(*(ALLERGEN_CATEGORIES.get(category, {category}) for category in free_of))
+    return allergy in free_of or ALLERGEN_CATEGORIES.get(allergy, {allergy}) <= covered
+
+
+def is_removal(change: str) -> bool:
+    words = re.findall(r"[a-z]+", change.lower())
+    return bool(words) and (words[0] in REMOVALS or words[:2] == ["leave", "out"])
+
+
+def is_safe_change(change: str, allergies: Sequence[str]) -> bool:
+    """
+    Whether a change to a conflicting ingredient makes it safe: a removal, or a substitute free of every allergy
+    A change of amount, "less" or "extra cream", is not
+
+    Args:
+        change (str): the modification asked for, "remove", "oat milk" or "substitute with gluten-free penne"
+        allergies (list[str]): the guest's allergies, categories such as "dairy" are expanded
+    """
+    if is_removal(change):
+        return True
+    substitute = _INSTEAD.sub("", change.lower().strip())
+    free_of = set(_FREE.findall(substitute))
+    words = _words(_FREE.sub(" ", substitute))
+    if not words - AMOUNTS:
+        return False
+    for word in words:
+        free_of |= FREE_OF.get(word, set())
+    remaining = [allergy for allergy in allergies if not _free_of(allergy.lower().strip(), free_of)]
+    return not words & allergen_terms(remaining)
+
+
+def substitute_for(ingredient: str, allergies: Sequence[str] = ()) -> Optional[str]:
+    words = _words(ingredient)
+    # SUBSTITUTES is ordered most specific first, "mozzarella cheese" -> vegan mozzarella
+    return next(
+        (
+            substitute for word, substitute in SUBSTITUTES.items()
+            if word in words and is_safe_change(substitute, allergies)
+        ),
+        None,
+    )
+
+
+def split_menu(allergies: list[str], dish_store: Optional[DishStore] = None) -> MenuSplit:
+    """
+    Partition the menu into dishes that are safe as served, safe after substitutions and unsafe
+
+    Args:
+        allergies (list[str]): the guest's allergies, categories such as "dairy" are expanded
+        dish_store (DishStore): store whose ingredient index is used, defaults to the singleton
+
+    Returns:
+        MenuSplit: safe, modifiable (with the substitutions to request) and unsafe dishes
+    """
+    dish_store = dish_store or DishStore()
+    terms = allergen_terms(allergies)
+    # walk the distinct ingredients once instead of every ingredient of every dish
+    flagged = [ingredient for ingredient in dish_store._by_ingredient if _words(ingredient) & terms]
+    conflicted_ids = {dish.id for dish in dish_store.dishes_with(flagged)}
+    flagged = set(flagged)
+
+    split = MenuSplit()
+    for dish in dish_store._dishes:
+        if dish.id not in conflicted_ids:
+            split.safe.append(dish)
+            continue
+        swaps = {
+            ingredient: substitute_for(ingredient, allergies)
+            for ingredient in dish.ingredients
+            if ingredient.lower() in flagged
+        }
+        # a dish with no substitute safe for all of the guest's allergies can't be made safe
+        if all(swaps.values()):
+            split.modifiable.append((dish, swaps))
+        else:
+            split.unsafe.append(dish)
+    return split
+
+
+def render_full_menu(dishes: list[Dish]) -> str:
+    """
+    Every dish, one line each, the same for every guest
+    """
+    lines = "\n".join(f"{dish.name}: {', '.join(dish.ingredients)}" for dish in dishes)
+    return f"<menu>\n{lines}\n</menu>"
+
+
+def render_menu_delta(split: MenuSplit) -> str:
+    """
+    What the full menu needs for one guest: the dishes to leave out and the swaps for the modifiable ones
+    Dishes listed in neither are safe as served
+    """
+    unsafe = "\n".join(dish.name for dish in split.unsafe)
+    # swaps are written as "ingredient->substitute"
+    modifiable = "\n".join(
+        f"{dish.name}: " + ", ".join(f"{i}->{s}" for i, s in swaps.items())
+        for dish, swaps in split.modifiable
+    )
+    return f"<unsafe_dishes>\n{unsafe}\n</unsafe_dishes>\n<modifiable_dishes>\n{modifiable}\n</modifiable_dishes>"
+
+
+@lru_cache(maxsize=4)
+def _full_menu(menu_version: int) -> str:
+    return render_full_menu(DishStore()._dishes)
+
+
+@lru_cache(maxsize=256)
+def _menu_delta(menu_version: int, allergies: tuple[str, ...]) -> str:
+    return render_menu_delta(split_menu(list(allergies)))
+
+
+def full_menu() -> str:
+    """
+    The whole menu rendered once per menu version, byte-identical across guests and turns
+    """
+    return _full_menu(DishStore()._version)
+
+
+def menu_delta(allergies: list[str]) -> str:
+    """
+    `render_menu_delta(split_menu(allergies))` memoised on the menu version and the allergies
+    Guests with the same allergies get the same string, byte for byte, until a dish changes
+
+    Use `_menu_delta.cache_info()` for hits and misses
+    """
+    normalized = tuple(sorted({allergy.lower().strip() for allergy in allergies}))
+    return _menu_delta(DishStore()._version, normalized)
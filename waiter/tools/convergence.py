@@ -0,0 +1,100 @@
+"""Early exit for the recommendation refinement loop once it stops making progress."""
+from dataclasses import dataclass, field
+from collections import deque
+from hashlib import sha1
+import json
+
+from google.adk.agents.callback_context import CallbackContext
+
+from waiter.models.services import DishStore, GuestStore, RecommendationService
+from waiter.shared_libraries import constants
+from waiter.tools.allergens import conflicting_ingredients, is_safe_change
+
+
+@dataclass
+class ConvergenceStats:
+    """Process wide counters for the refinement loop."""
+    iterations: int = 0
+    early_exits: int = 0
+    llm_calls_saved: int = 0
+    # last iterations: iteration number, why it stopped (if it did), calls saved
+    history: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+
+STATS = ConvergenceStats()
+
+
+def _snapshot(callback_context: CallbackContext, recommended_dishes: list) -> str:
+    state = callback_context.state
+    payload = json.dumps(
+        [
+            state.get(constants.INITIAL_RECOMMENDATION_KEY, ""),
+            state.get(constants.INITIAL_CRITIQUE_KEY, ""),
+            [entry.to_json() for entry in recommended_dishes],
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return sha1(payload.encode()).hexdigest()
+
+
+def _saved_this_run(callback_context: CallbackContext, recommended_dishes: list) -> list:
+    # the recommendation keeps the dishes of earlier turns, only new or changed entries are this loop's
+    at_start = callback_context.state.get(constants.LOOP_START_DISHES_KEY) or []
+    return [entry for entry in recommended_dishes if entry.to_json() not in at_start]
+
+
+def _passes_allergen_check(recommended_dishes: list, allergies: list[str]) -> bool:
+    if not recommended_dishes:
+        return False
+    for dish_name, modifications in recommended_dishes:
+        dish = DishStore()._get_dish(dish_name)
+        if dish is None:
+            return False
+        changes = {ingredient.lower(): change for ingredient, change in modifications}
+        # "less" or "extra" still serves the ingredient, only a removal or a safe substitute fixes it
+        for ingredient in conflicting_ingredients(dish, allergies):
+            change = changes.get(ingredient.lower())
+            if change is None or not is_safe_change(change, allergies):
+                return False
+    return True
+
+
+def make_convergence_check(max_iterations: int, llm_calls_per_iteration: int = 2):
+    """
+    Build the after-agent callback for the last agent of the refinement loop
+
+    The loop is escalated when the recommendation, the critique and the saved
+    recommended dishes are unchanged since the previous iteration, or when this run
+    saved at least one dish and every dish it saved clears the guest's allergies
+
+    Args:
+        max_iterations (int): max_iterations of the LoopAgent, used to count saved calls
+        llm_calls_per_iteration (int): model round-trips one iteration costs
+    """
+    def check_convergence(callback_context: CallbackContext):
+        state = callback_context.state
+        iteration = state.get(constants.LOOP_ITERATION_KEY, 0) + 1
+        state[constants.LOOP_ITERATION_KEY] = iteration
+        STATS.iterations += 1
+
+        recommendation = RecommendationService.get_curr_recommendation_service(callback_context)._recommendation
+        dishes = _saved_this_run(callback_context, recommendation.recommended_dishes)
+        snapshot = _snapshot(callback_context, dishes)
+        previous, state[constants.LOOP_SNAPSHOT_KEY] = state.get(constants.LOOP_SNAPSHOT_KEY), snapshot
+
+        reason = None
+        if snapshot == previous:
+            reason = "unchanged"
+        elif _passes_allergen_check(dishes, GuestStore.get_curr_guest(state).allergies):
+            reason = "allergen check passed"
+
+        saved = 0
+        if reason is not None and iteration < max_iterations:
+            saved = (max_iterations - iteration) * llm_calls_per_iteration
+            STATS.early_exits += 1
+            STATS.llm_calls_saved += saved
+            callback_context.actions.escalate = True
+        STATS.history.append({"iteration": iteration, "reason": reason, "llm_calls_saved": saved})
+
+    return check_convergence
@@ -0,0 +1,120 @@
+"""Bounds the conversation history sent to the model on every turn."""
+from dataclasses import dataclass, field
+from collections import deque
+from typing import Optional
+import json
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.genai.types import Content, Part
+
+from common.dynamic_instruction import is_dynamic_instruction
+from waiter.models.schema import Order, Recommendation
+from waiter.models.services import GuestStore
+from waiter.shared_libraries import constants
+
+
+@dataclass
+class CompactionStats:
+    """Process wide token counts of the requests seen by the compactor."""
+    requests: int = 0
+    compacted: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    # last requests: agent, estimated prompt tokens before and after compaction
+    history: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+
+STATS = CompactionStats()
+
+
+def estimate_tokens(contents: list[Content]) -> int:
+    # ~4 characters per token, good enough to compare against a budget
+    chars = 0
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                chars += len(part.text)
+            elif part.function_call:
+                chars += len(part.function_call.name or "") + len(json.dumps(part.function_call.args or {}, default=str))
+            elif part.function_response:
+                chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // 4
+
+
+def _is_user_turn(content: Content) -> bool:
+    # tool responses come back with the user role too, a turn starts with guest text
+    if content.role != "user" or not content.parts or not content.parts[0].text:
+        return False
+    # other agents' messages are relayed to the model as "For context:" user messages
+    return not content.parts[0].text.startswith("For context:") and not is_dynamic_instruction(content)
+
+
+def _guest_summary(callback_context: CallbackContext) -> dict:
+    state = callback_context.state
+    if state.get(constants.GUEST_KEY) is None:
+        return {}
+    guest = GuestStore.get_curr_guest(state)
+    recommendation: Optional[Recommendation] = Recommendation.by_guest(guest.id)
+    order: Optional[Order] = Order.by_guest(guest.id)
+    return {
+        "guest": {"name": guest.name, "allergies": guest.allergies, "preferences": guest.preferences},
+        "table": state.get(constants.TABLE_KEY),
+        "recommended_dishes": [entry.to_json() for entry in recommendation.recommended_dishes] if recommendation else [],
+        "order": [entry.to_json() for entry in order.dishes] if order else [],
+    }
+
+
+def _summary(callback_context: CallbackContext, dropped: list[Content]) -> Part:
+    said = [
+        part.text.strip()[:120]
+        for content in dropped if _is_user_turn(content)
+        for part in content.parts if part.text
+    ]
+    return Part(text=(
+        "<earlier_conversation>\n"
+        f"state: {json.dumps(_guest_summary(callback_context), default=str)}\n"
+        + "".join(f"guest said: {text}\n" for text in said)
+        + "</earlier_conversation>"
+    ))
+
+
+def make_history_compactor(
+    token_budget: int = constants.HISTORY_TOKEN_BUDGET,
+    keep_turns: int = constants.HISTORY_KEEP_TURNS,
+):
+    """
+    Build the before-model callback that compacts long conversations
+
+    Once the history is estimated above `token_budget` tokens, everything before the
+    last `keep_turns` guest turns is replaced by a summary: the guest, table,
+    recommendation and order as stored, plus what the guest said. Tool calls and
+    agent replies of the dropped turns are not kept, the stored state covers them
+
+    Args:
+        token_budget (int): estimated prompt tokens above which the history is compacted
+        keep_turns (int): most recent guest turns sent verbatim
+    """
+    def compact_history(callback_context: CallbackContext, llm_request: LlmRequest):
+        contents = llm_request.contents
+        before = estimate_tokens(contents)
+        STATS.requests += 1
+        STATS.tokens_before += before
+
+        turn_starts = [i for i, content in enumerate(contents) if _is_user_turn(content)]
+        after = before
+        if before > token_budget and len(turn_starts) > keep_turns:
+            cut = turn_starts[-max(1, keep_turns)]
+            kept = contents[cut]
+            # the summary leads the first kept guest turn, roles keep alternating
+            llm_request.contents = [
+                Content(role="user", parts=[_summary(callback_context, contents[:cut]), *kept.parts]),
+                *contents[cut + 1:],
+            ]
+            after = estimate_tokens(llm_request.contents)
+            STATS.compacted += 1
+
+        STATS.tokens_after += after
+        STATS.history.append({"agent": callback_context.agent_name, "tokens_before": before, "tokens_after": after})
+
+    return compact_history
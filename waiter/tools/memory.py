@@ -11,7 +11,8 @@ def parse_user_query(callback_context: CallbackContext) -> str:
 
 def get_next_phase(callback_context: CallbackContext) -> str: 
     next_phase: dict[str, str] = {
-        "introduction": "selection",
+        "introduction": "seating",
+        "seating": "selection",
         "selection": "order placement",
         "order placement": "introduction"
     }
@@ -25,8 +26,9 @@ def guest_model_init(callback_context: CallbackContext):
     Args:
         callback_context: The callback context.
     """
+    # ids only, services live in the SessionRegistry
     if constants.GUEST_KEY not in callback_context.state: 
-        callback_context.state[constants.GUEST_KEY] = GuestStore()
+        callback_context.state[constants.GUEST_KEY] = None
     callback_context.state[constants.PHASE_KEY] = "introduction"
     callback_context.state[constants.ERROR_KEY] = None
     callback_context.state[constants.SPECIALS_KEY] = DishStore().specials()
@@ -39,7 +41,7 @@ def recommendation_model_init(callback_context: CallbackContext):
         callbcak_context: The callback context
     """
     # add all conditions to be able to initialize recommendations object
-    if constants.GUEST_KEY not in callback_context.state:
+    if callback_context.state.get(constants.GUEST_KEY) is None:
         callback_context.state[constants.ERROR_KEY] = (
             "All information about guest not gathered yet"
         )
@@ -47,10 +49,16 @@ def recommendation_model_init(callback_context: CallbackContext):
 
     callback_context.state[constants.PHASE_KEY] = "selection"
     if constants.RECOMMENDATION_KEY not in callback_context.state: 
-        callback_context.state[constants.RECOMMENDATION_KEY] = RecommendationService(callback_context)
+        recommendation_service = RecommendationService.get_curr_recommendation_service(callback_context)
+        callback_context.state[constants.RECOMMENDATION_KEY] = recommendation_service._recommendation.id
         callback_context.state[constants.INITIAL_RECOMMENDATION_KEY] = ""
         callback_context.state[constants.INITIAL_CRITIQUE_KEY] = ""
 
+    # convergence is tracked per run of the refinement loop
+    callback_context.state[constants.LOOP_ITERATION_KEY] = 0
+    callback_context.state[constants.LOOP_SNAPSHOT_KEY] = None
+    recommendation = RecommendationService.get_curr_recommendation_service(callback_context)._recommendation
+    callback_context.state[constants.LOOP_START_DISHES_KEY] = [entry.to_json() for entry in recommendation.recommended_dishes]
     callback_context.state[constants.ERROR_KEY] = None
     callback_context.state[constants.USER_QUERY_KEY] = parse_user_query(callback_context)
 
@@ -60,7 +68,8 @@ def order_model_init(callback_context: CallbackContext):
     """
     callback_context.state[constants.PHASE_KEY] = "order placement"
     if constants.ORDER_KEY not in callback_context.state:
-        callback_context.state[constants.ORDER_KEY] = OrderService(callback_context)
+        order_service = OrderService.get_curr_order_service(callback_context)
+        callback_context.state[constants.ORDER_KEY] = order_service._order.id
     callback_context.state[constants.ERROR_KEY] = None
     callback_context.state[constants.USER_QUERY_KEY] = parse_user_query(callback_context)
     if constants.INITIAL_USER_QUERY_KEY not in callback_context.state: 
@@ -73,7 +82,7 @@ def seating_state_init(callback_context: CallbackContext):
     Args:
         callback_context: The callback context
     """
-    if constants.GUEST_KEY not in callback_context.state: 
+    if callback_context.state.get(constants.GUEST_KEY) is None: 
         callback_context.state[constants.ERROR_KEY] = (
             "Gather information about guest first"
         )
@@ -84,4 +93,5 @@ def seating_state_init(callback_context: CallbackContext):
 
     callback_context.state[constants.PHASE_KEY] = "seating"
     callback_context.state[constants.ERROR_KEY] = None
-    callback_context.state[constants.TABLE_KEY] = TableStore()
+    # set to the allotted table id by TableStore.allot_to_guest
+    callback_context.state[constants.TABLE_KEY] = None
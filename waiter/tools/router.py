@@ -0,0 +1,127 @@
+"""Routes obvious phase transitions without asking the root agent's model."""
+from dataclasses import dataclass, field
+from collections import Counter
+from typing import Optional
+import re
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai.types import Content, FunctionCall, Part
+
+from waiter.shared_libraries import constants
+from waiter.tools.memory import get_next_phase
+
+# intent -> patterns that only show up when the guest wants that phase, matched case-insensitively
+INTENT_PATTERNS: dict[str, list[str]] = {
+    "seating": [
+        r"\btable for\b",
+        r"\b(a|get a|need a|book a|reserve a) table\b",
+        r"\bparty of \w+\b",
+        r"\b(seat|sit) (us|me)\b",
+    ],
+    "recommendation": [
+        r"\brecommend",
+        r"\bsuggest",
+        r"\bwhat('?s| is| are)( \w+)? (vegan|vegetarian|gluten[- ]free|dairy[- ]free|good|popular|special)",
+        r"\b(see|show me) the menu\b",
+        r"\bwhat should (i|we) (eat|have|order|get)\b",
+    ],
+    "ordering": [
+        r"\b(place|put in|confirm) (my|the|our|an) order\b",
+        r"\b(i'?d|we'?d) like to order\b",
+        r"\b(i|we)'?ll (have|take) the\b",
+        r"\bready to order\b",
+    ],
+}
+# "I don't want to order yet" reads like an intent but isn't one, leave it to the model
+NEGATION = re.compile(r"\b(don'?t|do not|not|no|never|cancel|change)\b", re.IGNORECASE)
+
+# phase each intent moves the guest to, settles messages asking for two things at once
+INTENT_PHASES = {"seating": "seating", "recommendation": "selection", "ordering": "order placement"}
+
+_COMPILED = {intent: [re.compile(p, re.IGNORECASE) for p in patterns] for intent, patterns in INTENT_PATTERNS.items()}
+
+
+@dataclass
+class RouterStats:
+    """Process wide counters of the fast-path router."""
+    routed: Counter = field(default_factory=Counter)
+    # reason the model was asked instead: no guest yet, no intent, ambiguous, negated
+    fallbacks: Counter = field(default_factory=Counter)
+
+    @property
+    def avoided(self) -> int:
+        return sum(self.routed.values())
+
+
+STATS = RouterStats()
+
+
+def classify(text: str, next_phase: Optional[str] = None) -> tuple[Optional[str], str]:
+    """
+    The intent a guest message clearly expresses
+
+    Args:
+        text (str): the guest's message
+        next_phase (Optional[str]): phase the guest moves to next, picks between several matched intents
+
+    Returns:
+        Tuple:
+            Optional[str]: the intent, None when the model should decide
+            str: the matched intent's name, or why there is none
+    """
+    matched = [intent for intent, patterns in _COMPILED.items() if any(p.search(text) for p in patterns)]
+    if not matched:
+        return None, "no intent"
+    if len(matched) > 1:
+        matched = [intent for intent in matched if INTENT_PHASES[intent] == next_phase]
+        if len(matched) != 1:
+            return None, "ambiguous"
+    if NEGATION.search(text):
+        return None, "negated"
+    return matched[0], matched[0]
+
+
+def _new_guest_message(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[str]:
+    # only route when the model would answer the guest, not a tool response or another agent
+    if not llm_request.contents or callback_context.user_content is None:
+        return None
+    last = llm_request.contents[-1]
+    if last.role != "user" or last != callback_context.user_content:
+        return None
+    return "".join(part.text or "" for part in last.parts or [])
+
+
+def make_fast_path_router(routes: dict[str, str]):
+    """
+    Build the before-model callback of the root agent that transfers obvious requests itself
+
+    A guest message matching exactly one intent (and no negation) is answered with a
+    `transfer_to_agent` call without calling the model, several intents are settled by
+    the phase state machine, anything else falls through to the model. Routing waits
+    until the guest has been introduced
+
+    Args:
+        routes (dict[str, str]): intent ("seating", "recommendation", "ordering") -> agent name
+    """
+    def route(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        text = _new_guest_message(callback_context, llm_request)
+        if text is None:
+            return None
+        if callback_context.state.get(constants.GUEST_KEY) is None:
+            STATS.fallbacks["no guest"] += 1
+            return None
+        intent, reason = classify(text, get_next_phase(callback_context))
+        if intent not in routes:
+            STATS.fallbacks[reason] += 1
+            return None
+
+        STATS.routed[intent] += 1
+        callback_context.state[constants.ROUTER_AVOIDED_KEY] = callback_context.state.get(constants.ROUTER_AVOIDED_KEY, 0) + 1
+        return LlmResponse(content=Content(
+            role="model",
+            parts=[Part(function_call=FunctionCall(name="transfer_to_agent", args={"agent_name": routes[intent]}))],
+        ))
+
+    return route